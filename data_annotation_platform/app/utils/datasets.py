@@ -16,12 +16,16 @@ decoder).
 
 """
 
+import contextlib
 import hashlib
 import json
 import jsonschema
 import logging
 import math
 import os
+import pathlib
+import sqlite3
+import tempfile
 
 from flask import current_app
 
@@ -126,16 +130,123 @@ def get_demo_true_cps(name):
     return data["demo"]["true_CPs"]
 
 
+# MD5 hashes computed by this process, by absolute path, with the
+# (size, mtime_ns) of the file they belong to
+_MD5_CACHE = {}
+
+
 def md5sum(filename):
-    """ Compute the MD5 hash for a given filename """
+    """ Compute the MD5 hash for a given filename
+
+    Hashes are remembered by path, size and modification time, like the
+    md5sum of the benchmark scripts, so the datasets are only hashed again
+    once they changed.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _MD5_CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
     blocksize = 65536
     hasher = hashlib.md5()
-    with open(filename, "rb") as fid:
+    with open(path, "rb") as fid:
         buf = fid.read(blocksize)
         while len(buf) > 0:
             hasher.update(buf)
             buf = fid.read(blocksize)
-    return hasher.hexdigest()
+    md5 = hasher.hexdigest()
+    _MD5_CACHE[path] = (key, md5)
+    return md5
+
+
+# Layout version of the index of the time series attributes, as written by
+# data_extraction_transformation/extract_signatures_properties.py
+SIGNATURES_INDEX_VERSION = 1
+
+
+def read_signatures_index(filename, name):
+    """ Attributes of one time series from the index of the attributes file
+
+    The index is the SQLite file next to the JSON file, see
+    extract_signatures_properties.py. Returns None if it is missing or was
+    built from another version of the JSON file.
+    """
+    path = os.path.splitext(filename)[0] + ".sqlite"
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(filename)
+    try:
+        uri = pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+        with contextlib.closing(sqlite3.connect(uri, uri=True)) as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SIGNATURES_INDEX_VERSION:
+                return None
+            source = conn.execute("SELECT md5, size, mtime_ns FROM source").fetchone()
+            if source is None:
+                return None
+            if tuple(source[1:]) != (stat.st_size, stat.st_mtime_ns) and source[0] != md5sum(filename):
+                return None
+            row = conn.execute(
+                "SELECT attributes FROM signatures WHERE id = ?", (name,)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row is not None else {}
+
+
+def write_signatures_index(filename, signature_data):
+    """ Write the index of the attributes file, if its directory is writable """
+    path = os.path.splitext(filename)[0] + ".sqlite"
+    stat = os.stat(filename)
+    try:
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix=".sqlite"
+        )
+        os.close(fd)
+    except OSError:
+        return
+    try:
+        with contextlib.closing(sqlite3.connect(tmp)) as conn:
+            conn.execute("PRAGMA user_version = %i" % SIGNATURES_INDEX_VERSION)
+            conn.execute(
+                "CREATE TABLE source (md5 TEXT NOT NULL, size INTEGER, mtime_ns INTEGER)"
+            )
+            conn.execute(
+                "INSERT INTO source VALUES (?, ?, ?)",
+                (md5sum(filename), stat.st_size, stat.st_mtime_ns),
+            )
+            conn.execute(
+                "CREATE TABLE signatures (id TEXT PRIMARY KEY, attributes TEXT NOT NULL)"
+            )
+            conn.executemany(
+                "INSERT INTO signatures VALUES (?, ?)",
+                ((str(k), json.dumps(v)) for k, v in signature_data.items()),
+            )
+            conn.commit()
+        os.replace(tmp, path)
+    except (OSError, sqlite3.Error):
+        LOGGER.warning("Failed to write the index of '%s'" % filename)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def get_signature_attributes(filename, name):
+    """ Attributes of one time series from the attributes JSON file
+
+    They are read from the SQLite index of the file, so that the file is not
+    parsed on every request. The first request after the file changed parses
+    it and writes the index anew.
+    """
+    attributes = read_signatures_index(filename, name)
+    if attributes is not None:
+        return attributes
+    with open(filename, "rb") as fid:
+        signature_data = json.load(fid)
+    write_signatures_index(filename, signature_data)
+    return signature_data.get(name, {})
 
 
 def load_data_for_chart(name, known_md5):
@@ -146,14 +257,15 @@ def load_data_for_chart(name, known_md5):
     if not os.path.exists(target_filename):
         LOGGER.error("Dataset with name '%s' can't be found!" % name)
         return None
-    if not md5sum(target_filename) == known_md5:
+    found_md5 = md5sum(target_filename)
+    if not found_md5 == known_md5:
         LOGGER.error(
             """
         MD5 checksum failed for dataset with name: %s.
         Found: %s.
         Expected: %s.
         """
-            % (name, md5sum(target_filename), known_md5)
+            % (name, found_md5, known_md5)
         )
         return None
     
@@ -162,10 +274,9 @@ def load_data_for_chart(name, known_md5):
     with open(target_filename, "rb") as fid:
         data = json.load(fid)
     
-    with open(signature_attributes_filename, "rb") as fid:
-        signature_data = json.load(fid)
-    
-    signature_attributes = signature_data.get(data.get("name"), {})
+    signature_attributes = get_signature_attributes(
+        signature_attributes_filename, data.get("name")
+    )
 
 
     chart_data = {
@@ -1,5 +1,8 @@
 import os
 import shutil
+import hashlib
+import sqlite3
+import tempfile
 import pandas as pd
 import json
 import argparse
@@ -124,7 +127,7 @@ def process_sig_df(dataf, signature_id):
 def parse_args():
     parser = argparse.ArgumentParser(description="Handpick specific timeseries JSON files along with their annotations.json to run them on TCPCBench.")
     parser.add_argument('-i', '--input-folder', help="Path to the input folder of time series CSV files.")
-    parser.add_argument('-o', '--output-file', help="Path to the output file of signatures properties JSON file.")
+    parser.add_argument('-o', '--output-file', help="Path to the output file of signatures properties JSON file. Its SQLite index is written next to it, with the extension .sqlite.")
     return parser.parse_args()
 
 def replace_nan(obj):
@@ -136,6 +139,44 @@ def replace_nan(obj):
         return None
     return obj
 
+# Layout version of the index, SIGNATURES_INDEX_VERSION in the
+# signatures_index.py of prediction_generation, which reads it
+SIGNATURES_INDEX_VERSION = 1
+
+def write_signatures_index(output_file, attributes):
+    """Write the SQLite index of the signatures properties JSON file next to it
+
+    The benchmark scripts and the annotation platform read the properties of
+    one signature from the index instead of parsing the whole JSON file. It
+    holds the properties of every signature as JSON in the ``signatures``
+    table, keyed by the signature id, and the md5, size and mtime_ns of the
+    JSON file in the ``source`` table, so that an index left from another
+    version of the file is not used.
+    """
+    index_file = os.path.splitext(output_file)[0] + ".sqlite"
+    stat = os.stat(output_file)
+    hasher = hashlib.md5()
+    with open(output_file, "rb") as file:
+        for block in iter(lambda: file.read(65536), b""):
+            hasher.update(block)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_file)), suffix=".sqlite")
+    os.close(fd)
+    os.chmod(tmp, 0o644)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA user_version = %i" % SIGNATURES_INDEX_VERSION)
+        conn.execute("CREATE TABLE source (md5 TEXT NOT NULL, size INTEGER, mtime_ns INTEGER)")
+        conn.execute("INSERT INTO source VALUES (?, ?, ?)", (hasher.hexdigest(), stat.st_size, stat.st_mtime_ns))
+        conn.execute("CREATE TABLE signatures (id TEXT PRIMARY KEY, attributes TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO signatures VALUES (?, ?)",
+            ((str(signature_id), json.dumps(properties)) for signature_id, properties in attributes.items()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, index_file)
+
 def main():
     args = parse_args()
     input_folder = args.input_folder
@@ -158,6 +199,7 @@ def main():
     attributes_polished = replace_nan(attributes)
     with open(output_file, "w") as file:
         json.dump(attributes_polished, file, indent=4)
+    write_signatures_index(output_file, attributes_polished)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -485,17 +485,17 @@ COMMANDS = {
     "best_sprt": "python3.9 {execdir}/python/cpdbench_sprt.py -i {datadir}/{dataset}.json --mu0 {mu0} --mu1 {mu1} --sigma {sigma} --threshold {threshold} --min-distance {min_distance}",
     "best_cvm_online": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_cvm.py -i {datadir}/{dataset}.json --ert {ert} --window-sizes {window_sizes} --min-distance {min_distance}",
     "best_bocpd_lookahead": "Rscript --no-save --slave {execdir}/R/cpdbench_bocpd_lookahead.R -i {datadir}/{dataset}.json -l {intensity} --prior-a {prior_a} --prior-b {prior_b} --prior-k {prior_k} --lookahead {lookahead}",
-    "best_adwin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_adwin_lookahead.py -i {datadir}/{dataset}.json --delta {delta} —max-buckets {max_buckets} --min-window-length {min_window_length} --grace-period {grace_period} --lookahead {lookahead}",
-    "best_page_hinkley_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_page_hinkley_lookahead.py -i {datadir}/{dataset}.json --delta {delta} --threshold {threshold} --min_instances {min_instances} --alpha {alpha} --mode {mode} --lookahead {lookahead}",
+    "best_adwin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_adwin.py -i {datadir}/{dataset}.json --delta {delta} —max-buckets {max_buckets} --min-window-length {min_window_length} --grace-period {grace_period} --lookahead {lookahead}",
+    "best_page_hinkley_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_page_hinkley.py -i {datadir}/{dataset}.json --delta {delta} --threshold {threshold} --min_instances {min_instances} --alpha {alpha} --mode {mode} --lookahead {lookahead}",
     "best_chisquare_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_chisquare_lookahead.py -i {datadir}/{dataset}.json --window-size {window_size} --num-bins {num_bins} --p-threshold {p_threshold} --min-distance {min_distance} --lookahead {lookahead}",
-    "best_cusum_lookahead": "python3.9 {execdir}/python/cpdbench_cusum_lookahead.py -i {datadir}/{dataset}.json --k {k} --h {h} --init-size {init_size} --min-distance {min_distance} --lookahead {lookahead}",
-    "best_ewma_lookahead":  "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_ewma_lookahead.py -i {datadir}/{dataset}.json --alpha {alpha} --threshold {threshold} --init-size {init_size} --min-distance {min_distance} --lookahead {lookahead}",
-    "best_kswin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_kswin_lookahead.py -i {datadir}/{dataset}.json --alpha {alpha} --window-size {window_size} --stat-size {stat_size} --lookahead {lookahead}",
-    "best_shewhart_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_shewhart_lookahead.py -i {datadir}/{dataset}.json --threshold {threshold} --init-size {init_size} --min-distance {min_distance} --lookahead {lookahead}",
-    "best_odummy_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_odummy_lookahead.py -i {datadir}/{dataset}.json --trigger-method {trigger_method} --t_0 {t_0} --w {w} --init-size {init_size} --min-distance {min_distance} --seed {seed} --lookahead {lookahead}",
-    "best_mosum_lookahead": "python3.9 {execdir}/python/cpdbench_mosum_lookahead.py -i {datadir}/{dataset}.json --window-size {window_size} --threshold {threshold} --min-distance {min_distance} --lookahead {lookahead}",
-    "best_sprt_lookahead": "python3.9 {execdir}/python/cpdbench_sprt_lookahead.py -i {datadir}/{dataset}.json --mu0 {mu0} --mu1 {mu1} --sigma {sigma} --threshold {threshold} --min-distance {min_distance} --lookahead {lookahead}",
-    "best_cvm_online_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_cvm_lookahead.py -i {datadir}/{dataset}.json --ert {ert} --window-sizes {window_sizes} --min-distance {min_distance} --lookahead {lookahead}",
+    "best_cusum_lookahead": "python3.9 {execdir}/python/cpdbench_cusum.py -i {datadir}/{dataset}.json --k {k} --h {h} --init-size {init_size} --min-distance {min_distance} --lookahead {lookahead}",
+    "best_ewma_lookahead":  "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_ewma.py -i {datadir}/{dataset}.json --alpha {alpha} --threshold {threshold} --init-size {init_size} --min-distance {min_distance} --lookahead {lookahead}",
+    "best_kswin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_kswin.py -i {datadir}/{dataset}.json --alpha {alpha} --window-size {window_size} --stat-size {stat_size} --lookahead {lookahead}",
+    "best_shewhart_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_shewhart.py -i {datadir}/{dataset}.json --threshold {threshold} --init-size {init_size} --min-distance {min_distance} --lookahead {lookahead}",
+    "best_odummy_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_odummy.py -i {datadir}/{dataset}.json --trigger-method {trigger_method} --t_0 {t_0} --w {w} --init-size {init_size} --min-distance {min_distance} --seed {seed} --lookahead {lookahead}",
+    "best_mosum_lookahead": "python3.9 {execdir}/python/cpdbench_mosum.py -i {datadir}/{dataset}.json --window-size {window_size} --threshold {threshold} --min-distance {min_distance} --lookahead {lookahead}",
+    "best_sprt_lookahead": "python3.9 {execdir}/python/cpdbench_sprt.py -i {datadir}/{dataset}.json --mu0 {mu0} --mu1 {mu1} --sigma {sigma} --threshold {threshold} --min-distance {min_distance} --lookahead {lookahead}",
+    "best_cvm_online_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_cvm.py -i {datadir}/{dataset}.json --ert {ert} --window-sizes {window_sizes} --min-distance {min_distance} --lookahead {lookahead}",
     "best_mozilla_rep": "python3.9 {execdir}/python/cpdbench_mozilla_rep.py -i {datadir}/{dataset}.json -a /TCPDBench/analysis/annotations/signatures_attributes.json --min-back-window {min_back_window} --max-back-window {max_back_window} --fore-window {fore_window} --t-threshold {t_threshold} --alert-threshold {alert_threshold}",
     "best_welch_simple": "python3.9 {execdir}/python/cpdbench_methods.py -i {datadir}/{dataset}.json --method welch -a /TCPDBench/analysis/annotations/signatures_attributes.json --min-back-window {min_back_window} --max-back-window {max_back_window} --fore-window {fore_window} --alpha {alpha} --alert-threshold disabled",
     "best_welch_advanced": "python3.9 {execdir}/python/cpdbench_methods.py -i {datadir}/{dataset}.json --method welch -a /TCPDBench/analysis/annotations/signatures_attributes.json --min-back-window {min_back_window} --max-back-window {max_back_window} --fore-window {fore_window} --alpha {alpha} --alert-threshold {alert_threshold}",
@@ -541,17 +541,17 @@ COMMANDS = {
     "default_sprt": "python3.9 {execdir}/python/cpdbench_sprt.py -i {datadir}/{dataset}.json --mu0 0.0 --mu1 1.0 --sigma 1.0 --threshold 15.0 --min-distance 30",
     "default_cvm_online": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_cvm.py -i {datadir}/{dataset}.json --ert 200.0 --window-sizes 20 50 --min-distance 30",
     "default_bocpd_lookahead": "Rscript --no-save --slave {execdir}/R/cpdbench_bocpd_lookahead.R -i {datadir}/{dataset}.json -l 100 --prior-a 1.0 --prior-b 1.0 --prior-k 1.0 --lookahead 12",
-    "default_adwin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_adwin_lookahead.py -i {datadir}/{dataset}.json --delta 0.002 --lookahead 12",
-    "default_page_hinkley_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_page_hinkley_lookahead.py -i {datadir}/{dataset}.json --delta 0.005 --threshold 50.0 --min_instances 30 --alpha 0.9999 --mode both --lookahead 12",
+    "default_adwin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_adwin.py -i {datadir}/{dataset}.json --delta 0.002 --lookahead 12",
+    "default_page_hinkley_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_page_hinkley.py -i {datadir}/{dataset}.json --delta 0.005 --threshold 50.0 --min_instances 30 --alpha 0.9999 --mode both --lookahead 12",
     "default_chisquare_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_chisquare_lookahead.py -i {datadir}/{dataset}.json --window-size 5.0 --num-bins 10 --p-threshold 0.01 --min-distance 30 --lookahead 12",
-    "default_cusum_lookahead": "python3.9 {execdir}/python/cpdbench_cusum_lookahead.py -i {datadir}/{dataset}.json --k 1.0 --h 15.0 --init-size 10.0 --min-distance 30 --lookahead 12",
-    "default_ewma_lookahead":  "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_ewma_lookahead.py -i {datadir}/{dataset}.json --alpha 0.3 --threshold 3.0 --init-size 10.0 --min-distance 30 --lookahead 12",
-    "default_shewhart_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_shewhart_lookahead.py -i {datadir}/{dataset}.json --threshold 3.0 --init-size 10.0 --min-distance 30 --lookahead 12",
-    "default_kswin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_kswin_lookahead.py -i {datadir}/{dataset}.json --alpha 0.005 --window-size 100 --stat-size 10 --lookahead 12",
-    "default_odummy_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_odummy_lookahead.py -i {datadir}/{dataset}.json --trigger-method fixed --t_0 300 --w 0 --init-size 10 --min-distance 30 --seed 42 --lookahead 12",
-    "default_mosum_lookahead": "python3.9 {execdir}/python/cpdbench_mosum_lookahead.py -i {datadir}/{dataset}.json --window-size 30 --threshold 3.0 --min-distance 30 --lookahead 12",
-    "default_sprt_lookahead": "python3.9 {execdir}/python/cpdbench_sprt_lookahead.py -i {datadir}/{dataset}.json --mu0 0.0 --mu1 1.0 --sigma 1.0 --threshold 15.0 --min-distance 30 --lookahead 12",
-    "default_cvm_online_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_cvm_lookahead.py -i {datadir}/{dataset}.json --ert 200.0 --window-sizes 20 50 --min-distance 30 --lookahead 12",
+    "default_cusum_lookahead": "python3.9 {execdir}/python/cpdbench_cusum.py -i {datadir}/{dataset}.json --k 1.0 --h 15.0 --init-size 10.0 --min-distance 30 --lookahead 12",
+    "default_ewma_lookahead":  "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_ewma.py -i {datadir}/{dataset}.json --alpha 0.3 --threshold 3.0 --init-size 10.0 --min-distance 30 --lookahead 12",
+    "default_shewhart_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_shewhart.py -i {datadir}/{dataset}.json --threshold 3.0 --init-size 10.0 --min-distance 30 --lookahead 12",
+    "default_kswin_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_kswin.py -i {datadir}/{dataset}.json --alpha 0.005 --window-size 100 --stat-size 10 --lookahead 12",
+    "default_odummy_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_odummy.py -i {datadir}/{dataset}.json --trigger-method fixed --t_0 300 --w 0 --init-size 10 --min-distance 30 --seed 42 --lookahead 12",
+    "default_mosum_lookahead": "python3.9 {execdir}/python/cpdbench_mosum.py -i {datadir}/{dataset}.json --window-size 30 --threshold 3.0 --min-distance 30 --lookahead 12",
+    "default_sprt_lookahead": "python3.9 {execdir}/python/cpdbench_sprt.py -i {datadir}/{dataset}.json --mu0 0.0 --mu1 1.0 --sigma 1.0 --threshold 15.0 --min-distance 30 --lookahead 12",
+    "default_cvm_online_lookahead": "source {execdir}/python/venv/bin/activate && python {execdir}/python/cpdbench_cvm.py -i {datadir}/{dataset}.json --ert 200.0 --window-sizes 20 50 --min-distance 30 --lookahead 12",
     "default_mozilla_rep": "python3.9 {execdir}/python/cpdbench_mozilla_rep.py -i {datadir}/{dataset}.json -a /TCPDBench/analysis/annotations/signatures_attributes.json",
     "default_welch_simple": "python3.9 {execdir}/python/cpdbench_methods.py -i {datadir}/{dataset}.json --method welch -a /TCPDBench/analysis/annotations/signatures_attributes.json --alert-threshold disabled",
     "default_welch_advanced": "python3.9 {execdir}/python/cpdbench_methods.py -i {datadir}/{dataset}.json --method welch -a /TCPDBench/analysis/annotations/signatures_attributes.json",
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Batch runs of a detector script on many datasets.
+
+A script run with --batch instead of -i runs on every dataset of a directory
+or a manifest in one invocation. The datasets are run on a pool of worker
+processes forked from the script, so that the modules it imported and the
+files it read before, such as the signatures attributes, are shared by all
+datasets. The results are collected from dump_output of cpdbench_utils and
+written as one line of JSON each.
+
+"""
+
+import copy
+import json
+import os
+import sys
+
+from cpdbench_utils import collect_results, exit_with_error
+from time_budget import stop_time_budget
+
+
+def batch_datasets(path):
+    """Dataset files of a batch run
+
+    `path` is a directory, whose JSON files are the datasets, or a manifest
+    file listing one dataset per line, relative to the manifest. Blank lines
+    and lines starting with '#' are skipped.
+    """
+    if os.path.isdir(path):
+        return [
+            os.path.join(path, name)
+            for name in sorted(os.listdir(path))
+            if name.endswith(".json") and os.path.isfile(os.path.join(path, name))
+        ]
+    datasets = []
+    with open(path, "r") as fp:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                datasets.append(os.path.join(os.path.dirname(path), line))
+    return datasets
+
+
+def _run_batch_task(run, args, script_filename, filename):
+    """Run a script on one dataset of a batch, return (filename, results, error)
+
+    The results the script would write are collected instead. A script that
+    fails without writing a result gets a 'FAIL' result, as exit_with_error
+    writes it.
+    """
+    task_args = copy.deepcopy(args)
+    task_args.input = filename
+    results = []
+    collect_results(results)
+    error = None
+    try:
+        try:
+            run(task_args)
+        except SystemExit:
+            pass
+        except Exception as err:
+            error = "%s: %s" % (type(err).__name__, err)
+            if not results:
+                # not read with load_dataset, which would start the timings
+                # of a new run
+                with open(filename, "r") as fp:
+                    data = json.load(fp)
+                fail_args = copy.deepcopy(args)
+                fail_args.input = filename
+                try:
+                    exit_with_error(data, fail_args, vars(fail_args), error, script_filename)
+                except SystemExit:
+                    pass
+    except Exception as err:
+        error = "%s: %s" % (type(err).__name__, err)
+    finally:
+        collect_results(None)
+        stop_time_budget()
+    return filename, results, error
+
+
+def run_batch(run, args, script_filename):
+    """Run a script on every dataset of ``args.batch`` and write all results
+
+    `run` is the function of the script that runs it on the dataset of
+    ``args.input``. The datasets (see batch_datasets) are run on a pool of
+    ``args.jobs`` worker processes, all CPUs by default. Every result keeps
+    the format of a run on a single dataset and is written as one line of
+    JSON to ``args.output``, or to stdout, as soon as its dataset is done, in
+    the order of the datasets.
+
+    The workers are forked from this process, so whatever it loaded before,
+    e.g. the signatures attributes with load_signatures_attributes of
+    signatures_index, is not loaded again by every worker. Returns the
+    number of datasets that failed.
+    """
+    import concurrent.futures
+    import functools
+    import logging
+    import multiprocessing
+
+    filenames = batch_datasets(args.batch)
+    jobs = max(1, min(getattr(args, "jobs", None) or os.cpu_count() or 1, len(filenames) or 1))
+    task_args = copy.deepcopy(args)
+    del task_args.batch
+    if hasattr(task_args, "jobs"):
+        del task_args.jobs
+    task_args.output = None
+    task = functools.partial(_run_batch_task, run, task_args, script_filename)
+
+    logger = logging.getLogger(__name__)
+    sink = open(args.output, "w") if args.output else sys.stdout
+    failed = 0
+    try:
+        if jobs == 1:
+            completed = map(task, filenames)
+            pool = None
+        else:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs, mp_context=multiprocessing.get_context("fork")
+            )
+            # chunks amortize the transfers to the workers over several
+            # datasets, but stay small enough to balance the load
+            completed = pool.map(task, filenames, chunksize=max(1, min(16, len(filenames) // (4 * jobs))))
+        try:
+            for filename, results, error in completed:
+                if error is not None:
+                    failed += 1
+                    logger.error("%s: %s", filename, error)
+                for result in results:
+                    sink.write(json.dumps(result, sort_keys=True) + "\n")
+                sink.flush()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    return failed
@@ -6,7 +6,9 @@ import time
 import copy
 import numpy as np
 from river.drift import ADWIN
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, online_alarms, RiverDetector
+from time_budget import start_time_budget
+from timings import begin_stage
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run ADWIN (river) on a time series dataset.")
@@ -16,25 +18,32 @@ def parse_args():
     parser.add_argument('--max-buckets', type=int, default=5, help="The maximum number of buckets of each size that ADWIN should keep before merging buckets")
     parser.add_argument('--min-window-length', type=int, default=5, help="The minimum length allowed for a subwindow when checking for concept drift")
     parser.add_argument('--grace-period', type=float, default=10, help="ADWIN does not perform any change detection until at least this many data points have arrived.")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS, help="Number of future points to average for evaluation, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
     data, mat = load_dataset(args.input)
     start_time = time.time()
+    begin_stage("detect")
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__)
 
     try:
         series = data['series'][0]['raw']
-        detector = ADWIN(delta=args.delta, clock=1, min_window_length=args.min_window_length, grace_period=args.grace_period, max_buckets=args.max_buckets)
-        drift_points = []
+        if getattr(args, "lookahead", None) is None:
+            detector = ADWIN(delta=args.delta, clock=1, min_window_length=args.min_window_length, grace_period=args.grace_period, max_buckets=args.max_buckets)
+        else:
+            # the detector of the former cpdbench_adwin_lookahead.py
+            detector = ADWIN(delta=args.delta)
 
-        for i, val in enumerate(series):
-            detector.update(val)
-            if detector.drift_detected:
-                drift_points.append(i)
+        # the lookahead variant feeds the true points and evaluates the
+        # average of the points that follow them on a copy of the detector
+        drift_points = online_alarms(RiverDetector(detector), series, getattr(args, "lookahead", None))
 
         runtime = time.time() - start_time
+        begin_stage("postprocess")
         exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
     except Exception as e:
         exit_with_error(data, raw_args, vars(args), str(e), __file__)
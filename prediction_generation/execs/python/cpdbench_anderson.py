@@ -7,25 +7,25 @@ Author: Mohamed Bilel Besbes
 Date: 2025-01-28
 
 """
-import functools
 import argparse
 import time
 import copy
 import numpy as np
-from datetime import datetime
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
-from collections import defaultdict
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, RevisionSeries, RevisionChange, get_noise_profile
+from signatures_index import load_signature
+from time_budget import start_time_budget
+from timings import begin_stage
 #from django.db import transaction
-import moz_measure_noise
 import json
 import os
 from collections import namedtuple
-import newrelic.agent
-import logging
 from scipy import stats
+from rank_tests import SortedWindow, anderson_ksamp
 
 def analyze(revision_data, weight_fn=None):
-    """Returns the average and sample variance (s**2) of a list of floats.
+    """Returns the average and sample variance (s**2) of a list of revisions.
+
+    `revision_data` holds one list of values per revision.
 
     `weight_fn` is a function that takes a list index and a window width, and
     returns a weight that is used to calculate a weighted average.  For example,
@@ -45,13 +45,13 @@ def analyze(revision_data, weight_fn=None):
     weighted_sum = 0
     sum_of_weights = 0
     for i in range(num_revisions):
-        weighted_sum += sum(value * weights[i] for value in revision_data[i].values)
-        sum_of_weights += weights[i] * len(revision_data[i].values)
+        weighted_sum += sum(value * weights[i] for value in revision_data[i])
+        sum_of_weights += weights[i] * len(revision_data[i])
     weighted_avg = weighted_sum / sum_of_weights if num_revisions > 0 else 0.0
 
     # now that we have a weighted average, we can calculate the variance of the
     # whole series
-    all_data = [v for datum in revision_data for v in datum.values]
+    all_data = [v for values in revision_data for v in values]
     variance = (
         (sum(pow(d - weighted_avg, 2) for d in all_data) / (len(all_data) - 1))
         if len(all_data) > 1
@@ -62,11 +62,6 @@ def analyze(revision_data, weight_fn=None):
 
 
 
-def geomean(iterable):
-    # Returns a geomean of a list of values.
-    a = np.array(iterable)
-    return a.prod() ** (1.0 / len(a))
-
 def default_weights(i, n):
     """A window function that weights all points uniformly."""
     return 1.0
@@ -84,107 +79,59 @@ def linear_weights(i, n):
     return float(n - i) / float(n)
 
 
-@functools.total_ordering
-class RevisionDatum:
-    """
-    This class represents a specific revision and the set of values for it
-    """
-
-    def __init__(self, push_timestamp, push_id, values):
-        # Date code was pushed
-        self.push_timestamp = push_timestamp
-
-        # What revision this data is for (usually, but not guaranteed
-        # to be increasing with push_timestamp)
-        self.push_id = push_id
-
-        # data values associated with this revision
-        self.values = copy.copy(values)
+def detect_changes(series, min_back_window=12, max_back_window=24, fore_window=12, sig_level=0.05):
+    """Return the RevisionChange of every revision of `series` flagged as a change.
 
-        # t-test score
-        self.t = 0
-
-        # Whether a perf regression or improvement was found
-        self.change_detected = False
-
-    def __eq__(self, o):
-        return self.push_timestamp == o.push_timestamp
-
-    def __lt__(self, o):
-        return self.push_timestamp < o.push_timestamp
-
-    def __repr__(self):
-        values_csv = ", ".join([f"{value:.3f}" for value in self.values])
-        values_str = f"[ {values_csv} ]"
-        return f"<{self.push_timestamp}: {self.push_id}, {values_str}, {self.t:.3f}, {self.change_detected}>"
-
-
-def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12, sig_level=0.05):
+    A revision is flagged as soon as the Anderson-Darling significance level
+    of its windows falls below `sig_level`.
+    """
     # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
-    data = sorted(data)
+    changes = []
 
     last_seen_regression = 0
-    for i in range(1, len(data)):
-        di = data[i]
-
+    # both windows are kept sorted from one index to the next, NaNs cannot
+    # be kept in order and go through scipy
+    sorted_windows = not np.isnan(series.values).any()
+    back_sorted, fore_sorted = SortedWindow(series), SortedWindow(series)
+    for i in range(1, len(series)):
         # keep on getting previous data until we've either got at least 12
         # data points *or* we've hit the maximum back window
-        jw = []
-        di.amount_prev_data = 0
-        prev_indice = i - 1
-        while (
-            di.amount_prev_data < max_back_window
-            and prev_indice >= 0
-            and (
-                (i - prev_indice)
-                <= min(max(last_seen_regression, min_back_window), max_back_window)
-            )
-        ):
-            jw.append(data[prev_indice])
-            di.amount_prev_data += len(jw[-1].values)
-            prev_indice -= 1
-
+        start = series.back_window_start(
+            i, last_seen_regression, min_back_window, max_back_window
+        )
         # accumulate present + future data until we've got at least 12 values
-        kw = []
-        di.amount_next_data = 0
-        next_indice = i
-        while di.amount_next_data < fore_window and next_indice < len(data):
-            kw.append(data[next_indice])
-            di.amount_next_data += len(kw[-1].values)
-            next_indice += 1
-
-        di.historical_stats = analyze(jw)
-        di.forward_stats = analyze(kw)
+        end = series.fore_window_end(i, fore_window)
 
         # run Anderson–Darling two-sample test
-        if len(jw) > 0 and len(kw) > 0:
-            jw_vals = [v for d in jw for v in d.values]
-            kw_vals = [v for d in kw for v in d.values]
-
+        if start < i and end > i:
             try:
-                res = stats.anderson_ksamp([jw_vals, kw_vals])
-                di.statistic = res.statistic
-                di.significance_level = res.significance_level / 100.0  # convert % → proportion
-                di.change_detected = di.significance_level < sig_level
-
-                # adaptive window update
-                if di.change_detected:
-                    last_seen_regression = 0
+                if sorted_windows:
+                    statistic, significance_level = anderson_ksamp(back_sorted.move(start, i), fore_sorted.move(i, end))
                 else:
-                    last_seen_regression += 1
-
+                    res = stats.anderson_ksamp([series.window(start, i), series.window(i, end)])
+                    statistic, significance_level = res.statistic, res.significance_level
+                significance_level = significance_level / 100.0  # convert % → proportion
+                change_detected = significance_level < sig_level
             except Exception:
-                di.statistic = 0
-                di.significance_level = 1.0
-                di.change_detected = False
-                last_seen_regression += 1
+                change_detected = False
+        else:
+            change_detected = False
+
+        # adaptive window update
+        if change_detected:
+            last_seen_regression = 0
+            changes.append(
+                RevisionChange(
+                    i,
+                    statistic,
+                    analyze(series.revisions(start, i, reverse=True)),
+                    analyze(series.revisions(i, end)),
+                )
+            )
         else:
-            di.statistic = 0
-            di.significance_level = 1.0
-            di.change_detected = False
             last_seen_regression += 1
 
-    return data
+    return changes
 
 
 
@@ -198,6 +145,8 @@ def parse_args():
     parser.add_argument('--fore-window', type=int, default=12, help="Forecast/forward window size (default: 12).")
     parser.add_argument('--sig-level', type=float, default=0.05, help="Significance level threshold.")
     parser.add_argument('--alert-threshold', type=int, default=2, help="Alert threshold value (default: 2).")
+    parser.add_argument('--noise-profile', action='store_true', default=argparse.SUPPRESS, help='Record the noise profile of every alert in the result, as moz_measure_noise.deviance computes it, it does not change the detected locations (default: off)')
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
 
     return parser.parse_args()
 
@@ -218,30 +167,17 @@ def get_alert_properties(prev_value, new_value, lower_is_better):
 
 
 def main():
-    logger = logging.getLogger(__name__)
     args = parse_args()
     data, mat = load_dataset(args.input)
     raw_data = data.copy()
     start_time = time.time()
-    with open(args.signatures_attributes, 'r') as file:
-        signatures_attributes = json.load(file)
-    signature_id = os.path.splitext(os.path.basename(args.input))[0]
-    signature_attributes = signatures_attributes[signature_id]
-    Signature = namedtuple('Signature', signature_attributes.keys())
-    signature = Signature(**signature_attributes)
+    signature = load_signature(args.signatures_attributes, args.input)
     # print(len(data['time']['raw']))
     # print(len(data['series'][0]['raw']))
     raw_args = copy.deepcopy(args)
+    start_time_budget(raw_data, raw_args, vars(args), __file__)
     #try:
-    series = data['series'][0]['raw']
-    push_timestamp = data['time']['raw']
-    push_timestamp = [datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in push_timestamp]
-    #unique_push_timestamp = sorted(set(datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in push_timestamp))
-    unique_push_timestamp = sorted(set(push_timestamp))
-    grouped_data = defaultdict(list)
-    for ts, value in zip(push_timestamp, series):
-        grouped_data[ts].append(value)
-    data = [RevisionDatum(ts, ts, grouped_data[ts]) for ts in grouped_data]
+    series = RevisionSeries.from_dataset(data)
     # data_sorted = sorted(data)
     # These values are the default taken from the Mozilla code, Note that min_back_window, max_back_window, and fore_window come from class Performancesignature, I did not find them on record in the signatures data we have o we will be using the defaults
     
@@ -250,8 +186,9 @@ def main():
     fore_window=args.fore_window
     sig_level=args.sig_level
     alert_threshold=args.alert_threshold
-    analyzed_series = detect_changes(
-        data,
+    begin_stage("detect")
+    changes = detect_changes(
+        series,
         min_back_window=min_back_window,
         max_back_window=max_back_window,
         fore_window=fore_window,
@@ -259,86 +196,69 @@ def main():
     )
     locations = []
     #with transaction.atomic():
-    for prev, cur in zip(analyzed_series, analyzed_series[1:]):
-        if cur.change_detected:
-            prev_value = cur.historical_stats["avg"]
-            new_value = cur.forward_stats["avg"]
-            alert_properties = get_alert_properties(
-                prev_value, new_value, signature.lower_is_better
+    for cur in changes:
+        prev_value = cur.historical_stats["avg"]
+        new_value = cur.forward_stats["avg"]
+        alert_properties = get_alert_properties(
+            prev_value, new_value, signature.lower_is_better
+        )
+
+        # ignore regressions below the configured regression
+        # threshold
+
+        # ALERT_PCT, ALERT_ABS, and ALERT_CHANGE_TYPES come from the PerformanceSignature class in the Treeherder code
+        ALERT_PCT = 0
+        ALERT_ABS = 1
+        ALERT_CHANGE_TYPES = ((ALERT_PCT, "percentage"), (ALERT_ABS, "absolute"))
+        if (
+            (
+                signature.alert_change_type is None
+                or signature.alert_change_type == ALERT_PCT
             )
-            noise_profile = "N/A"
-            try:
-                # Gather all data up to the current data point that
-                # shows the regression and obtain a noise profile on it.
-                # This helps us to ignore this alert and others in the
-                # calculation that could influence the profile.
-                noise_data = []
-                for point in analyzed_series:
-                    if point == cur:
-                        break
-                    noise_data.append(geomean(point.values))
-
-                noise_profile, _ = moz_measure_noise.deviance(noise_data)
-                if not isinstance(noise_profile, str):
-                    raise Exception(
-                        f"Expecting a string as a noise profile, got: {type(noise_profile)}"
-                    )
-            except Exception:
-                # Fail without breaking the alert computation
-                newrelic.agent.notice_error()
-                logger.error("Failed to obtain a noise profile.")
-
-            # ignore regressions below the configured regression
-            # threshold
-
-            # ALERT_PCT, ALERT_ABS, and ALERT_CHANGE_TYPES come from the PerformanceSignature class in the Treeherder code
-            ALERT_PCT = 0
-            ALERT_ABS = 1
-            ALERT_CHANGE_TYPES = ((ALERT_PCT, "percentage"), (ALERT_ABS, "absolute"))
-            if (
-                (
-                    signature.alert_change_type is None
-                    or signature.alert_change_type == ALERT_PCT
-                )
-                and alert_properties.pct_change < alert_threshold
-            ) or (
-                signature.alert_change_type == ALERT_ABS
-                and abs(alert_properties.delta) < alert_threshold
-            ):
-                continue
-            # summary, _ = PerformanceAlertSummary.objects.get_or_create(
-            #     repository=signature.repository,
-            #     framework=signature.framework,
-            #     push_id=cur.push_id,
-            #     prev_push_id=prev.push_id,
-            #     defaults={
-            #         "manually_created": False,
-            #         "created": datetime.utcfromtimestamp(cur.push_timestamp),
-            #     },
-            # )
-
-
-            # This is where we create the alert aka append its index in the locations list
-            # locations += [str(i) + "/t_value/" + str(cur.t) + "/pct_value/" + str(alert_properties.pct_change) + "/prev_value/" + str(prev_value) + "/new_value/" + str(new_value) for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
-            locations += [i for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
-            
-            # PerformanceAlert.objects.update_or_create(
-            #     summary=summary,
-            #     series_signature=signature,
-            #     defaults={
-            #         "noise_profile": noise_profile,
-            #         "is_regression": alert_properties.is_regression,
-            #         "amount_pct": alert_properties.pct_change,
-            #         "amount_abs": alert_properties.delta,
-            #         "prev_value": prev_value,
-            #         "new_value": new_value,
-            #         "t_value": t_value,
-            #     },
-            # )
+            and alert_properties.pct_change < alert_threshold
+        ) or (
+            signature.alert_change_type == ALERT_ABS
+            and abs(alert_properties.delta) < alert_threshold
+        ):
+            continue
+        # summary, _ = PerformanceAlertSummary.objects.get_or_create(
+        #     repository=signature.repository,
+        #     framework=signature.framework,
+        #     push_id=cur.push_id,
+        #     prev_push_id=prev.push_id,
+        #     defaults={
+        #         "manually_created": False,
+        #         "created": datetime.utcfromtimestamp(cur.push_timestamp),
+        #     },
+        # )
+
+
+        # This is where we create the alert aka append its index in the locations list
+        # locations += [str(i) + "/t_value/" + str(cur.t) + "/pct_value/" + str(alert_properties.pct_change) + "/prev_value/" + str(prev_value) + "/new_value/" + str(new_value) for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
+        locations.append(cur.index)
+        
+        # PerformanceAlert.objects.update_or_create(
+        #     summary=summary,
+        #     series_signature=signature,
+        #     defaults={
+        #         "noise_profile": noise_profile,
+        #         "is_regression": alert_properties.is_regression,
+        #         "amount_pct": alert_properties.pct_change,
+        #         "amount_abs": alert_properties.delta,
+        #         "prev_value": prev_value,
+        #         "new_value": new_value,
+        #         "t_value": t_value,
+        #     },
+        # )
+
+    noise_profiles = None
+    if getattr(args, "noise_profile", False):
+        noise_profiles = [get_noise_profile(series, i) for i in locations]
 
     stop_time = time.time()
     runtime = stop_time - start_time
-    exit_success(raw_data, raw_args, vars(args), locations, runtime, __file__)
+    begin_stage("postprocess")
+    exit_success(raw_data, raw_args, vars(args), locations, runtime, __file__, noise_profiles=noise_profiles)
     # except Exception as e:
     #     exit_with_error(raw_data, raw_args, vars(args), str(e), __file__)
 if __name__ == "__main__":
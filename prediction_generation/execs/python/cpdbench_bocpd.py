@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bayesian online change point detection with a Student-t predictive.
+
+This is the method of execs/R/cpdbench_ocp.R (plain) and
+execs/R/cpdbench_bocpd_lookahead.R (with --lookahead) without the R
+interpreter: the BOCPD of Adams & MacKay with the normal-gamma prior of the
+gaussian model of the ocp package and a constant hazard 1 / lambda. The
+posterior of every run length is updated with array operations, and run
+lengths whose posterior falls below --trunc-rlim are dropped, so a point
+costs time in the number of run lengths still active rather than in the
+number of points seen.
+
+The change points are the starts of the runs on the most probable path of
+run lengths, the counterpart of the maxCPs of ocp that the R scripts report.
+The lookahead variant feeds the true points, and reports point i if the most
+probable path starts a run at it when it is fed the mean of the `lookahead`
+points after it instead. The first point, which starts the first run, is not
+reported by either variant, as prepare.result of the R methods drops it.
+
+"""
+
+import argparse
+import math
+import time
+import copy
+import numpy as np
+from scipy.special import gammaln
+from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from time_budget import start_time_budget
+from timings import begin_stage
+
+
+class StudentTBOCPD:
+    """Run length posterior of a series fed point by point
+
+    Every active run length keeps the statistics of the normal-gamma
+    posterior of its run, its log posterior probability ``log_r`` and the log
+    probability of the most probable path of run lengths ending with it,
+    ``log_m``, relative to the best path. ``previous[s]`` is the start of the
+    run before the one starting at point s on the most probable path to s.
+    """
+
+    def __init__(self, hazard, prior_m=0.0, prior_k=1.0, prior_a=1.0, prior_b=1.0,
+                 trunc_rlim=1e-4, min_rlength=1, max_rlength=10**4, n_dim=1):
+        self.log_h = math.log(hazard)
+        self.log_1mh = math.log1p(-hazard)
+        self.prior = (prior_m, prior_k, prior_a, prior_b)
+        self.trunc_rlim = trunc_rlim
+        self.min_rlength = min_rlength
+        self.max_rlength = max_rlength
+        self.t = 0
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.log_r = np.zeros(0)
+        self.log_m = np.zeros(0)
+        self.mu = np.zeros((0, n_dim))
+        self.kappa = np.zeros(0)
+        self.beta = np.zeros((0, n_dim))
+        self.previous = []
+        # predictive of a new run
+        m0, k0, a0, b0 = self.prior
+        self.nu_scale0 = 2.0 * b0 * (k0 + 1.0) / k0
+        self.log_norm0 = gammaln(a0 + 0.5) - gammaln(a0) - 0.5 * math.log(np.pi * self.nu_scale0)
+
+    def _log_pred(self, x):
+        """Log predictive density of x for every active run and for a new run"""
+        m0, k0, a0, b0 = self.prior
+        log_p = (self.log_norm - 0.5 * (self.nu + 1.0) * np.log1p((x - self.mu) ** 2 / self.nu_scale)).sum(axis=1)
+        log_p0 = (self.log_norm0 - (a0 + 0.5) * np.log1p((x - m0) ** 2 / self.nu_scale0)).sum()
+        return log_p, log_p0
+
+    def _set_predictive(self):
+        """Parameters of the Student-t predictive of every active run"""
+        alpha = self.prior[2] + 0.5 * self.lengths[:, None]
+        self.nu = 2.0 * alpha
+        self.nu_scale = self.nu * self.beta * (self.kappa[:, None] + 1.0) / (alpha * self.kappa[:, None])
+        self.log_norm = gammaln(alpha + 0.5) - gammaln(alpha) - 0.5 * np.log(np.pi * self.nu_scale)
+
+    def check(self, x):
+        """Whether the most probable path starts a run at x if it is fed next"""
+        if not len(self.lengths):
+            return True
+        log_p, log_p0 = self._log_pred(x)
+        change = self.log_m.max() + self.log_h + log_p0
+        return change >= (self.log_m + log_p).max() + self.log_1mh
+
+    def update(self, x):
+        """Feed the next point"""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        m0, k0, a0, b0 = self.prior
+        if not len(self.lengths):
+            self.previous.append(-1)
+            log_r = log_m = np.zeros(1)
+            lengths = np.ones(1, dtype=np.int64)
+            mu = np.full((1, len(x)), m0)
+            kappa = np.full(1, k0)
+            beta = np.full((1, len(x)), b0)
+        else:
+            log_p, log_p0 = self._log_pred(x)
+            best = int(self.log_m.argmax())
+            self.previous.append(self.t - int(self.lengths[best]))
+            # the change point mass is the hazard times the predictive of a
+            # new run, as the posterior sums to one
+            log_r = np.concatenate(([self.log_h + log_p0], self.log_r + log_p + self.log_1mh))
+            log_m = np.concatenate(([self.log_m[best] + self.log_h + log_p0], self.log_m + log_p + self.log_1mh))
+            lengths = np.concatenate(([1], self.lengths + 1))
+            mu = np.vstack((np.full((1, len(x)), m0), self.mu))
+            kappa = np.concatenate(([k0], self.kappa))
+            beta = np.vstack((np.full((1, len(x)), b0), self.beta))
+
+        # posterior of the runs with x
+        beta = beta + kappa[:, None] * (x - mu) ** 2 / (2.0 * (kappa[:, None] + 1.0))
+        mu = (kappa[:, None] * mu + x) / (kappa[:, None] + 1.0)
+        kappa = kappa + 1.0
+
+        log_r = log_r - _logsumexp(log_r)
+        log_m = log_m - log_m.max()
+        # drop the unlikely run lengths, but never those of the most probable
+        # path
+        keep = ((log_r >= math.log(self.trunc_rlim)) if self.trunc_rlim > 0 else np.ones(len(log_r), dtype=bool))
+        keep |= lengths <= self.min_rlength
+        keep &= lengths <= self.max_rlength
+        keep |= log_m == 0.0
+        if not keep.all():
+            log_r = log_r[keep] - _logsumexp(log_r[keep])
+            log_m, lengths = log_m[keep], lengths[keep]
+            mu, kappa, beta = mu[keep], kappa[keep], beta[keep]
+
+        self.log_r, self.log_m, self.lengths = log_r, log_m, lengths
+        self.mu, self.kappa, self.beta = mu, kappa, beta
+        self._set_predictive()
+        self.t += 1
+
+    def change_points(self):
+        """Starts of the runs on the most probable path of the points fed so far"""
+        if not len(self.lengths):
+            return []
+        start = self.t - int(self.lengths[self.log_m.argmax()])
+        starts = []
+        while start >= 0:
+            starts.append(start)
+            start = self.previous[start]
+        return starts[::-1]
+
+
+def _logsumexp(values):
+    top = values.max()
+    return top + math.log(np.exp(values - top).sum())
+
+
+def ahead_means(mat, lookahead):
+    """Mean of the up to `lookahead` rows after every row, the last row has none"""
+    sums = np.vstack((np.zeros((1, mat.shape[1])), np.cumsum(mat, axis=0)))
+    n = len(mat)
+    start = np.arange(1, n)
+    end = np.minimum(n, start + lookahead)
+    return (sums[end] - sums[start]) / (end - start)[:, None]
+
+
+def bocpd(mat, detector, lookahead=None):
+    """Change points of the rows of `mat` found by a StudentTBOCPD
+
+    Without `lookahead` these are the starts of the runs on the final most
+    probable path. With `lookahead`, point i is checked with the mean of the
+    points after it right before it is fed, like cpdbench_bocpd_lookahead.R,
+    and the last point, which has none, is not checked. Point 0 is reported
+    by neither.
+    """
+    if lookahead is None:
+        for x in mat:
+            detector.update(x)
+        return [i for i in detector.change_points() if i > 0]
+
+    probes = ahead_means(mat, lookahead)
+    locations = []
+    for i, x in enumerate(mat):
+        if 0 < i < len(probes) and detector.check(probes[i]):
+            locations.append(i)
+        detector.update(x)
+    return locations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run Bayesian online change point detection on a time series dataset.")
+    parser.add_argument('-i', '--input', help="Path to the input JSON dataset file.")
+    parser.add_argument('-o', '--output', help="Path to the output JSON file.")
+    parser.add_argument('-l', '--lambda', type=int, default=100, help="Lambda parameter of the constant hazard function (default: 100)")
+    parser.add_argument('--prior-a', type=float, default=1.0, help="Prior alpha for student-t (default: 1.0)")
+    parser.add_argument('--prior-b', type=float, default=1.0, help="Prior beta for student-t (default: 1.0)")
+    parser.add_argument('--prior-k', type=float, default=1.0, help="Prior kappa for student-t (default: 1.0)")
+    parser.add_argument('--trunc-rlim', type=float, default=1e-4, help="Posterior probability below which run lengths are dropped, 0 keeps all (default: 1e-4)")
+    parser.add_argument('--min-rlength', type=int, default=1, help="Run lengths up to this one are never dropped (default: 1)")
+    parser.add_argument('--max-rlength', type=int, default=10**4, help="Longest run length kept (default: 10000)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS, help="Number of future points to average for detection, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    data, mat = load_dataset(args.input)
+    raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__)
+
+    try:
+        # standardized with the sample standard deviation of every series,
+        # as scale() does for the R methods
+        raw = np.column_stack([series['raw'] for series in data['series']]).astype(float)
+        if np.isnan(raw).any():
+            raise ValueError("Missing values are not supported")
+        sd = raw.std(axis=0, ddof=1) if len(raw) > 1 else np.ones(raw.shape[1])
+        values = (raw - raw.mean(axis=0)) / np.where(sd > 0, sd, 1.0)
+
+        detector = StudentTBOCPD(
+            1.0 / getattr(args, "lambda"),
+            prior_m=0.0,
+            prior_k=args.prior_k,
+            prior_a=args.prior_a,
+            prior_b=args.prior_b,
+            trunc_rlim=args.trunc_rlim,
+            min_rlength=args.min_rlength,
+            max_rlength=args.max_rlength,
+            n_dim=values.shape[1],
+        )
+        start_time = time.time()
+        begin_stage("detect")
+        locations = bocpd(values, detector, getattr(args, "lookahead", None))
+        runtime = time.time() - start_time
+        begin_stage("postprocess")
+        exit_success(data, raw_args, vars(args), locations, runtime, __file__)
+    except Exception as e:
+        exit_with_error(data, raw_args, vars(args), str(e), __file__)
+
+
+if __name__ == "__main__":
+    main()
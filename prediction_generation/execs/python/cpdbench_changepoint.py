@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Change point detection with the normal costs of the changepoint package.
+
+This is the method of execs/R/cpdbench_changepoint.R without the R
+interpreter, for the Normal test statistic: the costs of cpt.mean, cpt.var
+and cpt.meanvar are taken from cumulative sums of the standardized series,
+and the change points are found by AMOC, PELT (with pruning), BinSeg or
+SegNeigh. Several penalties can be given to --penalty. The cumulative sums,
+and for AMOC, BinSeg and SegNeigh the search itself, do not depend on the
+penalty and are shared, so a run writes one result per penalty.
+
+Combinations of arguments the changepoint package rejects get a FAIL result
+before any detection is run. The test statistics other than Normal are left
+to cpdbench_changepoint.R, which is run once per penalty. As with the R
+script the locations are the cpts of the changepoint package: the last point
+of every segment in 1-based indices, which is the first point of the next
+segment in 0-based ones. The methods other than AMOC end them with n_obs, and
+AMOC gives n_obs when it finds no change, which is left out of the result
+like prepare.result of utils.R does.
+
+"""
+
+import argparse
+import copy
+import json
+import math
+import os
+import time
+import numpy as np
+from cpdbench_utils import load_dataset, exit_success, labelled_output, make_param_dict, prepare_result, dump_output, sweep_values
+from time_budget import start_time_budget
+from timings import begin_stage
+
+FUNCTIONS = ["mean", "var", "meanvar"]
+PENALTIES = ["None", "SIC", "BIC", "MBIC", "AIC", "Hannan-Quinn", "Asymptotic"]
+METHODS = ["AMOC", "PELT", "SegNeigh", "BinSeg"]
+STATISTICS = ["Normal", "CUSUM", "CSS", "Gamma", "Exponential", "Poisson"]
+
+# test statistics accepted by cpt.mean, cpt.var and cpt.meanvar
+FUNCTION_STATISTICS = {
+    "mean": ["Normal", "CUSUM"],
+    "var": ["Normal", "CSS"],
+    "meanvar": ["Normal", "Gamma", "Exponential", "Poisson"],
+}
+
+# parameters that change at a change point, and the shortest segment, as in
+# the changepoint package
+DIFF_PARAMS = {"mean": 1, "var": 1, "meanvar": 2}
+MIN_SEGMENT_LENGTH = {"mean": 1, "var": 2, "meanvar": 2}
+
+# the variance of a segment that is not positive, as in the changepoint package
+MIN_VARIANCE = 1e-11
+
+# significance level of the asymptotic penalty, pen.value of the R script
+ASYMPTOTIC_ALPHA = 0.05
+
+LOG_2PI = math.log(2 * math.pi)
+
+# the script of the test statistics other than Normal
+R_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "R", "cpdbench_changepoint.R")
+
+
+def check_combination(func, penalty, method, statistic):
+    """Why the arguments of a run cannot be evaluated, None if they can"""
+    if statistic not in FUNCTION_STATISTICS[func]:
+        return "Invalid test statistic for cpt.%s, must be %s" % (func, " or ".join(FUNCTION_STATISTICS[func]))
+    if penalty == "Asymptotic" and method != "AMOC":
+        return "Asymptotic penalties have only been implemented for AMOC"
+    if penalty == "MBIC" and method == "SegNeigh":
+        return "MBIC penalty not implemented for SegNeigh method, please choose an alternative penalty"
+    return None
+
+
+def penalty_value(penalty, func, n, alpha=ASYMPTOTIC_ALPHA):
+    """Penalty of a change point in a series of n points, as penalty_decision of the changepoint package"""
+    k = DIFF_PARAMS[func]
+    if penalty == "None":
+        return 0.0
+    if penalty in ("SIC", "BIC"):
+        return (k + 1) * math.log(n)
+    if penalty == "MBIC":
+        return (k + 2) * math.log(n)
+    if penalty == "AIC":
+        return 2.0 * (k + 1)
+    if penalty == "Hannan-Quinn":
+        return 2.0 * (k + 1) * math.log(math.log(n))
+
+    # Asymptotic, the quantile of the test statistic of a single change
+    with np.errstate(all="ignore"):
+        loglog = np.log(np.log(float(n)))
+        logloglog = np.log(loglog)
+        if func == "mean":
+            a = (2 * loglog) ** -0.5
+            b = 1 / a + 0.5 * a * logloglog
+            value = (-a * np.log(np.log((1 - alpha) ** -0.5)) + b) ** 2
+        else:
+            a = np.sqrt(2 * loglog)
+            if func == "var":
+                b = 2 * loglog + 0.5 * logloglog - math.lgamma(0.5)
+            else:
+                b = 2 * loglog + logloglog
+            value = (-np.log(np.log((1 - alpha + np.exp(-2 * np.exp(b))) ** -0.5)) / a + b / a) ** 2
+    if not np.isfinite(value):
+        raise ValueError("The asymptotic penalty is not defined for %i observations" % n)
+    return float(value)
+
+
+class NormalCost:
+    """Twice the negative log likelihood of segments of a series
+
+    The cost of the points start, ..., end - 1 is computed from cumulative
+    sums of the points and their squares. `start` and `end` may be arrays,
+    which are broadcast. With `mbic` the log of the segment length is added,
+    the cost the changepoint package uses for the MBIC penalty.
+
+    The sums of squares around the mean of segments of equal values are set
+    to zero. From the cumulative sums they come out as rounding errors of
+    either sign, and for cpt.meanvar a tiny positive variance is far below
+    MIN_VARIANCE, so that the costs of these segments would be arbitrary
+    and the search would split them.
+    """
+
+    def __init__(self, values, func):
+        self.func = func
+        # cpt.var takes the mean of the series as known
+        x = values - values.mean()
+        self.sum = np.concatenate(([0.0], np.cumsum(x)))
+        self.sum_sq = np.concatenate(([0.0], np.cumsum(x ** 2)))
+        # the end of the run of equal values that starts at every point
+        n = len(values)
+        run_ends = np.append(np.flatnonzero(values[1:] != values[:-1]) + 1, n)
+        self.run_end = np.append(run_ends[np.searchsorted(run_ends, np.arange(n), side="right")], n)
+
+    def __call__(self, start, end, mbic=False):
+        length = end - start
+        sum_sq = self.sum_sq[end] - self.sum_sq[start]
+        if self.func == "var":
+            variance = sum_sq / length
+        else:
+            deviance = sum_sq - (self.sum[end] - self.sum[start]) ** 2 / length
+            deviance = np.where(end <= self.run_end[start], 0.0, deviance)
+            variance = deviance / length
+        if self.func == "mean":
+            cost = deviance
+        else:
+            variance = np.where(variance <= 0, MIN_VARIANCE, variance)
+            cost = length * (LOG_2PI + np.log(variance) + 1)
+        if mbic:
+            cost = cost + np.log(length)
+        return cost
+
+
+def best_split(cost, start, end, min_length, mbic=False):
+    """(location, gain) of the split of start, ..., end - 1 that lowers the cost most
+
+    None if the segment is too short to be split.
+    """
+    taus = np.arange(start + min_length, end - min_length + 1)
+    if not len(taus):
+        return None
+    split = cost(start, taus, mbic) + cost(taus, end, mbic)
+    best = int(split.argmin())
+    return int(taus[best]), float(cost(start, end, mbic) - split[best])
+
+
+def amoc(cost, n, min_length, mbic=False):
+    """(location, gain) of the best single change point"""
+    return best_split(cost, 0, n, min_length, mbic)
+
+
+def pelt(cost, n, penalty, min_length, mbic=False):
+    """Segment ends of the optimal partition, by PELT
+
+    A candidate last change point is dropped once its cost is above the
+    optimal one, as it cannot become optimal later (Killick et al., 2012).
+    This holds for the cost of a change in mean. With the shortest segment
+    of the var and meanvar costs and the log length of the MBIC costs, a
+    dropped candidate can still be optimal, and the partition found is the
+    one the PELT of the changepoint package finds, which prunes the same way.
+    """
+    total = np.full(n + 1, np.inf)
+    total[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.zeros(1, dtype=np.int64)
+    for t in range(min_length, n + 1):
+        # a change point at t - min_length leaves a long enough segment
+        if t - min_length >= min_length:
+            candidates = np.append(candidates, t - min_length)
+        values = total[candidates] + cost(candidates, t, mbic)
+        best = int(values.argmin())
+        total[t] = values[best] + penalty
+        last[t] = candidates[best]
+        candidates = candidates[values <= total[t]]
+
+    ends = [n]
+    while last[ends[-1]] > 0:
+        ends.append(int(last[ends[-1]]))
+    return ends[::-1]
+
+
+def binseg(cost, n, max_cp, min_length, mbic=False):
+    """(location, gain) of the splits of binary segmentation, in the order they are made
+
+    Every step splits the segment whose best split lowers the cost most, up
+    to `max_cp` splits or until no segment can be split.
+    """
+    splits = []
+    segments = {(0, n): best_split(cost, 0, n, min_length, mbic)}
+    while len(splits) < max_cp:
+        candidates = [(split[1], -start, start, end) for (start, end), split in segments.items() if split is not None]
+        if not candidates:
+            break
+        # the first segment of those with the largest gain
+        _, _, start, end = max(candidates)
+        tau, gain = segments.pop((start, end))
+        splits.append((tau, gain))
+        segments[(start, tau)] = best_split(cost, start, tau, min_length, mbic)
+        segments[(tau, end)] = best_split(cost, tau, end, min_length, mbic)
+    return splits
+
+
+def binseg_locations(splits, n, penalty):
+    """Segment ends kept for a penalty: the splits up to the last whose gain exceeds it"""
+    kept = [i for i, (_, gain) in enumerate(splits) if gain >= penalty]
+    n_cp = kept[-1] + 1 if kept else 0
+    return sorted(tau for tau, _ in splits[:n_cp]) + [n]
+
+
+def segneigh(cost, n, max_segments, min_length):
+    """Segment neighbourhood search
+
+    Returns the optimal cost of the series in 1, ..., `max_segments`
+    segments, and a function that gives the segment ends of the optimal
+    segmentation into a number of segments. The cost of every segment is
+    computed once, a matrix of (n + 1) ** 2 values like the one of the
+    changepoint package.
+    """
+    max_segments = max(1, min(int(max_segments), n // min_length))
+    ends = np.arange(n + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        costs = cost(ends[:, None], ends[None, :])
+    costs[ends[None, :] - ends[:, None] < min_length] = np.inf
+
+    total = costs[0].copy()
+    optimal = [total[n]]
+    previous = [np.zeros(n + 1, dtype=np.int32)]
+    for k in range(2, max_segments + 1):
+        # the first k - 1 segments end at (k - 1) * min_length or later
+        starts = ends[(k - 1) * min_length:n - min_length + 1]
+        values = total[starts, None] + costs[starts]
+        best = values.argmin(axis=0)
+        total = values[best, ends]
+        optimal.append(total[n])
+        previous.append(starts[best].astype(np.int32))
+
+    def segmentation(n_segments):
+        segment_ends = [n]
+        for k in range(n_segments - 1, 0, -1):
+            segment_ends.append(int(previous[k][segment_ends[-1]]))
+        return segment_ends[::-1]
+
+    return np.asarray(optimal), segmentation
+
+
+def max_changepoints(method, max_cp, n_obs):
+    """Q of the R script, None for the methods without it"""
+    if method not in ("BinSeg", "SegNeigh"):
+        return None
+    if max_cp == "default":
+        return 5
+    Q = n_obs / 2 + 1
+    return int(Q) if Q == int(Q) else Q
+
+
+def changepoint_params(args, n_obs, penalty):
+    """Parameters of the result of a penalty, with the defaults of the R script"""
+    defaults = {}
+    Q = max_changepoints(args.method, args.max_cp, n_obs)
+    if Q is not None:
+        defaults["Q"] = Q
+    defaults["pen.value"] = ASYMPTOTIC_ALPHA if penalty == "Asymptotic" else 0
+    run_args = copy.deepcopy(args)
+    run_args.penalty = penalty
+    return make_param_dict(run_args, defaults)
+
+
+def changepoints(values, func, method, penalties, Q=None):
+    """Change point locations of a series for every penalty, by the name of the penalty
+
+    These are the segment ends without the end of the series, see
+    segment_ends.
+    """
+    n = len(values)
+    ends = segment_ends(values, func, method, penalties, Q)
+    return {penalty: [tau for tau in ends[penalty] if 0 < tau < n] for penalty in penalties}
+
+
+def segment_ends(values, func, method, penalties, Q=None):
+    """The cpts of the changepoint package for every penalty, by the name of the penalty"""
+    n = len(values)
+    cost = NormalCost(values, func)
+    min_length = MIN_SEGMENT_LENGTH[func]
+    if n < 2 * min_length:
+        raise ValueError("The series is too short to contain a change point")
+    pen_values = {penalty: penalty_value(penalty, func, n) for penalty in penalties}
+
+    locations = {}
+    if method == "PELT":
+        for penalty in penalties:
+            locations[penalty] = pelt(cost, n, pen_values[penalty], min_length, penalty == "MBIC")
+        return locations
+
+    if method == "SegNeigh":
+        optimal, segmentation = segneigh(cost, n, Q, min_length)
+        for penalty in penalties:
+            criterion = optimal + pen_values[penalty] * np.arange(len(optimal))
+            locations[penalty] = segmentation(int(criterion.argmin()) + 1)
+        return locations
+
+    # AMOC and BinSeg search once for every cost
+    searches = {}
+    for penalty in penalties:
+        mbic = penalty == "MBIC"
+        if mbic not in searches:
+            if method == "AMOC":
+                searches[mbic] = amoc(cost, n, min_length, mbic)
+            else:
+                searches[mbic] = binseg(cost, n, int(Q), min_length, mbic)
+        if method == "AMOC":
+            tau, gain = searches[mbic]
+            locations[penalty] = [tau if gain >= pen_values[penalty] else n]
+        else:
+            locations[penalty] = binseg_locations(searches[mbic], n, pen_values[penalty])
+    return locations
+
+
+def run_r_script(args, penalty):
+    """Result of cpdbench_changepoint.R for a penalty"""
+    import subprocess
+
+    cmd = ["Rscript", "--no-save", "--slave", R_SCRIPT, "-i", args.input, "-f", args.func, "-p", penalty, "-m", args.method, "-t", args.test_statistic, "-Q", args.max_cp]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the normal cost change point methods of the changepoint package on a time series dataset.")
+    parser.add_argument('-i', '--input', help="Path to the input JSON dataset file.")
+    parser.add_argument('-o', '--output', help="Path to the output JSON file.")
+    parser.add_argument('-f', '--func', choices=FUNCTIONS, required=True, help="Function of the changepoint package whose cost is used")
+    parser.add_argument('-p', '--penalty', choices=PENALTIES, nargs='+', default="MBIC", help="Penalty of a change point, several values are evaluated in a single run (default: MBIC)")
+    parser.add_argument('-m', '--method', choices=METHODS, default="AMOC", help="Search method (default: AMOC)")
+    parser.add_argument('-t', '--test-statistic', choices=STATISTICS, default="Normal", help="Test statistic, the ones other than Normal are run by cpdbench_changepoint.R (default: Normal)")
+    parser.add_argument('-Q', '--max-cp', choices=["max", "default"], default="max", help="Maximum number of change points of BinSeg and SegNeigh, n_obs / 2 + 1 or 5 (default: max)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    penalties = sweep_values(args, "penalty")
+    data, mat = load_dataset(args.input)
+    raw_args = copy.deepcopy(args)
+    n_obs = data["n_obs"]
+    start_time_budget(data, raw_args, changepoint_params(args, n_obs, penalties[0]), __file__, sweep=("penalty", penalties))
+
+    def run_args(penalty):
+        out = copy.deepcopy(raw_args)
+        out.penalty = penalty
+        if len(penalties) > 1:
+            out.output = labelled_output(raw_args.output, penalty=penalty)
+        return out
+
+    def fail(penalty, error):
+        out = prepare_result(data, run_args(penalty), "FAIL", error, changepoint_params(args, n_obs, penalty), None, None, __file__)
+        dump_output(out, run_args(penalty).output)
+
+    if data["n_dim"] > 1:
+        for penalty in penalties:
+            fail(penalty, "The changepoint methods do not support multidimensional data")
+        raise SystemExit
+
+    # the invalid combinations fail without running the detection
+    valid = []
+    for penalty in penalties:
+        error = check_combination(args.func, penalty, args.method, args.test_statistic)
+        if error is None:
+            valid.append(penalty)
+        else:
+            fail(penalty, error)
+    if not valid:
+        raise SystemExit
+
+    if args.test_statistic != "Normal":
+        # all runs are made before the first result ends the time budget
+        results = {}
+        for penalty in valid:
+            try:
+                results[penalty] = run_r_script(args, penalty)
+            except Exception as e:
+                results[penalty] = str(e)
+        for penalty, result in results.items():
+            if isinstance(result, dict):
+                dump_output(result, run_args(penalty).output)
+            else:
+                fail(penalty, result)
+        raise SystemExit
+
+    try:
+        # standardized with the sample standard deviation, as scale() does
+        # for the R methods
+        raw = np.asarray(data['series'][0]['raw'], dtype=float)
+        if np.isnan(raw).any():
+            raise ValueError("Missing values are not supported")
+        sd = raw.std(ddof=1) if len(raw) > 1 else 1.0
+        values = (raw - raw.mean()) / (sd if sd > 0 else 1.0)
+
+        start_time = time.time()
+        begin_stage("detect")
+        Q = max_changepoints(args.method, args.max_cp, n_obs)
+        locations = changepoints(values, args.func, args.method, valid, Q)
+        runtime = time.time() - start_time
+        begin_stage("postprocess")
+    except Exception as e:
+        for penalty in valid:
+            fail(penalty, str(e))
+        raise SystemExit
+
+    for penalty in valid:
+        exit_success(data, run_args(penalty), changepoint_params(args, n_obs, penalty), locations[penalty], runtime, __file__)
+
+
+if __name__ == "__main__":
+    main()
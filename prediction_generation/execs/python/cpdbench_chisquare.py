@@ -1,15 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import functools
 import argparse
 import time
 import copy
 import numpy as np
 from scipy.stats import chisquare
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
-from collections import defaultdict
-from collections import namedtuple
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, RevisionSeries, RevisionChange
+from time_budget import start_time_budget
+from timings import begin_stage
 
 
 def parse_args():
@@ -23,31 +22,11 @@ def parse_args():
     parser.add_argument('--fore-window', type=int, default=12)
     parser.add_argument('--alpha', type=float, default=0.05)
     parser.add_argument('--alert-threshold', default="2")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 
-@functools.total_ordering
-class RevisionDatum:
-    def __init__(self, push_timestamp, push_id, values):
-        self.push_timestamp = push_timestamp
-        self.push_id = push_id
-        self.values = copy.copy(values)
-        self.stat = 0
-        self.p = 1.0
-        self.change_detected = False
-
-    def __eq__(self, o):
-        return self.push_timestamp == o.push_timestamp
-
-    def __lt__(self, o):
-        return self.push_timestamp < o.push_timestamp
-
-
-def run_test(bins, jw, kw):
-    # Extract values from the windows
-    jw_values = [v for datum in jw for v in datum.values]
-    kw_values = [v for datum in kw for v in datum.values]
-
+def run_test(bins, jw_values, kw_values):
     hist_ref, _ = np.histogram(jw_values, bins=bins)
     hist_curr, _ = np.histogram(kw_values, bins=bins)
 
@@ -62,75 +41,57 @@ def run_test(bins, jw, kw):
     return stat, p_val
 
 
-def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12, alpha=0.05, bins=10):
-    data = sorted(data)
+def detect_changes(series, min_back_window=12, max_back_window=24, fore_window=12, alpha=0.05, bins=10):
+    n = len(series)
+    p = [1.0] * n
+    stat = [0] * n
+    amount_prev_data = [0] * n
+    amount_next_data = [0] * n
     last_seen_regression = 0
 
-    for i in range(1, len(data)):
-        di = data[i]
-
+    for i in range(1, n):
         # Reference window (jw) from past
-        jw = []
-        di.amount_prev_data = 0
-        prev_indice = i - 1
-        while (
-            di.amount_prev_data < max_back_window
-            and prev_indice >= 0
-            and (i - prev_indice <= min(max(last_seen_regression, min_back_window), max_back_window))
-        ):
-            jw.append(data[prev_indice])
-            di.amount_prev_data += len(jw[-1].values)
-            prev_indice -= 1
-
+        start = series.back_window_start(
+            i, last_seen_regression, min_back_window, max_back_window
+        )
         # Current window (kw) from present/future
-        kw = []
-        di.amount_next_data = 0
-        next_indice = i
-        while di.amount_next_data < fore_window and next_indice < len(data):
-            kw.append(data[next_indice])
-            di.amount_next_data += len(kw[-1].values)
-            next_indice += 1
+        end = series.fore_window_end(i, fore_window)
+        amount_prev_data[i] = series.amount(start, i)
+        amount_next_data[i] = series.amount(i, end)
 
-        if len(jw) > 1 and len(kw) > 1:
-            di.stat, di.p = run_test(bins, jw, kw)
-        else:
-            di.stat, di.p = 0, 1.0
+        if i - start > 1 and end - i > 1:
+            stat[i], p[i] = run_test(bins, series.window(start, i), series.window(i, end))
 
-        last_seen_regression = 0 if di.p < alpha else last_seen_regression + 1
+        last_seen_regression = 0 if p[i] < alpha else last_seen_regression + 1
 
     # Detect significant change points
-    for i in range(1, len(data)):
-        di = data[i]
-        if di.amount_prev_data < min_back_window or di.amount_next_data < fore_window:
+    changes = []
+    for i in range(1, n):
+        if amount_prev_data[i] < min_back_window or amount_next_data[i] < fore_window:
             continue
-        if di.p >= alpha:
+        if p[i] >= alpha:
             continue
-        prev = data[i - 1]
-        if prev.p < di.p:
+        if p[i - 1] < p[i]:
             continue
-        if (i + 1) < len(data) and data[i + 1].p < di.p:
+        if (i + 1) < n and p[i + 1] < p[i]:
             continue
-        di.change_detected = True
+        changes.append(RevisionChange(i, stat[i], None, None))
 
-    return data
+    return changes
 
 
 def main():
     args = parse_args()
     data_raw, mat = load_dataset(args.input)
     raw_data = copy.deepcopy(data_raw)
+    start_time_budget(raw_data, args, vars(args), __file__)
 
-    series = data_raw['series'][0]['raw']
-    push_timestamp = [ts for ts in data_raw['time']['raw']]
-
-    grouped_data = defaultdict(list)
-    for ts, value in zip(push_timestamp, series):
-        grouped_data[ts].append(value)
-
-    data = [RevisionDatum(ts, ts, grouped_data[ts]) for ts in grouped_data]
+    start_time = time.time()
+    series = RevisionSeries.from_dataset(data_raw)
 
-    analyzed_series = detect_changes(
-        data,
+    begin_stage("detect")
+    changes = detect_changes(
+        series,
         min_back_window=args.min_back_window,
         max_back_window=args.max_back_window,
         fore_window=args.fore_window,
@@ -139,9 +100,10 @@ def main():
     )
 
     # Collect detected change points
-    locations = [i for i, point in enumerate(analyzed_series) if point.change_detected]
+    locations = [cur.index for cur in changes]
 
-    runtime = time.time() - time.time()
+    runtime = time.time() - start_time
+    begin_stage("postprocess")
     exit_success(raw_data, args, vars(args), locations, runtime, __file__)
 
 
@@ -7,7 +7,9 @@ import copy
 import numpy as np
 from scipy.stats import chisquare
 from collections import deque
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, lookahead_means
+from time_budget import start_time_budget
+from timings import begin_stage
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run Sliding Window Chi-Square Test with future-lookahead averaging.")
@@ -23,12 +25,14 @@ def parse_args():
                         help="Minimum distance between change points (default: 30)")
     parser.add_argument('--lookahead', type=int, default=12,
                         help="Number of future points to average for artificial current (default: 12)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__)
 
     try:
         series = data['series'][0]['raw']
@@ -45,13 +49,13 @@ def main():
         curr_win = deque(series[win_size:2*win_size], maxlen=win_size)
 
         start_time = time.time()
+        begin_stage("detect")
+
+        # Artificial current points as average of next lookahead points
+        artificial = lookahead_means(series, args.lookahead).tolist()
 
         for i in range(2 * win_size, n_points):
-            # Compute artificial current point as average of next lookahead points
-            if i + args.lookahead < n_points:
-                artificial_x = np.mean(series[i+1:i+1+args.lookahead])
-            else:
-                artificial_x = series[i]
+            artificial_x = artificial[i]
 
             # Only use past data + artificial current for histogram comparison
             current_data = list(ref_win) + list(curr_win)[:-1] + [artificial_x]
@@ -80,6 +84,7 @@ def main():
                 curr_win.append(series[i])
 
         runtime = time.time() - start_time
+        begin_stage("postprocess")
         exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
 
     except Exception as e:
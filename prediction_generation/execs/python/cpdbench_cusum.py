@@ -5,7 +5,10 @@ import argparse
 import time
 import copy
 import numpy as np
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success_sweep, exit_with_error_sweep, lookahead_means, sweep_values
+from time_budget import start_time_budget
+from timings import begin_stage
+from online_kernels import cusum
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run Online CUSUM on a time series dataset.")
@@ -14,13 +17,18 @@ def parse_args():
     parser.add_argument('--k', type=float, default=1.0, help="Reference value to filter small changes (default: 1.0)")
     parser.add_argument('--h', type=float, default=15.0, help="Threshold to trigger change detection (default: 15.0)")
     parser.add_argument('--init-size', type=float, default=10.0, help="Initial window size as percentage of dataset (default: 10.0)")
-    parser.add_argument('--min-distance', type=int, default=30, help="Minimum distance between change points (default: 30)")
+    parser.add_argument('--min-distance', type=int, nargs='+', default=30, help="Minimum distance between change points, several values are evaluated in a single run (default: 30)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS, help="Number of future points to average for detection, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
+    min_distances = sweep_values(args, "min_distance")
+    lookahead = getattr(args, "lookahead", None)
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__, sweep=("min_distance", min_distances))
 
     try:
         series = data['series'][0]['raw']
@@ -30,30 +38,39 @@ def main():
         if init_count >= n_points:
             raise ValueError("init_size too large for the dataset")
 
+        values = np.asarray(series, dtype=float)
         mean_est = np.mean(series[:init_count])
-        s_pos = 0.0
-        s_neg = 0.0
-        drift_points = []
 
-        last_cp = -args.min_distance
+        # the lookahead variant includes the change point in the past window
+        past_end = 0 if lookahead is None else 1
+
+        def reestimate(i):
+            # re-estimate mean with past window
+            return np.mean(values[max(0, i - init_count):i + past_end])
+
         start_time = time.time()
+        begin_stage("detect")
 
-        for i in range(init_count, n_points):
-            x = series[i]
-            s_pos = max(0, s_pos + (x - mean_est - args.k))
-            s_neg = max(0, s_neg - (x - mean_est + args.k))
+        x = values
+        if lookahead is not None:
+            # blend every point with the average of the points that follow it
+            n_ahead = max(0, n_points - lookahead)
+            x = values.copy()
+            x[:n_ahead] = 0.5 * (values[:n_ahead] + lookahead_means(values, lookahead)[:n_ahead])
 
-            if (s_pos > args.h or s_neg > args.h) and (i - last_cp >= args.min_distance):
-                drift_points.append(i)
-                last_cp = i
-                s_pos, s_neg = 0.0, 0.0
-                mean_est = np.mean(series[max(0, i - init_count):i])  # re-estimate mean with past window
+        # The statistics are reset on every change point, so every
+        # min_distance runs its own pass
+        results = {
+            md: cusum(x, init_count, mean_est, args.k, args.h, md, reestimate)
+            for md in min_distances
+        }
 
         runtime = time.time() - start_time
-        exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
+        begin_stage("postprocess")
+        exit_success_sweep(data, raw_args, vars(args), "min_distance", results, runtime, __file__)
 
     except Exception as e:
-        exit_with_error(data, raw_args, vars(args), str(e), __file__)
+        exit_with_error_sweep(data, raw_args, vars(args), "min_distance", min_distances, str(e), __file__)
 
 if __name__ == "__main__":
     main()
@@ -6,7 +6,9 @@ import time
 import copy
 import numpy as np
 from alibi_detect.cd import CVMDriftOnline
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success_sweep, exit_with_error_sweep, online_alarms, suppress_close_alarms, sweep_values
+from time_budget import start_time_budget
+from timings import begin_stage
 
 
 def parse_args():
@@ -17,17 +19,56 @@ def parse_args():
                         help="Expected Run-Time (ERT) in absence of drift (default: 200.0)")
     parser.add_argument("--window-sizes", nargs='+', default=["20", "50"],
                         help="List of window sizes for sliding test windows (default: [20, 50])")
-    parser.add_argument("--min-distance", type=int, default=30,
-                        help="Minimum distance between detected change points (default: 30)")
+    parser.add_argument("--min-distance", type=int, nargs='+', default=30,
+                        help="Minimum distance between detected change points, several values are evaluated in a single pass (default: 30)")
     parser.add_argument("--n-bootstraps", type=int, default=1000,
                         help="Number of bootstrap simulations for threshold configuration (default: 1000)")
+    parser.add_argument("--lookahead", type=int, default=argparse.SUPPRESS,
+                        help="Number of future points to average for artificial current, runs the lookahead variant (default: off)")
+    parser.add_argument("--time-budget", type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 
+class CVMDetector:
+    """Update/check interface of an online CVM drift detector
+
+    With `score_only`, the points are fed with score() and raise no alarm,
+    as in the former cpdbench_cvm_lookahead.py.
+    """
+
+    def __init__(self, detector, t, score_only=False):
+        self.detector = detector
+        self.t = t
+        self.score_only = score_only
+
+    def update(self, x):
+        if self.score_only:
+            self.detector.score(np.reshape(x, (1, 1)))
+            self.t += 1
+            return False
+        try:
+            pred = self.detector.predict(np.reshape(x, (1, 1)), return_test_stat=True)
+        except Exception as e:
+            raise RuntimeError(f"Error at t={self.t}: {str(e)}")
+        self.t += 1
+        return bool(pred["data"]["is_drift"])
+
+    def check(self, x):
+        # clone detector to evaluate the point
+        temp_detector = copy.deepcopy(self.detector)
+        try:
+            stat = temp_detector.score(np.reshape(x, (1, 1)))
+        except ValueError as e:
+            raise ValueError(f"Broadcast error at t={self.t}, artificial_x shape=(1, 1), error={str(e)}")
+        return not np.isnan(stat).all() and np.any(stat > self.detector.thresholds)
+
+
 def main():
     args = parse_args()
+    min_distances = sweep_values(args, "min_distance")
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__, sweep=("min_distance", min_distances))
 
     try:
         # Load and shape data
@@ -55,30 +96,25 @@ def main():
             verbose=False,
         )
 
-        drift_points = []
-        last_cp = -args.min_distance
         start_time = time.time()
+        begin_stage("detect")
+
+        # Stream data sequentially, the lookahead variant evaluates the
+        # average of the next points on a clone before streaming each point
+        lookahead = getattr(args, "lookahead", None)
+        stream = online_alarms(
+            CVMDetector(detector, max_win, score_only=lookahead is not None),
+            series[max_win:, 0], lookahead, check_first=True
+        )
+        alarms = [max_win + i for i in stream]
 
-        # Stream data sequentially
-        for i in range(max_win, len(series)):
-            x_t = series[i].reshape(1, 1)
-
-            try:
-                pred = detector.predict(x_t, return_test_stat=True)
-            except Exception as e:
-                raise RuntimeError(f"Error at t={i}: {str(e)}")
-
-            is_drift = int(pred["data"]["is_drift"])
-
-            if is_drift and (i - last_cp > args.min_distance):
-                drift_points.append(i)
-                last_cp = i
-
+        results = {md: suppress_close_alarms(alarms, md) for md in min_distances}
         runtime = time.time() - start_time
-        exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
+        begin_stage("postprocess")
+        exit_success_sweep(data, raw_args, vars(args), "min_distance", results, runtime, __file__)
 
     except Exception as e:
-        exit_with_error(data, raw_args, vars(args), str(e), __file__)
+        exit_with_error_sweep(data, raw_args, vars(args), "min_distance", min_distances, str(e), __file__)
 
 
 if __name__ == "__main__":
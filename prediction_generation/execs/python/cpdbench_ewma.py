@@ -4,8 +4,10 @@
 import argparse
 import time
 import copy
-import numpy as np
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success_sweep, exit_with_error_sweep, lookahead_means, suppress_close_alarms, sweep_values
+from time_budget import start_time_budget
+from timings import begin_stage
+from online_kernels import ewma
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run Online EWMA Change Detector on a time series dataset.")
@@ -17,47 +19,20 @@ def parse_args():
                         help="Threshold multiplier for change detection (default: 3.0)")
     parser.add_argument('--init-size', type=float, default=10.0,
                         help="Initial window size as percentage of dataset (default: 10.0)")
-    parser.add_argument('--min-distance', type=int, default=30,
-                        help="Minimum distance between detected change points (default: 30)")
+    parser.add_argument('--min-distance', type=int, nargs='+', default=30,
+                        help="Minimum distance between detected change points, several values are evaluated in a single pass (default: 30)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS,
+                        help="Number of future points to average for detection, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
-class OnlineEWMAChangeDetector:
-    def __init__(self, alpha=0.3, threshold=3.0):
-        self.alpha = alpha
-        self.threshold = threshold
-        self.ewma = None
-        self.prev_ewma = None
-        self.variance = 0.0
-        self.n = 0
-        self.drift = False
-
-    def update(self, x):
-        self.drift = False
-        if self.ewma is None:
-            self.ewma = x
-            self.prev_ewma = x
-            self.n = 1
-            self.variance = 0.0
-            return
-
-        self.prev_ewma = self.ewma
-        self.ewma = self.alpha * x + (1 - self.alpha) * self.ewma
-
-        residual = x - self.prev_ewma
-        self.n += 1
-        self.variance = (1 - self.alpha) * (self.variance + self.alpha * residual ** 2)
-
-        std_dev = np.sqrt(self.variance)
-        if std_dev > 0 and abs(x - self.ewma) > self.threshold * std_dev:
-            self.drift = True
-
-    def detected_change(self):
-        return self.drift
-
 def main():
     args = parse_args()
+    min_distances = sweep_values(args, "min_distance")
+    lookahead = getattr(args, "lookahead", None)
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__, sweep=("min_distance", min_distances))
 
     try:
         series = data['series'][0]['raw']
@@ -67,23 +42,21 @@ def main():
         if init_count >= n_points:
             raise ValueError("init_size too large for the dataset")
 
-        detector = OnlineEWMAChangeDetector(alpha=args.alpha, threshold=args.threshold)
-        drift_points = []
-        last_cp = -args.min_distance
-
         start_time = time.time()
+        begin_stage("detect")
 
-        for i, x in enumerate(series):
-            detector.update(x)
-            if i >= init_count and detector.detected_change() and (i - last_cp > args.min_distance):
-                drift_points.append(i)
-                last_cp = i
+        # the lookahead variant updates the detector with the true points
+        # (considered past) and checks the average of the points that follow
+        artificial = None if lookahead is None else lookahead_means(series, lookahead)
+        alarms = ewma(series, args.alpha, args.threshold, start=init_count, probe=artificial)
 
+        results = {md: suppress_close_alarms(alarms, md) for md in min_distances}
         runtime = time.time() - start_time
-        exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
+        begin_stage("postprocess")
+        exit_success_sweep(data, raw_args, vars(args), "min_distance", results, runtime, __file__)
 
     except Exception as e:
-        exit_with_error(data, raw_args, vars(args), str(e), __file__)
+        exit_with_error_sweep(data, raw_args, vars(args), "min_distance", min_distances, str(e), __file__)
 
 if __name__ == "__main__":
     main()
@@ -13,6 +13,8 @@ import ruptures as rpt
 import copy
 import numpy as np
 from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from time_budget import start_time_budget
+from timings import begin_stage
 
 
 def parse_args():
@@ -22,6 +24,7 @@ def parse_args():
     parser.add_argument('-L', '--maxcp', type=int, default=100, help="Maximum number of change points for KCPA (default is 100).")
     parser.add_argument('-m', '--minsize', type=float, help="Minimum size.", default=3)
     parser.add_argument('-k', '--kernel', type=str, help="Kernel.", default='linear')
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 
@@ -29,7 +32,9 @@ def main():
     args = parse_args()
     data, mat = load_dataset(args.input)
     start_time = time.time()
+    begin_stage("detect")
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__)
     try:
         series = data['series'][0]['raw']
         transformed_data = np.array(series).reshape(-1, 1)
@@ -37,6 +42,7 @@ def main():
         locations = algo.predict(n_bkps=args.maxcp)
         stop_time = time.time()
         runtime = stop_time - start_time
+        begin_stage("postprocess")
         exit_success(data, raw_args, vars(args), locations, runtime, __file__)
     except Exception as e:
         exit_with_error(data, raw_args, vars(args), str(e), __file__)
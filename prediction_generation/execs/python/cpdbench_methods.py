@@ -7,25 +7,26 @@ Author: Mohamed Bilel Besbes
 Date: 2025-08-26
 
 """
-import functools
 import argparse
 import time
 import copy
 import numpy as np
-from datetime import datetime
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
-from collections import defaultdict
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, labelled_output, RevisionSeries, RevisionChange, get_noise_profile
+from batch_runner import run_batch
+from signatures_index import load_signature, load_signatures_attributes
+from time_budget import start_time_budget
+from timings import begin_stage
 #from django.db import transaction
-import moz_measure_noise
 import json
 import os
 from collections import namedtuple
-import newrelic.agent
-import logging
 from scipy import stats
+from rank_tests import RANK_TESTS, SortedWindow
 
 def analyze(revision_data, weight_fn=None):
-    """Returns the average and sample variance (s**2) of a list of floats.
+    """Returns the average and sample variance (s**2) of a list of revisions.
+
+    `revision_data` holds one list of values per revision.
 
     `weight_fn` is a function that takes a list index and a window width, and
     returns a weight that is used to calculate a weighted average.  For example,
@@ -45,13 +46,13 @@ def analyze(revision_data, weight_fn=None):
     weighted_sum = 0
     sum_of_weights = 0
     for i in range(num_revisions):
-        weighted_sum += sum(value * weights[i] for value in revision_data[i].values)
-        sum_of_weights += weights[i] * len(revision_data[i].values)
+        weighted_sum += sum(value * weights[i] for value in revision_data[i])
+        sum_of_weights += weights[i] * len(revision_data[i])
     weighted_avg = weighted_sum / sum_of_weights if num_revisions > 0 else 0.0
 
     # now that we have a weighted average, we can calculate the variance of the
     # whole series
-    all_data = [v for datum in revision_data for v in datum.values]
+    all_data = [v for values in revision_data for v in values]
     variance = (
         (sum(pow(d - weighted_avg, 2) for d in all_data) / (len(all_data) - 1))
         if len(all_data) > 1
@@ -62,11 +63,6 @@ def analyze(revision_data, weight_fn=None):
 
 
 
-def geomean(iterable):
-    # Returns a geomean of a list of values.
-    a = np.array(iterable)
-    return a.prod() ** (1.0 / len(a))
-
 def default_weights(i, n):
     """A window function that weights all points uniformly."""
     return 1.0
@@ -84,9 +80,19 @@ def linear_weights(i, n):
     return float(n - i) / float(n)
 
 
-def run_test(method, jw, kw):
-    jw_values = [v for datum in jw for v in datum.values]
-    kw_values = [v for datum in kw for v in datum.values]
+def run_rank_test(method, jw_sorted, kw_sorted):
+    """`run_test` of a rank test on sorted windows without NaNs"""
+    stat, p = RANK_TESTS[method](jw_sorted, kw_sorted)
+    if method == "anderson":
+        # significance level in percent, see run_test
+        p = p / 100.0
+    return stat, p
+
+
+def run_test(method, jw_values, kw_values):
+    if method in RANK_TESTS and not (np.isnan(jw_values).any() or np.isnan(kw_values).any()):
+        # the exact null distributions of the rank tests are cached by sample sizes
+        return run_rank_test(method, np.sort(jw_values), np.sort(kw_values))
     if method == "welch":
         stat, p = stats.ttest_ind(jw_values, kw_values, equal_var=False)
     elif method == "mwu":
@@ -107,118 +113,131 @@ def run_test(method, jw, kw):
     return stat, p
 
 
-@functools.total_ordering
-class RevisionDatum:
-    """
-    This class represents a specific revision and the set of values for it
-    """
-
-    def __init__(self, push_timestamp, push_id, values):
-        # Date code was pushed
-        self.push_timestamp = push_timestamp
-
-        # What revision this data is for (usually, but not guaranteed
-        # to be increasing with push_timestamp)
-        self.push_id = push_id
+METHODS = ["welch", "mwu", "ks", "cvm", "levene", "anderson"]
 
-        # data values associated with this revision
-        self.values = copy.copy(values)
 
-        self.stat = 0
-        self.p = 1.0
-
-        # Whether a perf regression or improvement was found
-        self.change_detected = False
-
-    def __eq__(self, o):
-        return self.push_timestamp == o.push_timestamp
-
-    def __lt__(self, o):
-        return self.push_timestamp < o.push_timestamp
-
-    def __repr__(self):
-        values_csv = ", ".join([f"{value:.3f}" for value in self.values])
-        values_str = f"[ {values_csv} ]"
-        return f"<{self.push_timestamp}: {self.push_id}, {values_str}, {self.stat:.3f}, {self.p:.3f}, {self.change_detected}>"
+def detect_changes(series, min_back_window=12, max_back_window=24, fore_window=12, alpha=0.05, method="welch"):
+    """Return the RevisionChange of every revision flagged as a change.
 
+    `series` is a RevisionSeries. The windows are the ones of the Perfherder
+    t-test detector, with `method` deciding whether the values before and
+    after a revision differ at level `alpha`.
+    """
+    return detect_changes_multi(
+        series,
+        [method],
+        min_back_window=min_back_window,
+        max_back_window=max_back_window,
+        fore_window=fore_window,
+        alpha=alpha,
+    )[method]
 
-def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12, alpha=0.05, method="welch"):
-    # Use T-Tests
-    # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
-    data = sorted(data)
 
-    last_seen_regression = 0
-    for i in range(1, len(data)):
-        di = data[i]
+def detect_changes_multi(series, methods, min_back_window=12, max_back_window=24, fore_window=12, alpha=0.05):
+    """Run `detect_changes` for several methods in a single pass.
 
-        # keep on getting previous data until we've either got at least 12
-        # data points *or* we've hit the maximum back window
-        jw = []
-        di.amount_prev_data = 0
-        prev_indice = i - 1
-        while (
-            di.amount_prev_data < max_back_window
-            and prev_indice >= 0
-            and (
-                (i - prev_indice)
-                <= min(max(last_seen_regression, min_back_window), max_back_window)
+    The forward window of a revision is the same for every method, and the
+    historical window only differs between methods that disagree on the last
+    regression, so the windows are sliced once per index and shared by all
+    the tests. The rank tests (KS, MWU, CvM and Anderson-Darling) keep their
+    windows sorted from one index to the next instead of sorting them for
+    every test.
+    Returns a dict mapping each method to its list of RevisionChange.
+    """
+    # Analyze test data using statistical tests, comparing data[i-j:i] to data[i:i+k]
+    n = len(series)
+    p = {method: [1.0] * n for method in methods}
+    stat = {method: [0] * n for method in methods}
+    starts = {method: [0] * n for method in methods}
+    ends = [0] * n
+    last_seen_regression = dict.fromkeys(methods, 0)
+    # NaNs cannot be kept in order, scipy handles them
+    sorted_windows = not np.isnan(series.values).any()
+    fore_sorted = SortedWindow(series)
+    back_sorted = {method: SortedWindow(series) for method in methods if method in RANK_TESTS}
+
+    for i in range(1, n):
+        # accumulate present + future data until we've got at least 12 values
+        end = ends[i] = series.fore_window_end(i, fore_window)
+        kw_values = series.window(i, end)
+        kw_sorted = None
+        jw_values = {}
+        for method in methods:
+            # keep on getting previous data until we've either got at least 12
+            # data points *or* we've hit the maximum back window
+            start = starts[method][i] = series.back_window_start(
+                i, last_seen_regression[method], min_back_window, max_back_window
+            )
+            if i - start > 1 and end - i > 1:
+                if sorted_windows and method in RANK_TESTS:
+                    if kw_sorted is None:
+                        kw_sorted = fore_sorted.move(i, end)
+                    jw_sorted = back_sorted[method].move(start, i)
+                    stat[method][i], p[method][i] = run_rank_test(method, jw_sorted, kw_sorted)
+                else:
+                    if start not in jw_values:
+                        jw_values[start] = series.window(start, i)
+                    stat[method][i], p[method][i] = run_test(method, jw_values[start], kw_values)
+
+            if p[method][i] < alpha:
+                last_seen_regression[method] = 0
+            else:
+                last_seen_regression[method] += 1
+
+    stats_cache = {}
+
+    def window_stats(start, end, reverse=False):
+        key = (start, end, reverse)
+        if key not in stats_cache:
+            stats_cache[key] = analyze(series.revisions(start, end, reverse=reverse))
+        return stats_cache[key]
+
+    changes = {}
+    for method in methods:
+        changes[method] = []
+        mp = p[method]
+        for i in range(1, n):
+            start, end = starts[method][i], ends[i]
+            if series.amount(start, i) < min_back_window or series.amount(i, end) < fore_window:
+                continue
+            if mp[i] >= alpha:
+                continue
+            if mp[i - 1] < mp[i]:
+                continue
+            if (i + 1) < n and mp[i + 1] < mp[i]:
+                continue
+            changes[method].append(
+                RevisionChange(
+                    i,
+                    stat[method][i],
+                    window_stats(start, i, reverse=True),
+                    window_stats(i, end),
+                )
             )
-        ):
-            jw.append(data[prev_indice])
-            di.amount_prev_data += len(jw[-1].values)
-            prev_indice -= 1
 
-        # accumulate present + future data until we've got at least 12 values
-        kw = []
-        di.amount_next_data = 0
-        next_indice = i
-        while di.amount_next_data < fore_window and next_indice < len(data):
-            kw.append(data[next_indice])
-            di.amount_next_data += len(kw[-1].values)
-            next_indice += 1
-
-        di.historical_stats = analyze(jw)
-        di.forward_stats = analyze(kw)
-
-        if len(jw) > 1 and len(kw) > 1:
-            di.stat, di.p = run_test(method, jw, kw)
-        else:
-            di.stat, di.p = 0, 1.0
-
-        if di.p < alpha:
-            last_seen_regression = 0
-        else:
-            last_seen_regression += 1
-
-    for i in range(1, len(data)):
-        di = data[i]
-        if di.amount_prev_data < min_back_window or di.amount_next_data < fore_window:
-            continue
-        if di.p >= alpha:
-            continue
-        prev = data[i - 1]
-        if prev.p < di.p:
-            continue
-        if (i + 1) < len(data) and data[i + 1].p < di.p:
-            continue
-        di.change_detected = True
-
-    return data
+    return changes
 
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run statistical test on a time series dataset.")
-    parser.add_argument('-i', '--input', required=True, help="Path to input JSON dataset.")
+    parser.add_argument('-i', '--input', help="Path to input JSON dataset.")
     parser.add_argument('-o', '--output', help="Path to output file.")
     parser.add_argument('-a', '--signatures-attributes', required=True, help="JSON file of signatures attributes")
-    parser.add_argument('--method', choices=["welch", "mwu", "ks", "cvm", "levene", "anderson"], required=True, help="Statistical test method to use.")
+    parser.add_argument('--method', nargs='+', choices=METHODS + ["all"], required=True, help="Statistical test method(s) to use. With several methods, or 'all', the windows are built once and one result is written per method.")
     parser.add_argument('--min-back-window', type=int, default=12)
     parser.add_argument('--max-back-window', type=int, default=24)
     parser.add_argument('--fore-window', type=int, default=12)
     parser.add_argument('--alpha', type=float, default=0.05)
-    parser.add_argument('--alert-threshold', default="2")
-    return parser.parse_args()
+    parser.add_argument('--alert-threshold', nargs='+', default="2", help="Alert threshold value(s). With several values the changes are detected once and one result is written per threshold.")
+    parser.add_argument('--noise-profile', action='store_true', default=argparse.SUPPRESS, help='Record the noise profile of every alert in the result, as moz_measure_noise.deviance computes it, it does not change the detected locations (default: off)')
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
+    parser.add_argument('--batch', default=argparse.SUPPRESS, help="Directory of JSON datasets, or manifest file listing one dataset per line, to run instead of --input. All results are written to --output, or stdout, as one JSON object per line.")
+    parser.add_argument('-j', '--jobs', type=int, default=argparse.SUPPRESS, help="Number of worker processes of --batch (default: number of CPUs)")
+    args = parser.parse_args()
+    if args.input is None and not hasattr(args, "batch"):
+        parser.error("one of the arguments -i/--input --batch is required")
+    return args
 
 
 
@@ -236,31 +255,68 @@ def get_alert_properties(prev_value, new_value, lower_is_better):
 
 
 
-def main():
-    logger = logging.getLogger(__name__)
-    args = parse_args()
+def get_alerts(changes, signature):
+    """Pair every change with its alert properties for the given signature"""
+    alerts = []
+    #with transaction.atomic():
+    for cur in changes:
+        prev_value = cur.historical_stats["avg"]
+        new_value = cur.forward_stats["avg"]
+        alert_properties = get_alert_properties(
+            prev_value, new_value, signature.lower_is_better
+        )
+
+        # summary, _ = PerformanceAlertSummary.objects.get_or_create(
+        #     repository=signature.repository,
+        #     framework=signature.framework,
+        #     push_id=cur.push_id,
+        #     prev_push_id=prev.push_id,
+        #     defaults={
+        #         "manually_created": False,
+        #         "created": datetime.utcfromtimestamp(cur.push_timestamp),
+        #     },
+        # )
+
+        alerts.append((cur, alert_properties))
+        
+        # PerformanceAlert.objects.update_or_create(
+        #     summary=summary,
+        #     series_signature=signature,
+        #     defaults={
+        #         "noise_profile": noise_profile,
+        #         "is_regression": alert_properties.is_regression,
+        #         "amount_pct": alert_properties.pct_change,
+        #         "amount_abs": alert_properties.delta,
+        #         "prev_value": prev_value,
+        #         "new_value": new_value,
+        #         "t_value": t_value,
+        #     },
+        # )
+
+    return alerts
+
+
+def run(args):
+    """Detect the changes of the dataset of args.input and write the results"""
+    methods = METHODS if "all" in args.method else list(dict.fromkeys(args.method))
+    if len(methods) == 1:
+        args.method = methods[0]
+    alert_thresholds = args.alert_threshold if isinstance(args.alert_threshold, list) else [args.alert_threshold]
+    if len(alert_thresholds) == 1:
+        args.alert_threshold = alert_thresholds[0]
     data, mat = load_dataset(args.input)
     raw_data = data.copy()
     start_time = time.time()
-    with open(args.signatures_attributes, 'r') as file:
-        signatures_attributes = json.load(file)
-    signature_id = os.path.splitext(os.path.basename(args.input))[0]
-    signature_attributes = signatures_attributes[signature_id]
-    Signature = namedtuple('Signature', signature_attributes.keys())
-    signature = Signature(**signature_attributes)
+    signature = load_signature(args.signatures_attributes, args.input)
     # print(len(data['time']['raw']))
     # print(len(data['series'][0]['raw']))
     raw_args = copy.deepcopy(args)
+    start_time_budget(
+        raw_data, raw_args, vars(args), __file__,
+        sweep=[("method", methods), ("alert_threshold", alert_thresholds)],
+    )
     #try:
-    series = data['series'][0]['raw']
-    push_timestamp = data['time']['raw']
-    push_timestamp = [datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in push_timestamp]
-    #unique_push_timestamp = sorted(set(datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in push_timestamp))
-    unique_push_timestamp = sorted(set(push_timestamp))
-    grouped_data = defaultdict(list)
-    for ts, value in zip(push_timestamp, series):
-        grouped_data[ts].append(value)
-    data = [RevisionDatum(ts, ts, grouped_data[ts]) for ts in grouped_data]
+    series = RevisionSeries.from_dataset(data)
     # data_sorted = sorted(data)
     # These values are the default taken from the Mozilla code, Note that min_back_window, max_back_window, and fore_window come from class Performancesignature, I did not find them on record in the signatures data we have o we will be using the defaults
     
@@ -268,102 +324,76 @@ def main():
     max_back_window=args.max_back_window
     fore_window=args.fore_window
     alpha=args.alpha
-    method=args.method
-    alert_threshold=args.alert_threshold
-    analyzed_series = detect_changes(
-        data,
+    begin_stage("detect")
+    changes = detect_changes_multi(
+        series,
+        methods,
         min_back_window=min_back_window,
         max_back_window=max_back_window,
         fore_window=fore_window,
         alpha=alpha,
-        method=method
     )
-    locations = []
-    #with transaction.atomic():
-    for prev, cur in zip(analyzed_series, analyzed_series[1:]):
-        if cur.change_detected:
-            prev_value = cur.historical_stats["avg"]
-            new_value = cur.forward_stats["avg"]
-            alert_properties = get_alert_properties(
-                prev_value, new_value, signature.lower_is_better
-            )
-            noise_profile = "N/A"
-            try:
-                # Gather all data up to the current data point that
-                # shows the regression and obtain a noise profile on it.
-                # This helps us to ignore this alert and others in the
-                # calculation that could influence the profile.
-                noise_data = []
-                for point in analyzed_series:
-                    if point == cur:
-                        break
-                    noise_data.append(geomean(point.values))
-
-                noise_profile, _ = moz_measure_noise.deviance(noise_data)
-                if not isinstance(noise_profile, str):
-                    raise Exception(
-                        f"Expecting a string as a noise profile, got: {type(noise_profile)}"
-                    )
-            except Exception:
-                # Fail without breaking the alert computation
-                newrelic.agent.notice_error()
-                logger.error("Failed to obtain a noise profile.")
-
-            # ignore regressions below the configured regression
-            # threshold
-
-            # ALERT_PCT, ALERT_ABS, and ALERT_CHANGE_TYPES come from the PerformanceSignature class in the Treeherder code
-            '''
-            ALERT_PCT = 0
-            ALERT_ABS = 1
-            ALERT_CHANGE_TYPES = ((ALERT_PCT, "percentage"), (ALERT_ABS, "absolute"))
-            if args.alert_threshold != "disabled":
-                if (
-                    (
-                        signature.alert_change_type is None
-                        or signature.alert_change_type == ALERT_PCT
-                    )
-                    and alert_properties.pct_change < float(alert_threshold)
-                ) or (
-                    signature.alert_change_type == ALERT_ABS
-                    and abs(alert_properties.delta) < float(alert_threshold)
-                ):
-                    continue
-            '''
-            # summary, _ = PerformanceAlertSummary.objects.get_or_create(
-            #     repository=signature.repository,
-            #     framework=signature.framework,
-            #     push_id=cur.push_id,
-            #     prev_push_id=prev.push_id,
-            #     defaults={
-            #         "manually_created": False,
-            #         "created": datetime.utcfromtimestamp(cur.push_timestamp),
-            #     },
-            # )
-
-
-            # This is where we create the alert aka append its index in the locations list
-            # locations += [str(i) + "/t_value/" + str(cur.t) + "/pct_value/" + str(alert_properties.pct_change) + "/prev_value/" + str(prev_value) + "/new_value/" + str(new_value) for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
-            locations += [i for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
-            
-            # PerformanceAlert.objects.update_or_create(
-            #     summary=summary,
-            #     series_signature=signature,
-            #     defaults={
-            #         "noise_profile": noise_profile,
-            #         "is_regression": alert_properties.is_regression,
-            #         "amount_pct": alert_properties.pct_change,
-            #         "amount_abs": alert_properties.delta,
-            #         "prev_value": prev_value,
-            #         "new_value": new_value,
-            #         "t_value": t_value,
-            #     },
-            # )
-
-    stop_time = time.time()
-    runtime = stop_time - start_time
-    exit_success(raw_data, raw_args, vars(args), locations, runtime, __file__)
+    for method in methods:
+        alerts = get_alerts(changes[method], signature)
+        for alert_threshold in alert_thresholds:
+            locations = []
+            for cur, alert_properties in alerts:
+                # ignore regressions below the configured regression
+                # threshold
+
+                # ALERT_PCT, ALERT_ABS, and ALERT_CHANGE_TYPES come from the PerformanceSignature class in the Treeherder code
+                '''
+                ALERT_PCT = 0
+                ALERT_ABS = 1
+                ALERT_CHANGE_TYPES = ((ALERT_PCT, "percentage"), (ALERT_ABS, "absolute"))
+                if alert_threshold != "disabled":
+                    if (
+                        (
+                            signature.alert_change_type is None
+                            or signature.alert_change_type == ALERT_PCT
+                        )
+                        and alert_properties.pct_change < float(alert_threshold)
+                    ) or (
+                        signature.alert_change_type == ALERT_ABS
+                        and abs(alert_properties.delta) < float(alert_threshold)
+                    ):
+                        continue
+                '''
+                # This is where we create the alert aka append its index in the locations list
+                # locations += [str(i) + "/t_value/" + str(cur.t) + "/pct_value/" + str(alert_properties.pct_change) + "/prev_value/" + str(prev_value) + "/new_value/" + str(new_value) for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
+                locations.append(cur.index)
+
+            noise_profiles = None
+            if getattr(args, "noise_profile", False):
+                noise_profiles = [get_noise_profile(series, i) for i in locations]
+
+            stop_time = time.time()
+            runtime = stop_time - start_time
+            begin_stage("postprocess")
+            labels = {}
+            if len(methods) > 1:
+                labels["method"] = method
+            if len(alert_thresholds) > 1:
+                labels["alert_threshold"] = alert_threshold
+            run_args = copy.deepcopy(raw_args)
+            run_args.method = method
+            run_args.alert_threshold = alert_threshold
+            run_args.output = labelled_output(args.output, **labels)
+            exit_success(raw_data, run_args, vars(run_args), locations, runtime, __file__, noise_profiles=noise_profiles)
     # except Exception as e:
     #     exit_with_error(raw_data, raw_args, vars(args), str(e), __file__)
+
+
+def main():
+    args = parse_args()
+    if hasattr(args, "batch"):
+        # parsed once here, before the workers are forked
+        load_signatures_attributes(args.signatures_attributes)
+        if run_batch(run, args, __file__):
+            raise SystemExit(1)
+        return
+    run(args)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -14,6 +14,8 @@ import time
 from signal_processing_algorithms.energy_statistics import energy_statistics
 
 from cpdbench_utils import load_dataset, exit_success
+from time_budget import start_time_budget
+from timings import begin_stage
 
 
 def parse_args():
@@ -22,13 +24,16 @@ def parse_args():
     parser.add_argument("-o", "--output", help="path to the output file")
     parser.add_argument("-p", "--pvalue", help="the significance cutoff for the algorithm for each test", default=0.01, type=float)
     parser.add_argument("-n", "--permutations", help="number of permutations for the data for each test", default=100, type=int)
+    parser.add_argument("--time-budget", type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
     data, mat = load_dataset(args.input)
+    start_time_budget(data, args, {}, __file__)
     start_time = time.time()
+    begin_stage("detect")
 
     # start changepoint detection
     series = data['series'][0]['raw']
@@ -36,6 +41,7 @@ def main():
 
     stop_time = time.time()
     runtime = stop_time - start_time
+    begin_stage("postprocess")
     exit_success(data, args, {}, locations, runtime, __file__)
 
 
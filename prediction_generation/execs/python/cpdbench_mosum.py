@@ -4,8 +4,10 @@
 import argparse
 import time
 import copy
-import numpy as np
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success_sweep, exit_with_error_sweep, lookahead_means, sweep_values
+from time_budget import start_time_budget
+from timings import begin_stage
+from online_kernels import mosum
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run Online MOSUM on a time series dataset.")
@@ -13,13 +15,18 @@ def parse_args():
     parser.add_argument('-o', '--output', help="Path to the output JSON file.")
     parser.add_argument('--window-size', type=int, default=30, help="Size of the moving window (default: 30)")
     parser.add_argument('--threshold', type=float, default=3.0, help="Threshold on the mean change to flag a change point (default: 3.0)")
-    parser.add_argument('--min-distance', type=int, default=30, help="Minimum distance between change points (default: 30)")
+    parser.add_argument('--min-distance', type=int, nargs='+', default=30, help="Minimum distance between change points, several values are evaluated in a single run (default: 30)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS, help="Number of future points to average for detection, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
+    min_distances = sweep_values(args, "min_distance")
+    lookahead = getattr(args, "lookahead", None)
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__, sweep=("min_distance", min_distances))
 
     try:
         series = data['series'][0]['raw']
@@ -30,36 +37,24 @@ def main():
         if W >= n:
             raise ValueError("window-size too large for the dataset")
 
-        drift_points = []
-        last_cp = -args.min_distance  # allow first detection
         start_time = time.time()
+        begin_stage("detect")
 
-        buffer = []
-
-        for i in range(n):
-            buffer.append(series[i])
-            if len(buffer) > W:
-                buffer.pop(0)
-
-            if len(buffer) < W:
-                continue  # wait for full window
-
-            first_half = buffer[:W//2]
-            second_half = buffer[W//2:]
-
-            mean_diff = abs(np.mean(first_half) - np.mean(second_half))
-
-            if mean_diff > threshold and (i - last_cp > args.min_distance):
-                drift_points.append(i)
-                last_cp = i
-                # Optionally clear buffer to reset
-                buffer = []
+        # the lookahead variant creates artificial points as mean of next
+        # `lookahead` points, they are included in the second half for
+        # evaluation only
+        x_artificial = None if lookahead is None else lookahead_means(series, lookahead)
+        results = {
+            md: mosum(series, W, threshold, md, probe=x_artificial)
+            for md in min_distances
+        }
 
         runtime = time.time() - start_time
-        exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
+        begin_stage("postprocess")
+        exit_success_sweep(data, raw_args, vars(args), "min_distance", results, runtime, __file__)
 
     except Exception as e:
-        exit_with_error(data, raw_args, vars(args), str(e), __file__)
+        exit_with_error_sweep(data, raw_args, vars(args), "min_distance", min_distances, str(e), __file__)
 
 if __name__ == "__main__":
     main()
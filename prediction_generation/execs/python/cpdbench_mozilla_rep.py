@@ -7,25 +7,25 @@ Author: Mohamed Bilel Besbes
 Date: 2025-01-28
 
 """
-import functools
 import argparse
 import time
 import copy
 import numpy as np
-from datetime import datetime
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
-from collections import defaultdict
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, labelled_output, RevisionSeries, RevisionChange, get_noise_profile
+from batch_runner import run_batch
+from signatures_index import load_signature, load_signatures_attributes
+from time_budget import start_time_budget
+from timings import begin_stage
 #from django.db import transaction
-import moz_measure_noise
 import json
 import os
 from collections import namedtuple
-import newrelic.agent
-import logging
 
 def analyze(revision_data, weight_fn=None):
     """Returns the average and sample variance (s**2) of a list of floats.
 
+    `revision_data` is a list holding the list of values of each revision.
+
     `weight_fn` is a function that takes a list index and a window width, and
     returns a weight that is used to calculate a weighted average.  For example,
     see `default_weights` or `linear_weights` below.  If no function is passed,
@@ -44,13 +44,13 @@ def analyze(revision_data, weight_fn=None):
     weighted_sum = 0
     sum_of_weights = 0
     for i in range(num_revisions):
-        weighted_sum += sum(value * weights[i] for value in revision_data[i].values)
-        sum_of_weights += weights[i] * len(revision_data[i].values)
+        weighted_sum += sum(value * weights[i] for value in revision_data[i])
+        sum_of_weights += weights[i] * len(revision_data[i])
     weighted_avg = weighted_sum / sum_of_weights if num_revisions > 0 else 0.0
 
     # now that we have a weighted average, we can calculate the variance of the
     # whole series
-    all_data = [v for datum in revision_data for v in datum.values]
+    all_data = [v for values in revision_data for v in values]
     variance = (
         (sum(pow(d - weighted_avg, 2) for d in all_data) / (len(all_data) - 1))
         if len(all_data) > 1
@@ -61,11 +61,6 @@ def analyze(revision_data, weight_fn=None):
 
 
 
-def geomean(iterable):
-    # Returns a geomean of a list of values.
-    a = np.array(iterable)
-    return a.prod() ** (1.0 / len(a))
-
 def default_weights(i, n):
     """A window function that weights all points uniformly."""
     return 1.0
@@ -104,117 +99,174 @@ def calc_t(w1, w2, weight_fn=None):
 
 
 
-@functools.total_ordering
-class RevisionDatum:
-    """
-    This class represents a specific revision and the set of values for it
-    """
-
-    def __init__(self, push_timestamp, push_id, values):
-        # Date code was pushed
-        self.push_timestamp = push_timestamp
-
-        # What revision this data is for (usually, but not guaranteed
-        # to be increasing with push_timestamp)
-        self.push_id = push_id
-
-        # data values associated with this revision
-        self.values = copy.copy(values)
-
-        # t-test score
-        self.t = 0
-
-        # Whether a perf regression or improvement was found
-        self.change_detected = False
-
-    def __eq__(self, o):
-        return self.push_timestamp == o.push_timestamp
-
-    def __lt__(self, o):
-        return self.push_timestamp < o.push_timestamp
-
-    def __repr__(self):
-        values_csv = ", ".join([f"{value:.3f}" for value in self.values])
-        values_str = f"[ {values_csv} ]"
-        return f"<{self.push_timestamp}: {self.push_id}, {values_str}, {self.t:.3f}, {self.change_detected}>"
-
-
+class RevisionWindowSums:
+    """Prefix sums over the values of a RevisionSeries.
 
+    The statistics of any contiguous run of revisions ``a, ..., b - 1`` can
+    then be obtained from a handful of array lookups instead of walking the
+    values of every revision in the window.  Values are centered on their
+    global mean before accumulating to limit the loss of precision in the sums
+    of squares.
+    """
 
-def detect_changes(data, min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7):
+    def __init__(self, series):
+        values = series.values
+        offsets = series.offsets
+        counts = np.diff(offsets)
+        centered = values - (values.mean() if len(values) else 0.0)
+
+        # per-revision sums, then cumulative sums with a leading zero so that
+        # the sum over revisions a, ..., b - 1 is always X[b] - X[a]
+        sums = np.add.reduceat(centered, offsets[:-1]) if len(values) else np.zeros(0)
+        squares = np.add.reduceat(centered ** 2, offsets[:-1]) if len(values) else np.zeros(0)
+        index = np.arange(len(series), dtype=np.float64)
+
+        self.counts = offsets.tolist()
+        self.sums = np.concatenate(([0.0], np.cumsum(sums))).tolist()
+        self.squares = np.concatenate(([0.0], np.cumsum(squares))).tolist()
+        self.index_sums = np.concatenate(([0.0], np.cumsum(index * sums))).tolist()
+        self.index_counts = np.concatenate(([0.0], np.cumsum(index * counts))).tolist()
+
+        # number of value changes between consecutive entries of the flattened
+        # array, used to recognise windows holding a single repeated value
+        changes = np.concatenate(([0, 0], np.cumsum(values[1:] != values[:-1])))
+        self.changes = changes.tolist()
+
+    def is_constant(self, a, b):
+        """Whether all the values of revisions a, ..., b - 1 are equal."""
+        p, q = self.counts[a], self.counts[b]
+        return q - p < 2 or self.changes[q] - self.changes[p + 1] == 0
+
+    def linear_stats(self, a, b, rising):
+        """Linearly weighted average, count and variance of revisions a, ..., b - 1.
+
+        The weights match `linear_weights` applied in the order in which
+        `detect_changes` collects the window: the back window is collected
+        backwards from ``b - 1`` (``rising`` weights towards ``b``) and the
+        forward window forwards from ``a`` (falling weights away from ``a``).
+        """
+        n = self.counts[b] - self.counts[a]
+        s = self.sums[b] - self.sums[a]
+        q = self.squares[b] - self.squares[a]
+        rs = self.index_sums[b] - self.index_sums[a]
+        rc = self.index_counts[b] - self.index_counts[a]
+        if rising:
+            weighted_sum = rs - (a - 1) * s
+            sum_of_weights = rc - (a - 1) * n
+        else:
+            weighted_sum = b * s - rs
+            sum_of_weights = b * n - rc
+        avg = weighted_sum / sum_of_weights
+        variance = max((q - 2 * avg * s + n * avg * avg) / (n - 1), 0.0) if n > 1 else 0.0
+        return avg, n, variance
+
+
+def detect_changes(series, min_back_window=12, max_back_window=24, fore_window=12, t_threshold=7):
+    """Return the RevisionChange of every revision flagged as a change.
+
+    This computes the same windows and t values as the reference Perfherder
+    implementation, but reads the window statistics from prefix sums (see
+    RevisionWindowSums) instead of re-walking the revision values for every
+    index. Windows made of a single repeated value, and t values within
+    rounding distance of the threshold or of the t value they are compared
+    with, are recomputed with `calc_t` so that the detected locations are
+    exactly the reference ones.
+    """
     # Use T-Tests
     # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
-    data = sorted(data)
+    sums = RevisionWindowSums(series)
+    tolerance = 1e-7 * max(1.0, abs(t_threshold))
+    n = len(series)
+    t = [0] * n
+    # whether t[i] is the one calc_t gives
+    exact = [True] * n
+    windows = [None] * n
+    amount_prev_data = [0] * n
+    amount_next_data = [0] * n
 
     last_seen_regression = 0
-    for i in range(1, len(data)):
-        di = data[i]
-
+    for i in range(1, n):
         # keep on getting previous data until we've either got at least 12
         # data points *or* we've hit the maximum back window
-        jw = []
-        di.amount_prev_data = 0
-        prev_indice = i - 1
-        while (
-            di.amount_prev_data < max_back_window
-            and prev_indice >= 0
-            and (
-                (i - prev_indice)
-                <= min(max(last_seen_regression, min_back_window), max_back_window)
-            )
-        ):
-            jw.append(data[prev_indice])
-            di.amount_prev_data += len(jw[-1].values)
-            prev_indice -= 1
-
+        start = series.back_window_start(
+            i, last_seen_regression, min_back_window, max_back_window
+        )
         # accumulate present + future data until we've got at least 12 values
-        kw = []
-        di.amount_next_data = 0
-        next_indice = i
-        while di.amount_next_data < fore_window and next_indice < len(data):
-            kw.append(data[next_indice])
-            di.amount_next_data += len(kw[-1].values)
-            next_indice += 1
-
-        di.historical_stats = analyze(jw)
-        di.forward_stats = analyze(kw)
-
-        di.t = abs(calc_t(jw, kw, linear_weights))
+        end = series.fore_window_end(i, fore_window)
+        amount_prev_data[i] = series.amount(start, i)
+        amount_next_data[i] = series.amount(i, end)
+        windows[i] = (start, end)
+
+        if start == i or end == i:
+            t[i] = 0
+        elif sums.is_constant(start, i) or sums.is_constant(i, end):
+            t[i] = abs(calc_t(series.revisions(start, i, reverse=True), series.revisions(i, end), linear_weights))
+        else:
+            avg1, n1, var1 = sums.linear_stats(start, i, rising=True)
+            avg2, n2, var2 = sums.linear_stats(i, end, rising=False)
+            delta_s = avg2 - avg1
+            if delta_s == 0:
+                t[i] = 0
+            elif var1 == 0 and var2 == 0:
+                t[i] = float("inf")
+            else:
+                t[i] = abs(delta_s / (((var1 / n1) + (var2 / n2)) ** 0.5))
+                exact[i] = False
+            if abs(t[i] - t_threshold) <= tolerance * max(1.0, t[i]):
+                t[i] = abs(calc_t(series.revisions(start, i, reverse=True), series.revisions(i, end), linear_weights))
+                exact[i] = True
+
         # add additional historical data points next time if we
         # haven't detected a likely regression
-        if di.t > t_threshold:
+        if t[i] > t_threshold:
             last_seen_regression = 0
         else:
             last_seen_regression += 1
 
+    def compare(i, j):
+        """Whether t[j] > t[i], with both from calc_t when they are nearly tied"""
+        if abs(t[j] - t[i]) <= tolerance * max(1.0, t[i]):
+            for k in (i, j):
+                if not exact[k]:
+                    start, end = windows[k]
+                    t[k] = abs(calc_t(series.revisions(start, k, reverse=True), series.revisions(k, end), linear_weights))
+                    exact[k] = True
+        return t[j] > t[i]
+
     # Now that the t-test scores are calculated, go back through the data to
     # find where changes most likely happened.
-    for i in range(1, len(data)):
-        di = data[i]
-
+    changes = []
+    for i in range(1, n):
         # if we don't have enough data yet, skip for now (until more comes
         # in)
-        if di.amount_prev_data < min_back_window or di.amount_next_data < fore_window:
+        if amount_prev_data[i] < min_back_window or amount_next_data[i] < fore_window:
             continue
 
-        if di.t <= t_threshold:
+        if t[i] <= t_threshold:
             continue
 
         # Check the adjacent points
-        prev = data[i - 1]
-        if prev.t > di.t:
+        if compare(i, i - 1):
             continue
         # next may or may not exist if it's the last in the series
-        if (i + 1) < len(data):
-            next = data[i + 1]
-            if next.t > di.t:
-                continue
+        if (i + 1) < n and compare(i, i + 1):
+            continue
 
         # This datapoint has a t value higher than the threshold and higher
-        # than either neighbor.  Mark it as the cause of a regression.
-        di.change_detected = True
+        # than either neighbor.  Mark it as the cause of a regression.  The
+        # window averages are only needed to qualify an alert, so they are
+        # computed for the detected changes alone.
+        start, end = windows[i]
+        changes.append(
+            RevisionChange(
+                i,
+                t[i],
+                analyze(series.revisions(start, i, reverse=True)),
+                analyze(series.revisions(i, end)),
+            )
+        )
 
-    return data
+    return changes
 
 
 def parse_args():
@@ -226,7 +278,11 @@ def parse_args():
     parser.add_argument('--max-back-window', type=int, default=24, help="Maximum lookback window size (default: 24).")
     parser.add_argument('--fore-window', type=int, default=12, help="Forecast/forward window size (default: 12).")
     parser.add_argument('--t-threshold', type=int, default=7, help="T statistic threshold for detection (default: 7).")
-    parser.add_argument('--alert-threshold', type=int, default=2, help="Alert threshold value (default: 2).")
+    parser.add_argument('--alert-threshold', type=int, nargs='+', default=2, help="Alert threshold value (default: 2). With several values the changes are detected once and one result is written per threshold.")
+    parser.add_argument('--noise-profile', action='store_true', default=argparse.SUPPRESS, help='Record the noise profile of every alert in the result, as moz_measure_noise.deviance computes it, it does not change the detected locations (default: off)')
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
+    parser.add_argument('--batch', default=argparse.SUPPRESS, help="Directory of JSON datasets, or manifest file listing one dataset per line, to run instead of --input. All results are written to --output, or stdout, as one JSON object per line.")
+    parser.add_argument('-j', '--jobs', type=int, default=argparse.SUPPRESS, help="Number of worker processes of --batch (default: number of CPUs)")
 
     return parser.parse_args()
 
@@ -246,138 +302,138 @@ def get_alert_properties(prev_value, new_value, lower_is_better):
 
 
 
-def main():
-    logger = logging.getLogger(__name__)
-    args = parse_args()
+def is_below_alert_threshold(alert_properties, alert_change_type, alert_threshold):
+    """Whether an alert is too small to be reported for the signature"""
+    # ALERT_PCT, ALERT_ABS, and ALERT_CHANGE_TYPES come from the PerformanceSignature class in the Treeherder code
+    ALERT_PCT = 0
+    ALERT_ABS = 1
+    ALERT_CHANGE_TYPES = ((ALERT_PCT, "percentage"), (ALERT_ABS, "absolute"))
+    return (
+        (
+            alert_change_type is None
+            or alert_change_type == ALERT_PCT
+        )
+        and alert_properties.pct_change < alert_threshold
+    ) or (
+        alert_change_type == ALERT_ABS
+        and abs(alert_properties.delta) < alert_threshold
+    )
+
+
+
+def run(args):
+    """Detect the changes of the dataset of args.input and write the results"""
     data, mat = load_dataset(args.input)
     raw_data = data.copy()
     start_time = time.time()
-    with open(args.signatures_attributes, 'r') as file:
-        signatures_attributes = json.load(file)
-    signature_id = os.path.splitext(os.path.basename(args.input))[0]
-    signature_attributes = signatures_attributes[signature_id]
-    Signature = namedtuple('Signature', signature_attributes.keys())
-    signature = Signature(**signature_attributes)
+    signature = load_signature(args.signatures_attributes, args.input)
     # print(len(data['time']['raw']))
     # print(len(data['series'][0]['raw']))
     raw_args = copy.deepcopy(args)
+    alert_thresholds=args.alert_threshold if isinstance(args.alert_threshold, list) else [args.alert_threshold]
+    start_time_budget(raw_data, raw_args, vars(args), __file__, sweep=("alert_threshold", alert_thresholds))
     #try:
-    series = data['series'][0]['raw']
-    push_timestamp = data['time']['raw']
-    push_timestamp = [datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in push_timestamp]
-    #unique_push_timestamp = sorted(set(datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") for ts in push_timestamp))
-    unique_push_timestamp = sorted(set(push_timestamp))
-    grouped_data = defaultdict(list)
-    for ts, value in zip(push_timestamp, series):
-        grouped_data[ts].append(value)
-    data = [RevisionDatum(ts, ts, grouped_data[ts]) for ts in grouped_data]
-    # data_sorted = sorted(data)
+    series = RevisionSeries.from_dataset(data)
     # These values are the default taken from the Mozilla code, Note that min_back_window, max_back_window, and fore_window come from class Performancesignature, I did not find them on record in the signatures data we have o we will be using the defaults
     
     min_back_window=args.min_back_window
     max_back_window=args.max_back_window
     fore_window=args.fore_window
     t_threshold=args.t_threshold
-    alert_threshold=args.alert_threshold
-    analyzed_series = detect_changes(
-        data,
+    begin_stage("detect")
+    changes = detect_changes(
+        series,
         min_back_window=min_back_window,
         max_back_window=max_back_window,
         fore_window=fore_window,
         t_threshold=t_threshold,
     )
-    locations = []
+    alerts = []
     #with transaction.atomic():
-    for prev, cur in zip(analyzed_series, analyzed_series[1:]):
-        if cur.change_detected:
-            prev_value = cur.historical_stats["avg"]
-            new_value = cur.forward_stats["avg"]
-            alert_properties = get_alert_properties(
-                prev_value, new_value, signature.lower_is_better
+    for cur in changes:
+        prev_value = cur.historical_stats["avg"]
+        new_value = cur.forward_stats["avg"]
+        alert_properties = get_alert_properties(
+            prev_value, new_value, signature.lower_is_better
+        )
+
+        # summary, _ = PerformanceAlertSummary.objects.get_or_create(
+        #     repository=signature.repository,
+        #     framework=signature.framework,
+        #     push_id=cur.push_id,
+        #     prev_push_id=prev.push_id,
+        #     defaults={
+        #         "manually_created": False,
+        #         "created": datetime.utcfromtimestamp(cur.push_timestamp),
+        #     },
+        # )
+
+        # django/mysql doesn't understand "inf", so just use some
+        # arbitrarily high value for that case
+        t_value = cur.stat
+        if t_value == float("inf"):
+            t_value = 1000
+
+
+
+        # The alert thresholds are applied below, so that every threshold
+        # reuses the detection and the noise profile
+        alerts.append((cur, alert_properties))
+        
+        # PerformanceAlert.objects.update_or_create(
+        #     summary=summary,
+        #     series_signature=signature,
+        #     defaults={
+        #         "noise_profile": noise_profile,
+        #         "is_regression": alert_properties.is_regression,
+        #         "amount_pct": alert_properties.pct_change,
+        #         "amount_abs": alert_properties.delta,
+        #         "prev_value": prev_value,
+        #         "new_value": new_value,
+        #         "t_value": t_value,
+        #     },
+        # )
+
+    for alert_threshold in alert_thresholds:
+        # ignore regressions below the configured regression
+        # threshold
+
+        # This is where we create the alert aka append its index in the locations list
+        # locations += [str(i) + "/t_value/" + str(cur.t) + "/pct_value/" + str(alert_properties.pct_change) + "/prev_value/" + str(prev_value) + "/new_value/" + str(new_value) for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
+        locations = [
+            cur.index
+            for cur, alert_properties in alerts
+            if not is_below_alert_threshold(
+                alert_properties, signature.alert_change_type, alert_threshold
             )
-            noise_profile = "N/A"
-            try:
-                # Gather all data up to the current data point that
-                # shows the regression and obtain a noise profile on it.
-                # This helps us to ignore this alert and others in the
-                # calculation that could influence the profile.
-                noise_data = []
-                for point in analyzed_series:
-                    if point == cur:
-                        break
-                    noise_data.append(geomean(point.values))
-
-                noise_profile, _ = moz_measure_noise.deviance(noise_data)
-                if not isinstance(noise_profile, str):
-                    raise Exception(
-                        f"Expecting a string as a noise profile, got: {type(noise_profile)}"
-                    )
-            except Exception:
-                # Fail without breaking the alert computation
-                newrelic.agent.notice_error()
-                logger.error("Failed to obtain a noise profile.")
-
-            # ignore regressions below the configured regression
-            # threshold
-
-            # ALERT_PCT, ALERT_ABS, and ALERT_CHANGE_TYPES come from the PerformanceSignature class in the Treeherder code
-            
-            ALERT_PCT = 0
-            ALERT_ABS = 1
-            ALERT_CHANGE_TYPES = ((ALERT_PCT, "percentage"), (ALERT_ABS, "absolute"))
-            if (
-                (
-                    signature.alert_change_type is None
-                    or signature.alert_change_type == ALERT_PCT
-                )
-                and alert_properties.pct_change < alert_threshold
-            ) or (
-                signature.alert_change_type == ALERT_ABS
-                and abs(alert_properties.delta) < alert_threshold
-            ):
-                continue
-            
-            # summary, _ = PerformanceAlertSummary.objects.get_or_create(
-            #     repository=signature.repository,
-            #     framework=signature.framework,
-            #     push_id=cur.push_id,
-            #     prev_push_id=prev.push_id,
-            #     defaults={
-            #         "manually_created": False,
-            #         "created": datetime.utcfromtimestamp(cur.push_timestamp),
-            #     },
-            # )
-
-            # django/mysql doesn't understand "inf", so just use some
-            # arbitrarily high value for that case
-            t_value = cur.t
-            if t_value == float("inf"):
-                t_value = 1000
-
-
-
-            # This is where we create the alert aka append its index in the locations list
-            # locations += [str(i) + "/t_value/" + str(cur.t) + "/pct_value/" + str(alert_properties.pct_change) + "/prev_value/" + str(prev_value) + "/new_value/" + str(new_value) for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
-            locations += [i for i, ts in enumerate(unique_push_timestamp) if ts == cur.push_timestamp]
-            
-            # PerformanceAlert.objects.update_or_create(
-            #     summary=summary,
-            #     series_signature=signature,
-            #     defaults={
-            #         "noise_profile": noise_profile,
-            #         "is_regression": alert_properties.is_regression,
-            #         "amount_pct": alert_properties.pct_change,
-            #         "amount_abs": alert_properties.delta,
-            #         "prev_value": prev_value,
-            #         "new_value": new_value,
-            #         "t_value": t_value,
-            #     },
-            # )
-
-    stop_time = time.time()
-    runtime = stop_time - start_time
-    exit_success(raw_data, raw_args, vars(args), locations, runtime, __file__)
+        ]
+
+        noise_profiles = None
+        if getattr(args, "noise_profile", False):
+            noise_profiles = [get_noise_profile(series, i) for i in locations]
+
+        stop_time = time.time()
+        runtime = stop_time - start_time
+        begin_stage("postprocess")
+        threshold_args = copy.deepcopy(raw_args)
+        threshold_args.alert_threshold = alert_threshold
+        if len(alert_thresholds) > 1:
+            threshold_args.output = labelled_output(args.output, alert_threshold=alert_threshold)
+        exit_success(raw_data, threshold_args, vars(threshold_args), locations, runtime, __file__, noise_profiles=noise_profiles)
     # except Exception as e:
     #     exit_with_error(raw_data, raw_args, vars(args), str(e), __file__)
+
+
+def main():
+    args = parse_args()
+    if hasattr(args, "batch"):
+        # parsed once here, before the workers are forked
+        load_signatures_attributes(args.signatures_attributes)
+        if run_batch(run, args, __file__):
+            raise SystemExit(1)
+        return
+    run(args)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
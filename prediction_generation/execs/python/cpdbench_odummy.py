@@ -5,7 +5,9 @@ import argparse
 import time
 import copy
 import numpy as np
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success_sweep, exit_with_error_sweep, online_alarms, RiverDetector, suppress_close_alarms, sweep_values
+from time_budget import start_time_budget
+from timings import begin_stage
 from river.drift import DummyDriftDetector
 
 def parse_args():
@@ -22,14 +24,19 @@ def parse_args():
                         help="Random seed (default: None)")
     parser.add_argument('--init-size', type=float, default=10.0,
                         help="Initial window size as percentage of dataset to skip detection (default: 10.0)")
-    parser.add_argument('--min-distance', type=int, default=30,
-                        help="Minimum distance between detected change points (default: 30)")
+    parser.add_argument('--min-distance', type=int, nargs='+', default=30,
+                        help="Minimum distance between detected change points, several values are evaluated in a single pass (default: 30)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS,
+                        help="Number of future points to average for evaluation, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
+    min_distances = sweep_values(args, "min_distance")
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__, sweep=("min_distance", min_distances))
 
     try:
         series = data['series'][0]['raw']
@@ -47,24 +54,23 @@ def main():
             dynamic_cloning=False
         )
 
-        drift_points = []
-        last_cp = -args.min_distance
-
         start_time = time.time()
+        begin_stage("detect")
 
-        for i, x in enumerate(series):
-            detector.update(x)
-            if i >= init_count:
-                if detector.drift_detected and (i - last_cp > args.min_distance):
-                    drift_points.append(i)
-                    last_cp = i
+        # the lookahead variant feeds the true points and evaluates the
+        # average of the points that follow them on a copy of the detector
+        alarms = online_alarms(
+            RiverDetector(detector), series, getattr(args, "lookahead", None), start=init_count
+        )
 
+        results = {md: suppress_close_alarms(alarms, md) for md in min_distances}
         runtime = time.time() - start_time
+        begin_stage("postprocess")
 
-        exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
+        exit_success_sweep(data, raw_args, vars(args), "min_distance", results, runtime, __file__)
 
     except Exception as e:
-        exit_with_error(data, raw_args, vars(args), str(e), __file__)
+        exit_with_error_sweep(data, raw_args, vars(args), "min_distance", min_distances, str(e), __file__)
 
 if __name__ == "__main__":
     main()
@@ -5,7 +5,9 @@ import argparse
 import time
 import copy
 from river.drift import PageHinkley
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, online_alarms, RiverDetector
+from time_budget import start_time_budget
+from timings import begin_stage
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run Page-Hinkley (river) on a time series dataset.")
@@ -16,13 +18,17 @@ def parse_args():
     parser.add_argument('--threshold', type=float, default=50.0, help="Threshold (lambda) (default: 50.0)")
     parser.add_argument('--alpha', type=float, default=0.9999, help="Forgetting factor (default: 0.9999)")
     parser.add_argument('--mode', type=str, choices=["up", "down", "both"], default="both", help="Mode to detect (default: both)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS, help="Number of future points to average for evaluation, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
     data, mat = load_dataset(args.input)
     start_time = time.time()
+    begin_stage("detect")
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__)
     try:
         series = data['series'][0]['raw']
         n_points = len(series)
@@ -34,14 +40,12 @@ def main():
             alpha=args.alpha,
             mode=args.mode
         )
-        drift_points = []
-
-        for i, val in enumerate(series):
-            detector.update(val)
-            if detector.drift_detected:
-                drift_points.append(i)
+        # the lookahead variant feeds the true points and evaluates the
+        # average of the points that follow them on a copy of the detector
+        drift_points = online_alarms(RiverDetector(detector), series, getattr(args, "lookahead", None))
 
         runtime = time.time() - start_time
+        begin_stage("postprocess")
         exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
     except Exception as e:
         exit_with_error(data, raw_args, vars(args), str(e), __file__)
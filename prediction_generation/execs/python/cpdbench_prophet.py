@@ -7,6 +7,8 @@ import sys
 import copy
 
 from cpdbench_utils import load_dataset, exit_success, make_param_dict, exit_with_error
+from time_budget import start_time_budget
+from timings import begin_stage
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Wrapper for Prophet")
@@ -20,6 +22,7 @@ def parse_args():
     parser.add_argument("-t", "--IntervalWidth", type=float, help="Interval Width")
     parser.add_argument("-g", "--growth", type=str, help="Growth type: 'linear' or 'logistic'", choices=['linear', 'logistic'])
     parser.add_argument("-c", "--cap", type=float, help="Capacity for logistic growth (required for logistic growth)")
+    parser.add_argument("--time-budget", type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
 
     return parser.parse_args()
 
@@ -40,6 +43,7 @@ def main():
 
     # Load the dataset (using a Python equivalent of your R helper function)
     data, mat = load_dataset(args.input)
+    start_time_budget(data, raw_args, vars(args), __file__)
 
     start_time = time.time()
 
@@ -68,6 +72,7 @@ def main():
 
     # Fit the Prophet model
     try:
+        begin_stage("detect")
         model = Prophet(
             changepoint_range=args.ChangepointRange,
             n_changepoints=args.Nmax,
@@ -88,6 +93,7 @@ def main():
 
     stop_time = time.time()
     runtime = stop_time - start_time
+    begin_stage("postprocess")
 
     locs = convert_timestamps(locs)
     data = convert_timestamps(data)
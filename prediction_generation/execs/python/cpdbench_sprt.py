@@ -5,7 +5,10 @@ import argparse
 import time
 import copy
 import numpy as np
-from cpdbench_utils import load_dataset, exit_success, exit_with_error
+from cpdbench_utils import load_dataset, exit_success, exit_with_error, lookahead_means
+from time_budget import start_time_budget
+from timings import begin_stage
+from online_kernels import sprt
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run SPRT on a time series dataset.")
@@ -16,12 +19,15 @@ def parse_args():
     parser.add_argument('--sigma', type=float, default=1.0, help="Known standard deviation (default: 1.0)")
     parser.add_argument('--threshold', type=float, default=15.0, help="Threshold to trigger change detection (default: 15.0)")
     parser.add_argument('--min-distance', type=int, default=30, help="Minimum distance between change points (default: 30)")
+    parser.add_argument('--lookahead', type=int, default=argparse.SUPPRESS, help="Number of future points to average for detection, runs the lookahead variant (default: off)")
+    parser.add_argument('--time-budget', type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
     data, mat = load_dataset(args.input)
     raw_args = copy.deepcopy(args)
+    start_time_budget(data, raw_args, vars(args), __file__)
 
     try:
         series = np.array(data['series'][0]['raw'])
@@ -29,30 +35,25 @@ def main():
         sigma2 = args.sigma ** 2
         threshold = args.threshold
         min_distance = args.min_distance
-
-        llr_sum = 0.0
-        drift_points = []
-        cooldown = 0
-        n = len(series)
+        lookahead = getattr(args, "lookahead", None)
 
         start_time = time.time()
+        begin_stage("detect")
 
-        for t in range(n):
-            if cooldown > 0:
-                cooldown -= 1
-                continue
+        # the next min_distance samples are blocked after every detection
+        llr = ((mu1 - mu0) / sigma2) * (series - (mu0 + mu1) / 2)
 
-            x = series[t]
-            llr = ((mu1 - mu0) / sigma2) * (x - (mu0 + mu1) / 2)
-            llr_sum += llr
+        # in the lookahead variant, artificial currents evaluate potential
+        # drifts without affecting the llr sum
+        trial_llr = None
+        if lookahead is not None:
+            x_artificial = lookahead_means(series, lookahead)
+            trial_llr = ((mu1 - mu0) / sigma2) * (x_artificial - (mu0 + mu1) / 2)
 
-            if abs(llr_sum) > threshold:
-                if t > 0:  # avoid detecting at t=0
-                    drift_points.append(t)
-                    llr_sum = 0.0
-                    cooldown = min_distance  # block next min_distance samples
+        drift_points = sprt(llr, threshold, min_distance, trial=trial_llr)
 
         runtime = time.time() - start_time
+        begin_stage("postprocess")
         exit_success(data, raw_args, vars(args), drift_points, runtime, __file__)
 
     except Exception as e:
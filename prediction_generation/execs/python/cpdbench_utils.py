@@ -11,43 +11,372 @@ License: See the LICENSE file.
 """
 
 import copy
-import hashlib
+import itertools
 import json
+import math
 import numpy as np
-import socket
+import os
 import sys
 
+from collections import namedtuple
+from numpy.lib.stride_tricks import as_strided
+
+from profiling import write_profile
+from timings import begin_stage, get_timings, start_timings
+
+
+# Environment variable naming a file that keeps the checksums of md5sum
+# across processes
+MD5_CACHE_ENV = "CPDBENCH_MD5_CACHE"
+
+# Checksums computed or loaded by this process, by absolute path, with the
+# (size, mtime_ns) of the file they belong to
+_MD5_CACHE = {}
+_MD5_CACHE_FILES_LOADED = set()
+
+
+def _load_md5_cache(cache_file):
+    """Add the checksums kept in `cache_file` to those of this process
+
+    The file holds one JSON object per line, lines written last win. Lines
+    cut short by a concurrent writer are skipped.
+    """
+    try:
+        with open(cache_file, "r") as fp:
+            lines = fp.readlines()
+    except OSError:
+        return
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            _MD5_CACHE[entry["path"]] = ((entry["size"], entry["mtime_ns"]), entry["md5"])
+        except (ValueError, KeyError, TypeError):
+            continue
+
 
 def md5sum(filename):
-    """Compute the MD5 checksum of a given file"""
+    """Compute the MD5 checksum of a given file
+
+    Checksums are remembered by path, size and modification time, so a file
+    is only hashed again once it changed. If the CPDBENCH_MD5_CACHE
+    environment variable names a file, the checksums are also appended to it
+    and shared with the next processes.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+
+    cache_file = os.environ.get(MD5_CACHE_ENV)
+    if cache_file and cache_file not in _MD5_CACHE_FILES_LOADED:
+        _MD5_CACHE_FILES_LOADED.add(cache_file)
+        _load_md5_cache(cache_file)
+    cached = _MD5_CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    import hashlib
+
     blocksize = 65536
     hasher = hashlib.md5()
-    with open(filename, "rb") as fp:
+    with open(path, "rb") as fp:
         buf = fp.read(blocksize)
         while len(buf) > 0:
             hasher.update(buf)
             buf = fp.read(blocksize)
-    return hasher.hexdigest()
+    md5 = hasher.hexdigest()
+    _MD5_CACHE[path] = (key, md5)
+
+    if cache_file:
+        entry = {"path": path, "size": key[0], "mtime_ns": key[1], "md5": md5}
+        try:
+            # a single short append, which concurrent tasks do not interleave
+            with open(cache_file, "a") as fp:
+                fp.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass
+    return md5
 
 
 def load_dataset(filename):
-    """ Load a CPDBench dataset """
-    with open(filename, "r") as fp:
-        data = json.load(fp)
+    """ Load a CPDBench dataset
 
-    if data["time"]["index"] != list(range(0, data["n_obs"])):
-        raise NotImplementedError(
-            "Time series with non-consecutive time axis are not yet supported."        
-        )
+    The data matrix and the revisions are read from the binary cache of the
+    dataset (see build_dataset_cache of dataset_cache) when it was built from
+    the current content of the file. The JSON file is then only parsed if a
+    field other than those of DATASET_CACHE_FIELDS is used, see Dataset.
+    Without a fresh cache, the dataset is parsed and its arrays are built in
+    memory.
 
-    mat = np.zeros((data["n_obs"], data["n_dim"]))
-    for j, series in enumerate(data["series"]):
-        mat[:, j] = series["raw"]
+    Loading the dataset starts the timings of a run, see begin_stage.
+    """
+    from dataset_cache import Dataset, build_dataset_arrays, check_time_index, read_dataset_cache
+    from time_budget import clear_running_timeout
+
+    start_timings()
+    clear_running_timeout()
+    data = read_dataset_cache(filename, md5sum(filename))
+    mat = None
+    if data is not None:
+        try:
+            mat = data.arrays["mat"]
+        except (KeyError, OSError, ValueError):
+            # cache replaced by a concurrent build or damaged
+            pass
+    if mat is None:
+        with open(filename, "r") as fp:
+            data = json.load(fp)
+        check_time_index(data)
+        arrays = build_dataset_arrays(data)
+        data, mat = Dataset(data, arrays), arrays["mat"]
+
+    begin_stage("preprocess")
+    return data, mat
 
-    # We normalize to avoid numerical errors.
-    mat = (mat - np.nanmean(mat)) / np.sqrt(np.nanvar(mat))
 
-    return data, mat
+class RevisionSeries:
+    """Values of a CPDBench dataset grouped by push timestamp.
+
+    Performance signatures hold several replicates per revision. They are kept
+    in a single float64 array sorted by revision, where the replicates of the
+    i-th revision are ``values[offsets[i]:offsets[i + 1]]`` in the order in
+    which they appear in the dataset. ``timestamps`` holds the sorted unique
+    push timestamps as int64 seconds since the epoch, so that the position of
+    a revision is also the index used for the change point locations.
+
+    """
+
+    def __init__(self, values, offsets, timestamps):
+        self.values = values
+        self.offsets = offsets
+        self.timestamps = timestamps
+        self._positions = {ts: i for i, ts in enumerate(timestamps.tolist())}
+        self._back_sizes = {}
+        self._fore_sizes = {}
+        self._noise_profiles = None
+
+    @classmethod
+    def from_dataset(cls, data, dim=0):
+        """Group the values of a loaded CPDBench dataset by push timestamp"""
+        arrays = getattr(data, "arrays", {})
+        if "revision_order" in arrays:
+            return cls(
+                arrays["raw"][arrays["revision_order"], dim],
+                arrays["revision_offsets"],
+                arrays["revision_timestamps"],
+            )
+        values = np.asarray(data["series"][dim]["raw"], dtype=np.float64)
+        pushes = np.asarray(data["time"]["raw"], dtype="datetime64[s]")
+        timestamps, inverse = np.unique(pushes.astype(np.int64), return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        counts = np.bincount(inverse, minlength=len(timestamps))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(values[order], offsets, timestamps)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def position(self, timestamp):
+        """Index of the revision pushed at the given epoch timestamp"""
+        return self._positions[int(timestamp)]
+
+    def revision(self, i):
+        """Values of the i-th revision"""
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+    def window(self, start, end):
+        """Flattened values of revisions start, ..., end - 1"""
+        return self.values[self.offsets[start] : self.offsets[end]]
+
+    def revisions(self, start, end, reverse=False):
+        """Values of revisions start, ..., end - 1 as a list of lists"""
+        order = range(end - 1, start - 1, -1) if reverse else range(start, end)
+        return [self.revision(i).tolist() for i in order]
+
+    def amount(self, start, end):
+        """Number of values in revisions start, ..., end - 1"""
+        return int(self.offsets[end] - self.offsets[start])
+
+    def back_window_start(self, i, last_seen_regression, min_back_window, max_back_window):
+        """First revision of the historical window of revision i.
+
+        Previous revisions are added until the window holds at least
+        max_back_window values, or until it spans
+        min(max(last_seen_regression, min_back_window), max_back_window)
+        revisions.
+        """
+        if max_back_window not in self._back_sizes:
+            c = self.offsets
+            first = np.searchsorted(c, c - max_back_window, side="right") - 1
+            sizes = np.clip(np.arange(len(c)) - first, 0, None)
+            self._back_sizes[max_back_window] = sizes.tolist()
+        limit = min(max(last_seen_regression, min_back_window), max_back_window)
+        return i - min(self._back_sizes[max_back_window][i], i, max(limit, 0))
+
+    def fore_window_end(self, i, fore_window):
+        """End (exclusive) of the forward window of revision i.
+
+        Revisions from i onwards are added until the window holds at least
+        fore_window values or the series is exhausted.
+        """
+        if fore_window not in self._fore_sizes:
+            c = self.offsets
+            end = np.minimum(np.searchsorted(c, c + fore_window, side="left"), len(self))
+            self._fore_sizes[fore_window] = np.maximum(end, np.arange(len(c))).tolist()
+        return self._fore_sizes[fore_window][i]
+
+    def geomeans(self):
+        """Geometric mean of every revision and its log, computed as a mean of logs
+
+        The log is NaN for revisions that hold values <= 0, whose geometric
+        mean is that of geomean.
+        """
+        positive = self.values > 0
+        counts = np.diff(self.offsets)
+        starts = self.offsets[:-1]
+        if len(self) == 0:
+            return np.zeros(0), np.zeros(0)
+        logs = np.add.reduceat(np.log(np.where(positive, self.values, 1.0)), starts) / counts
+        logs[~np.logical_and.reduceat(positive, starts)] = np.nan
+        means = np.exp(logs)
+        for i in np.flatnonzero(np.isnan(logs)).tolist():
+            means[i] = geomean(self.revision(i))
+        return means, logs
+
+    def noise_profile(self, index):
+        """Noise profile of the revisions before `index`, see noise_profiles"""
+        if self._noise_profiles is None:
+            self._noise_profiles = noise_profiles(*self.geomeans())
+        return self._noise_profiles[index]
+
+
+# A revision flagged by one of the revision-window detectors: its position in
+# the RevisionSeries, the test statistic, and the summary statistics of the
+# historical and forward windows it was compared on.
+RevisionChange = namedtuple(
+    "RevisionChange", "index stat historical_stats forward_stats"
+)
+
+
+def geomean(iterable):
+    # Returns a geomean of a list of values.
+    a = np.array(iterable, dtype=np.float64)
+    if np.all(a > 0):
+        # as a mean of logs, the product of long lists overflows
+        return float(np.exp(np.log(a).mean()))
+    return a.prod() ** (1.0 / len(a))
+
+
+# number of standard deviations of the skew or kurtosis of the noise beyond
+# which a profile reports a problem, as in moz_measure_noise
+NOISE_PROBLEM_THRESHOLD = 3
+
+
+class TrimmedMoments:
+    """Central moments of a growing sample without its minimum and maximum
+
+    The moments are updated with the formulas of Pébay (2008) for adding one
+    value. A new value below the minimum or above the maximum takes its place
+    and the previous extreme joins the moments instead, so that they always
+    cover ``sorted(sample)[1:-1]``.
+    """
+
+    def __init__(self):
+        self.low = None
+        self.high = None
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+
+    def push(self, x):
+        if self.low is None:
+            self.low = x
+            return
+        if self.high is None:
+            self.low, self.high = min(self.low, x), max(self.low, x)
+            return
+        if x < self.low:
+            self.low, x = x, self.low
+        elif x > self.high:
+            self.high, x = x, self.high
+        n1 = self.count
+        self.count += 1
+        n = self.count
+        delta = x - self.mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term = delta * delta_n * n1
+        self.mean += delta_n
+        self.m4 += term * delta_n2 * (n * n - 3 * n + 3) + 6 * delta_n2 * self.m2 - 4 * delta_n * self.m3
+        self.m3 += term * delta_n * (n - 2) - 3 * delta_n * self.m2
+        self.m2 += term
+
+    def deviance(self):
+        """Description of moz_measure_noise.deviance for the sample
+
+        The skew and kurtosis are the biased ones of scipy.stats, NaN when
+        the variance vanishes next to the mean.
+        """
+        if self.count < 4:
+            return "N/A"
+        count = self.count
+        variance = self.m2 / count
+        if variance <= (np.finfo(np.float64).eps * self.mean) ** 2:
+            skew = kurt = float("nan")
+        else:
+            skew = self.m3 / count / variance ** 1.5
+            kurt = self.m4 / count / variance ** 2 - 3.0
+        skew_stddev = math.sqrt(6 * (count - 2) / ((count + 1) * (count + 3)))
+        kurt_stddev = math.sqrt(
+            24 * count * (count - 2) * (count - 3)
+            / ((count + 1) * (count + 1) * (count + 3) * (count + 5))
+        )
+        skew_normalized = skew / skew_stddev
+        kurt_normalized = kurt / kurt_stddev
+        if abs(skew_normalized) > abs(kurt_normalized):
+            if abs(skew_normalized) > NOISE_PROBLEM_THRESHOLD:
+                return "SKEWED"
+        elif kurt_normalized > NOISE_PROBLEM_THRESHOLD:
+            return "OUTLIERS"
+        elif kurt_normalized < -NOISE_PROBLEM_THRESHOLD:
+            return "MODAL"
+        return "OK"
+
+
+def noise_profiles(geomeans, log_geomeans):
+    """Noise profile of every prefix of the geometric means of the revisions
+
+    Element i is the profile moz_measure_noise.deviance gives for the
+    geometric means of the revisions before i, which the Mozilla alerting
+    records for a change at revision i: SKEWED, OUTLIERS, MODAL, OK or N/A
+    for fewer than 6 revisions. deviance takes the logs of positive samples,
+    which are the log geometric means, so no product of values is taken.
+    Every prefix costs O(1) as the moments are extended by one revision at a
+    time.
+    """
+    profiles = ["N/A"]
+    logs = TrimmedMoments()
+    values = TrimmedMoments()
+    positive = True
+    for value, log in zip(geomeans.tolist(), log_geomeans.tolist()):
+        positive = positive and value > 0
+        if positive:
+            logs.push(log if log == log else math.log(value))
+        values.push(value)
+        profiles.append((logs if positive else values).deviance())
+    return profiles
+
+
+def get_noise_profile(series, index):
+    """Noise profile of the revisions of a RevisionSeries before `index`
+
+    This is the profile of moz_measure_noise.deviance for the geometric means
+    of the revisions, see noise_profiles. The profile does not change the
+    detected locations, so the detectors only compute it with --noise-profile.
+    """
+    return series.noise_profile(index)
 
 
 def prepare_result(
@@ -59,6 +388,7 @@ def prepare_result(
     locations,
     runtime,
     script_filename,
+    noise_profiles=None,
 ):
     """Prepare the experiment output as a dictionary
 
@@ -92,13 +422,20 @@ def prepare_result(
 
     runtime : float
         Runtime of the method. This should be computed as accurately as
-        possible, excluding any method-specific setup code.
+        possible, excluding any method-specific setup code. The result also
+        records the time of every stage of the run, see begin_stage.
 
     script_filename :
         Path to the script of the method. This is hashed to enable rough
         versioning.
 
+    noise_profiles : list
+        Noise profile of every change point location (see get_noise_profile),
+        recorded for the methods run with --noise-profile.
+
     """
+    begin_stage("write")
+    write_profile(data, args, script_filename)
     out = {}
 
     # record the command that was used
@@ -109,6 +446,8 @@ def prepare_result(
     out["script_md5"] = md5sum(script_filename)
 
     # record the hostname
+    import socket
+
     out["hostname"] = socket.gethostname()
 
     # record the dataset name and hash of the dataset
@@ -127,19 +466,235 @@ def prepare_result(
 
     # save the detection results
     out["result"] = {"cplocations": locations, "runtime": runtime}
+    if noise_profiles is not None:
+        out["result"]["noise_profiles"] = noise_profiles
+
+    # record the time of the stages of the run, the CPU time and peak memory
+    out["timings"] = get_timings()
 
     return out
 
 
+# Results collected instead of written, see collect_results
+_collected_results = None
+
+
+def collect_results(results):
+    """Append the results of dump_output to the list `results` instead of writing them
+
+    run_batch of batch_runner collects the results of every dataset of a
+    batch this way. With None, the results are written again.
+    """
+    global _collected_results
+    _collected_results = results
+
+
+def collecting_results():
+    """Whether dump_output collects the results, see collect_results"""
+    return _collected_results is not None
+
+
 def dump_output(output, filename=None):
     """Save result to output file or write to stdout (json format)"""
-    if filename is None:
+    from time_budget import clear_running_timeout, stop_time_budget
+
+    # the time budget ends with the first result, so that no TIMEOUT result
+    # is written after or into it
+    clear_running_timeout()
+    stop_time_budget()
+    if _collected_results is not None:
+        _collected_results.append(output)
+    elif filename is None:
         print(json.dumps(output, sort_keys=True, indent="\t"))
     else:
         with open(filename, "w") as fp:
             json.dump(output, fp, sort_keys=True, indent="\t")
 
 
+def labelled_output(filename, **labels):
+    """Output file of one of several results written by a single run
+
+    Scripts that evaluate several configurations in one invocation write one
+    result per configuration. If `filename` contains format fields (e.g.
+    ``out_{method}.json``) they are filled with the labels, otherwise the
+    labels are appended to the file name before the extension. Without a
+    filename the results are written to stdout, and without labels the
+    filename is used as is.
+    """
+    if filename is None or not labels:
+        return filename
+    if "{" in filename:
+        return filename.format(**labels)
+    root, ext = os.path.splitext(filename)
+    suffix = "".join("_%s-%s" % (key, value) for key, value in labels.items())
+    return root + suffix + ext
+
+
+def sweep_values(args, name):
+    """Values of an argument that may be given several times
+
+    Returns the list of values of ``args.<name>``. A single value is stored
+    back as a scalar, so that the run is recorded like a regular one.
+    """
+    values = getattr(args, name)
+    if not isinstance(values, list):
+        values = [values]
+    if len(values) == 1:
+        setattr(args, name, values[0])
+    return values
+
+
+def suppress_close_alarms(alarms, min_distance):
+    """Keep the alarms further than min_distance from the previous kept one
+
+    This is the suppression applied by the online detectors whose state does
+    not depend on the reported change points, so that their raw alarms can
+    be computed once for several values of min_distance.
+    """
+    locations = []
+    last_cp = -min_distance
+    for i in alarms:
+        if i - last_cp > min_distance:
+            locations.append(i)
+            last_cp = i
+    return locations
+
+
+def window_means(values, width):
+    """Means of all windows of `width` consecutive values, from a rolling sum
+
+    Every mean takes O(1) from the cumulative sums, which round differently
+    from ``np.mean(values[i:i + width])``, see window_means_error.
+    """
+    values = np.asarray(values, dtype=float)
+    n_windows = len(values) - width + 1
+    if width < 1 or n_windows < 1:
+        return np.empty(0)
+    # around the first value, so that an offset of the series does not
+    # grow the sums
+    center = values[0]
+    sums = np.cumsum(values - center)
+    window_sums = sums[width - 1:].copy()
+    window_sums[1:] -= sums[:-width]
+    return window_sums / width + center
+
+
+def window_means_error(values, width):
+    """Bound on the difference of window_means from the means of np.mean"""
+    values = np.asarray(values, dtype=float)
+    if width < 1 or len(values) < width:
+        return 0.0
+    # the cumulative sums add up the values one by one, np.mean pairwise
+    deviations = np.abs(values - values[0]).sum()
+    return 4 * np.finfo(float).eps * (len(values) * deviations / width + (width + 2) * np.abs(values).max())
+
+
+def lookahead_means(series, lookahead):
+    """Mean of the `lookahead` points that follow every point of a series
+
+    The windows ahead of all points are averaged at once instead of slicing
+    the series at every step. The means are rounded like np.mean, unlike
+    window_means: the detectors fed with them cannot tell close calls, and
+    the lookahead is short. The last `lookahead` points have no complete
+    window ahead of them and keep their own value.
+    """
+    if lookahead < 1:
+        raise ValueError("lookahead must be at least 1")
+    values = np.array(series, dtype=float)
+    n_ahead = len(values) - lookahead
+    if n_ahead > 0:
+        ahead = values[1:]
+        stride = ahead.strides[0]
+        windows = as_strided(
+            ahead, shape=(n_ahead, lookahead), strides=(stride, stride), writeable=False
+        )
+        values[:n_ahead] = windows.mean(axis=1)
+    return values
+
+
+class RiverDetector:
+    """Update/check interface of a river drift detector
+
+    River detectors only report a drift when they are fed a point, so a
+    point is checked by feeding it to a copy of the detector.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+
+    def update(self, x):
+        self.detector.update(x)
+        return self.detector.drift_detected
+
+    def check(self, x):
+        clone = copy.deepcopy(self.detector)
+        clone.update(x)
+        return clone.drift_detected
+
+
+def online_alarms(detector, series, lookahead=None, start=0, check_first=False):
+    """Points of a series at which an online detector raises an alarm
+
+    The detector provides ``update(x)``, which feeds it the next point and
+    tells whether that raised an alarm, and ``check(x)``, which tells the
+    same without changing its state. Without `lookahead`, every point raises
+    its own alarms. With `lookahead`, the detector is still fed the true
+    points, but point i is checked with the mean of the `lookahead` points
+    that follow it, right after feeding point i or, with `check_first`,
+    right before. Points before `start` are fed but raise no alarm.
+    """
+    alarms = []
+    if lookahead is None:
+        for i, x in enumerate(series):
+            if detector.update(x) and i >= start:
+                alarms.append(i)
+        return alarms
+
+    probes = lookahead_means(series, lookahead).tolist()
+    for i, (x, probe) in enumerate(zip(series, probes)):
+        if check_first and i >= start and detector.check(probe):
+            alarms.append(i)
+        detector.update(x)
+        if not check_first and i >= start and detector.check(probe):
+            alarms.append(i)
+    return alarms
+
+
+def _sweep_run(args, parameters, name, value, n_values):
+    """Arguments and parameters of a single value of a swept argument"""
+    run_args = copy.deepcopy(args)
+    setattr(run_args, name, value)
+    if n_values > 1:
+        run_args.output = labelled_output(args.output, **{name: value})
+    run_params = dict(parameters)
+    run_params[name] = value
+    if "output" in run_params:
+        run_params["output"] = run_args.output
+    return run_args, run_params
+
+
+def _sweep_runs(args, parameters, sweeps):
+    """Arguments and parameters of every combination of swept values
+
+    `sweeps` holds the (name, values) of every swept argument. The output of
+    a combination is labelled with the arguments that have several values,
+    in the order of `sweeps`.
+    """
+    for combination in itertools.product(*(values for _, values in sweeps)):
+        run_args = copy.deepcopy(args)
+        run_params = dict(parameters)
+        labels = {}
+        for (name, values), value in zip(sweeps, combination):
+            setattr(run_args, name, value)
+            run_params[name] = value
+            if len(values) > 1:
+                labels[name] = value
+        run_args.output = labelled_output(args.output, **labels)
+        if "output" in run_params:
+            run_params["output"] = run_args.output
+        yield run_args, run_params
+
+
 def make_param_dict(args, defaults):
     """Create the parameter dict combining CLI arguments and defaults"""
     params = copy.deepcopy(vars(args))
@@ -184,7 +739,32 @@ def exit_with_timeout(data, args, parameters, runtime, script_filename):
     raise SystemExit
 
 
-def exit_success(data, args, parameters, locations, runtime, script_filename):
+def exit_with_timeout_sweep(
+    data, args, parameters, sweeps, runtime, script_filename
+):
+    """Exit and save a 'TIMEOUT' result for every combination of swept values
+
+    `sweeps` holds the (name, values) of every swept argument, see
+    _sweep_runs.
+    """
+    for run_args, run_params in _sweep_runs(args, parameters, sweeps):
+        out = prepare_result(
+            data,
+            run_args,
+            "TIMEOUT",
+            None,
+            run_params,
+            None,
+            runtime,
+            script_filename,
+        )
+        dump_output(out, run_args.output)
+    raise SystemExit
+
+
+def exit_success(
+    data, args, parameters, locations, runtime, script_filename, noise_profiles=None
+):
     """Exit and save result using the 'SUCCESS' exit status"""
     status = "SUCCESS"
     error = None
@@ -197,5 +777,45 @@ def exit_success(data, args, parameters, locations, runtime, script_filename):
         locations,
         runtime,
         script_filename,
+        noise_profiles=noise_profiles,
     )
-    dump_output(out, args.output)
\ No newline at end of file
+    dump_output(out, args.output)
+
+
+def exit_success_sweep(
+    data, args, parameters, name, results, runtime, script_filename
+):
+    """Save one 'SUCCESS' result per value of a swept argument
+
+    `results` maps every value of ``args.<name>`` to its change point
+    locations. See labelled_output for the naming of the output files.
+    """
+    for value, locations in results.items():
+        run_args, run_params = _sweep_run(
+            args, parameters, name, value, len(results)
+        )
+        exit_success(
+            data, run_args, run_params, locations, runtime, script_filename
+        )
+
+
+def exit_with_error_sweep(
+    data, args, parameters, name, values, error, script_filename
+):
+    """Exit and save a 'FAIL' result for every value of a swept argument"""
+    for value in values:
+        run_args, run_params = _sweep_run(
+            args, parameters, name, value, len(values)
+        )
+        out = prepare_result(
+            data,
+            run_args,
+            "FAIL",
+            error,
+            run_params,
+            None,
+            None,
+            script_filename,
+        )
+        dump_output(out, run_args.output)
+    raise SystemExit
\ No newline at end of file
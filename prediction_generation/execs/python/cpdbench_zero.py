@@ -15,6 +15,8 @@ import argparse
 import time
 
 from cpdbench_utils import load_dataset, exit_success
+from time_budget import start_time_budget
+from timings import begin_stage
 
 
 def parse_args():
@@ -23,6 +25,7 @@ def parse_args():
         "-i", "--input", help="path to the input data file", required=True
     )
     parser.add_argument("-o", "--output", help="path to the output file")
+    parser.add_argument("--time-budget", type=float, default=argparse.SUPPRESS, help="Wall-clock seconds the detection may take, after which a TIMEOUT result is written (default: unlimited)")
     return parser.parse_args()
 
 
@@ -30,13 +33,16 @@ def main():
     args = parse_args()
 
     data, mat = load_dataset(args.input)
+    start_time_budget(data, args, {}, __file__)
 
     start_time = time.time()
+    begin_stage("detect")
 
     locations = []
 
     stop_time = time.time()
     runtime = stop_time - start_time
+    begin_stage("postprocess")
 
     exit_success(data, args, {}, locations, runtime, __file__)
 
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Binary caches of the CPDBench datasets.
+
+Parsing the JSON file of a dataset and building its data matrix and
+revisions takes longer than many of the detections run on it. The cache of a
+dataset keeps these arrays as .npy files next to the JSON file, together
+with the fields of the dataset the scripts read most, so that load_dataset
+of cpdbench_utils only parses the JSON file when a script uses its other
+fields. A cache is only used when it was built from the current content of
+the JSON file.
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+from cpdbench_utils import md5sum
+
+
+# Layout version of the binary dataset caches, also checked by execs/R/utils.R
+DATASET_CACHE_VERSION = 2
+
+# Fields of a dataset kept in the index of its cache, the others are only
+# read from the JSON file when a script uses them
+DATASET_CACHE_FIELDS = ("name", "longname", "n_obs", "n_dim")
+
+
+class Dataset(dict):
+    """A loaded CPDBench dataset and the arrays of its binary cache
+
+    A dataset read from its cache only holds the fields of
+    DATASET_CACHE_FIELDS until another one is used, which parses the JSON
+    file `filename`.
+    """
+
+    def __init__(self, data, arrays, filename=None):
+        super().__init__(data)
+        self.arrays = arrays
+        self._filename = filename
+
+    def parse(self):
+        """Read all fields of the dataset from its JSON file, once"""
+        if self._filename is not None:
+            with open(self._filename, "r") as fp:
+                self.update(json.load(fp))
+            self._filename = None
+        return self
+
+    def __missing__(self, key):
+        if self._filename is None:
+            raise KeyError(key)
+        return self.parse()[key]
+
+    def __contains__(self, key):
+        return super().__contains__(key) or super(Dataset, self.parse()).__contains__(key)
+
+    def __iter__(self):
+        return super(Dataset, self.parse()).__iter__()
+
+    def __len__(self):
+        return super(Dataset, self.parse()).__len__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return super(Dataset, self.parse()).keys()
+
+    def values(self):
+        return super(Dataset, self.parse()).values()
+
+    def items(self):
+        return super(Dataset, self.parse()).items()
+
+    def copy(self):
+        return Dataset(dict(super().items()), self.arrays, self._filename)
+
+
+class DatasetCache:
+    """Arrays of the binary cache of a dataset, each read on first use
+
+    The cache is a directory next to the JSON file holding one .npy file per
+    array and an ``index`` file with the cache version, the md5 of the JSON
+    file, the DATASET_CACHE_FIELDS of the dataset as a JSON object and the
+    names of the arrays, one per line.
+    """
+
+    def __init__(self, path, names):
+        self.path = path
+        self.names = names
+        self._arrays = {}
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, name + ".npy"))
+        return self._arrays[name]
+
+
+def dataset_cache_path(filename):
+    """Path of the binary cache of a JSON dataset, next to it"""
+    return os.path.splitext(filename)[0] + ".cache"
+
+
+def check_time_index(data):
+    """Reject the datasets whose time axis is not 0, 1, ..., n_obs - 1"""
+    if data["time"]["index"] != list(range(0, data["n_obs"])):
+        raise NotImplementedError(
+            "Time series with non-consecutive time axis are not yet supported."        
+        )
+
+
+def build_dataset_arrays(data):
+    """Arrays of the binary cache of a parsed CPDBench dataset
+
+    ``raw`` holds the series as columns with NaN for missing values and
+    ``mat`` their normalized version. If the time axis holds timestamps,
+    ``timestamps`` holds them as int64 seconds since the epoch, and the
+    revisions of RevisionSeries are stored as ``revision_order``,
+    ``revision_offsets`` and ``revision_timestamps``.
+    """
+    raw = np.zeros((data["n_obs"], data["n_dim"]))
+    for j, series in enumerate(data["series"]):
+        raw[:, j] = series["raw"]
+
+    # We normalize to avoid numerical errors.
+    mat = (raw - np.nanmean(raw)) / np.sqrt(np.nanvar(raw))
+    arrays = {"raw": raw, "mat": mat}
+
+    try:
+        pushes = np.asarray(data["time"]["raw"], dtype="datetime64[s]")
+    except (KeyError, ValueError):
+        return arrays
+    arrays["timestamps"] = pushes.astype(np.int64)
+    timestamps, inverse = np.unique(arrays["timestamps"], return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse, minlength=len(timestamps))
+    arrays["revision_order"] = np.argsort(inverse, kind="stable")
+    arrays["revision_offsets"] = np.concatenate(([0], np.cumsum(counts)))
+    arrays["revision_timestamps"] = timestamps
+    return arrays
+
+
+def read_dataset_cache(filename, md5):
+    """Dataset read from its cache, None unless it was built from content `md5`"""
+    path = dataset_cache_path(filename)
+    try:
+        with open(os.path.join(path, "index"), "r") as fp:
+            index = fp.read().splitlines()
+        fields = json.loads(index[2])
+    except (OSError, IndexError, ValueError):
+        return None
+    if index[:2] != [str(DATASET_CACHE_VERSION), md5]:
+        return None
+    return Dataset(fields, DatasetCache(path, index[3:]), filename)
+
+
+def write_dataset_cache(filename, md5, data, arrays):
+    """Save the cache of a dataset, datasets in read-only places go without"""
+    import shutil
+    import tempfile
+
+    path = dataset_cache_path(filename)
+    fields = json.dumps({field: data[field] for field in DATASET_CACHE_FIELDS if field in data})
+    try:
+        # written aside and renamed so that concurrent tasks never read a
+        # partial cache
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(path) or ".", suffix=".cache")
+    except OSError:
+        return False
+    try:
+        os.chmod(tmp, 0o755)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), array)
+        with open(os.path.join(tmp, "index"), "w") as fp:
+            fp.write("\n".join([str(DATASET_CACHE_VERSION), md5, fields] + list(arrays)) + "\n")
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+    return True
+
+
+def build_dataset_cache(filename):
+    """Write the binary cache of a JSON dataset, see load_dataset of cpdbench_utils
+
+    utils/setup_datasets.sh builds the caches of all datasets, load_dataset
+    never writes them. Returns False for datasets that load_dataset rejects
+    and those in read-only places.
+    """
+    with open(filename, "r") as fp:
+        data = json.load(fp)
+    try:
+        check_time_index(data)
+    except NotImplementedError:
+        return False
+    return write_dataset_cache(filename, md5sum(filename), data, build_dataset_arrays(data))
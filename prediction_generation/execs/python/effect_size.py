@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cliff's delta effect size of the cliff variants of the detectors.
+
+Cliff's delta compares every value of one sample with every value of the
+other. Counting the values below and above each value in a sorted sample
+gives the same integer counts in O((n + m) log m) instead of O(n * m).
+
+"""
+
+import numpy as np
+
+# effect size thresholds from (Hess and Kromrey, 2004)
+CLIFFS_DELTA_THRESHOLDS = (("small", 0.147), ("medium", 0.33), ("large", 0.474))
+
+CATEGORY_ORDER = {
+    "negligible": 0,
+    "small": 1,
+    "medium": 2,
+    "large": 3,
+}
+
+
+def cliffs_delta_category(delta):
+    """Magnitude category of a Cliff's delta"""
+    category = "negligible"
+    for name, threshold in CLIFFS_DELTA_THRESHOLDS:
+        if abs(delta) >= threshold:
+            category = name
+    return category
+
+
+def _dominance(x, y_sorted):
+    """Number of pairs with x > y minus the number of pairs with x < y"""
+    below = np.searchsorted(y_sorted, x, side="left")
+    above = len(y_sorted) - np.searchsorted(y_sorted, x, side="right")
+    return int(below.sum()) - int(above.sum())
+
+
+def _delta(dominance, n, m):
+    if n == 0 or m == 0:
+        return 0.0, "negligible"
+    # integer counts divided once, as in the pairwise definition
+    delta = dominance / (n * m)
+    return delta, cliffs_delta_category(delta)
+
+
+def cliffs_delta(x, y):
+    """Cliff's delta of `x` against `y` and its magnitude category"""
+    x = np.asarray(x, dtype=float)
+    y = np.sort(np.asarray(y, dtype=float))
+    return _delta(_dominance(x, y), len(x), len(y))
+
+
+def split_cliffs_deltas(values, splits):
+    """Cliff's delta of ``values[:s]`` against ``values[s:]`` for every split s
+
+    Moving a value from the second sample to the first one changes the
+    dominance count by the number of other values below it minus the number
+    above it, whatever the split. A single sort of `values` therefore serves
+    every split.
+    """
+    values = np.asarray(values, dtype=float)
+    ordered = np.sort(values)
+    below = np.searchsorted(ordered, values, side="left")
+    above = len(ordered) - np.searchsorted(ordered, values, side="right")
+    dominance = np.concatenate(([0], np.cumsum(below - above)))
+    return [_delta(int(dominance[s]), s, len(values) - s) for s in splits]
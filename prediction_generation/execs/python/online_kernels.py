@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Array kernels of the online change point detectors.
+
+The online detectors are written point by point, but between two resets
+their statistics are cumulative sums or moving averages. The kernels below
+evaluate these stretches with numpy and only go back to Python for the reset
+logic. They report the same locations as the point by point definitions:
+where the array form rounds differently, decisions that are too close to
+call are redone exactly in Python.
+
+"""
+
+import numpy as np
+
+from cpdbench_utils import window_means, window_means_error
+
+# Points evaluated one by one after a reset: most stretches between close
+# change points are shorter than the overhead of the array operations
+_HEAD = 64
+
+# Number of points evaluated at once after the head of a stretch, doubled
+# for every further chunk without a change point
+_CHUNK = 256
+
+_EPS = np.finfo(float).eps
+
+# Returned for stretches whose outcome depends on the rounding of the sums
+_CLOSE_CALL = object()
+
+
+def exceedances(x, center, limit, start=0):
+    """Points from `start` on that are further than `limit` from `center`"""
+    x = np.asarray(x, dtype=float)
+    return (np.flatnonzero(np.abs(x[start:] - center) > limit) + start).tolist()
+
+
+def _lindley(steps, initial):
+    """Running values of s = max(0, s + step) starting from `initial`"""
+    sums = np.cumsum(steps)
+    return sums - np.minimum(np.minimum.accumulate(sums), -initial)
+
+
+def _cusum_stretch(x, begin, first, mean, k, h, s_pos, s_neg):
+    """First change of a CUSUM stretch, evaluated chunk by chunk"""
+    n_seen, magnitude = 0, 0.0
+    pos, size = begin, _CHUNK
+    while pos < len(x):
+        deviation = x[pos:pos + size] - mean
+        up = deviation - k
+        down = -(deviation + k)
+        pos_sums = _lindley(up, s_pos)
+        neg_sums = _lindley(down, s_neg)
+
+        # bound on the rounding error of both the cumulative and the
+        # point by point sums since the reset
+        n_seen += len(deviation)
+        magnitude += np.abs(up).sum() + np.abs(down).sum()
+        tol = 4 * _EPS * (n_seen * magnitude + abs(h))
+
+        skip = max(0, first - pos)
+        hits = np.flatnonzero((pos_sums[skip:] > h) | (neg_sums[skip:] > h)) + skip
+        end = hits[0] + 1 if len(hits) else len(deviation)
+        close = (np.abs(pos_sums[skip:end] - h) <= tol) | (np.abs(neg_sums[skip:end] - h) <= tol)
+        if close.any():
+            return _CLOSE_CALL
+        if len(hits):
+            return pos + int(hits[0])
+
+        s_pos, s_neg = pos_sums[-1], neg_sums[-1]
+        pos += len(deviation)
+        size *= 2
+    return None
+
+
+def _cusum_stretch_python(values, begin, end, first, mean, k, h, s_pos, s_neg):
+    """First change of a CUSUM stretch, evaluated point by point
+
+    Returns the change point, or None and the sums reached at `end`.
+    """
+    for i in range(begin, end):
+        x = values[i]
+        s_pos = max(0, s_pos + (x - mean - k))
+        s_neg = max(0, s_neg - (x - mean + k))
+        if (s_pos > h or s_neg > h) and i >= first:
+            return i, s_pos, s_neg
+    return None, s_pos, s_neg
+
+
+def cusum(x, start, mean, k, h, min_distance, reestimate):
+    """Change points of the two-sided CUSUM with resets
+
+    The sums run over ``x[start:]`` around the reference `mean`. A change is
+    reported when either of them exceeds `h` at least `min_distance` points
+    after the previous change. The sums are then reset and the reference is
+    replaced by ``reestimate(i)``.
+    """
+    x = np.asarray(x, dtype=float)
+    values = x.tolist()
+    n = len(values)
+    # max() in the point by point sums swallows NaNs, the arrays do not
+    head = n if not np.isfinite(x).all() else _HEAD
+    # plain floats round like numpy scalars and are much faster point by point
+    mean, k, h = float(mean), float(k), float(h)
+
+    changes = []
+    last_cp = -min_distance
+    begin = start
+    while begin < n:
+        first = max(begin, last_cp + min_distance)
+        end = min(begin + head, n)
+        cp, s_pos, s_neg = _cusum_stretch_python(values, begin, end, first, mean, k, h, 0.0, 0.0)
+        if cp is None and end < n:
+            cp = _cusum_stretch(x, end, first, mean, k, h, s_pos, s_neg)
+            if cp is _CLOSE_CALL:
+                cp, _, _ = _cusum_stretch_python(values, end, n, first, mean, k, h, s_pos, s_neg)
+        if cp is None:
+            break
+        changes.append(cp)
+        last_cp = cp
+        mean = float(reestimate(cp))
+        begin = cp + 1
+    return changes
+
+
+def _ewma_recursion(values, alpha):
+    """EWMA means and variances after every value, point by point"""
+    decay = 1 - alpha
+    mean, variance = values[0], 0.0
+    means, variances = [mean], [variance]
+    for x in values[1:]:
+        residual = x - mean
+        mean = alpha * x + decay * mean
+        variance = decay * (variance + alpha * residual ** 2)
+        means.append(mean)
+        variances.append(variance)
+    return np.array(means), np.array(variances)
+
+
+def _decayed_sums(terms, decay):
+    """Running sums s[i] = terms[i] + decay * s[i - 1], in log2(n) array steps
+
+    Every step adds the sums `step` points back, weighted by decay**step,
+    until the weights vanish. Returns the sums and the number of steps.
+    """
+    sums = np.array(terms, dtype=float)
+    step, weight, n_steps = 1, decay, 0
+    while step < len(sums) and weight > 0:
+        sums[step:] += weight * sums[:-step]
+        step *= 2
+        weight *= weight
+        n_steps += 1
+    return sums, n_steps
+
+
+def _ewma_drift(x, probe, alpha, threshold, start, mean, variance):
+    """Alarms of the EWMA detector from array recursions, or _CLOSE_CALL
+
+    The recursion of _ewma_recursion goes on from `mean` and `variance` over
+    `x`, with _decayed_sums, which round differently. Their difference is
+    bounded by the rounding errors of both, propagated from the means to the
+    variances, and decisions within these bounds are close calls.
+    """
+    decay = 1 - alpha
+    # the first mean and sum round like the recursion
+    terms = alpha * x
+    terms[0] += decay * mean
+    means, n_steps = _decayed_sums(terms, decay)
+    # rounding of the array steps and of their weights, which are powers of
+    # decay, and of the recursion, over the points it remembers
+    rounds = n_steps + 2 + 1 / alpha
+    mean_error, _ = _decayed_sums(4 * _EPS * ((rounds + 1) * np.abs(terms) + 2 * np.abs(means)), decay)
+
+    residuals = x - np.concatenate(([mean], means[:-1]))
+    residual_error = np.concatenate(([0.0], mean_error[:-1])) + _EPS * np.abs(residuals)
+    updates = alpha * residuals ** 2
+    update_error = alpha * (2 * np.abs(residuals) + residual_error) * residual_error + 3 * _EPS * updates
+    updates[0] += variance
+    sums, _ = _decayed_sums(updates, decay)
+    sum_error, _ = _decayed_sums(2 * (update_error + _EPS * ((rounds + 2) * updates + 4 * sums)), decay)
+    variances = decay * sums
+    variance_error = decay * sum_error + _EPS * variances
+
+    distance = np.abs(probe - means)[start:]
+    limit = threshold * np.sqrt(variances[start:])
+    tol = (
+        mean_error[start:]
+        + abs(threshold) * np.sqrt(variance_error[start:])
+        + 4 * _EPS * (distance + limit + np.abs(probe[start:]) + np.abs(means[start:]))
+    )
+    margin = distance - limit
+    # a zero variance raises no alarm, without decay all of them are exact
+    zero = (variances[start:] == 0) & (variance_error[start:] == 0)
+    unsure = variances[start:] <= variance_error[start:]
+    if (~zero & ((np.abs(margin) <= tol) | (unsure & (margin > -tol)))).any():
+        return _CLOSE_CALL
+    return (np.flatnonzero(~zero & (margin > 0)) + start).tolist()
+
+
+def _ewma_alarms(means, variances, probe, threshold, start):
+    std = np.sqrt(variances)
+    drift = (std > 0) & (np.abs(probe - means) > threshold * std)
+    return (np.flatnonzero(drift[start:]) + start).tolist()
+
+
+def ewma(x, alpha, threshold, start=0, probe=None):
+    """Alarms of the EWMA detector
+
+    The mean and variance are updated with every value of `x`. Point i, from
+    `start` on, raises an alarm when ``probe[i]`` (``x[i]`` by default) is
+    more than `threshold` standard deviations away from the updated mean.
+    """
+    x = np.asarray(x, dtype=float)
+    probe = x if probe is None else np.asarray(probe, dtype=float)
+    if len(x) == 0:
+        return []
+
+    values = x.tolist()
+    alpha, threshold = float(alpha), float(threshold)
+    # the first points are close calls for some parameters whatever the data,
+    # e.g. the second one for alpha 0.1 and threshold 3, and the array
+    # recursions only pay off on longer series
+    head = len(x)
+    if len(x) > 4 * _CHUNK and 0 < alpha <= 1 and np.isfinite(x).all() and np.isfinite(probe).all():
+        head = _HEAD
+    means, variances = _ewma_recursion(values[:head], alpha)
+    alarms = _ewma_alarms(means, variances, probe[:head], threshold, min(start, head))
+    if head == len(x):
+        return alarms
+    tail = _ewma_drift(
+        x[head:], probe[head:], alpha, threshold, max(start - head, 0), means[-1], variances[-1]
+    )
+    if tail is not _CLOSE_CALL:
+        return alarms + [i + head for i in tail]
+
+    means, variances = _ewma_recursion(values, alpha)
+    return _ewma_alarms(means, variances, probe, threshold, start)
+
+
+def mosum(x, window, threshold, min_distance, probe=None):
+    """Change points of the moving-sum detector
+
+    Once `window` values are buffered, the means of the two halves of the
+    buffer are compared with `threshold`. With `probe`, ``probe[i]`` is
+    added to the second half when evaluating point i. The buffer is cleared
+    on every change point, which only delays the next evaluation: a full
+    buffer always holds the last `window` values.
+    """
+    x = np.asarray(x, dtype=float)
+    half = window // 2
+    if half < 1 or window > len(x):
+        return []
+
+    width = window - half
+    firsts = window_means(x, half)[:len(x) - window + 1]
+    seconds = window_means(x[half:], width)
+    tol = window_means_error(x, half) + window_means_error(x[half:], width)
+    if probe is not None:
+        probe = np.asarray(probe, dtype=float)
+        seconds = (seconds * width + probe[window - 1:]) / (width + 1)
+        tol += 4 * _EPS * max(np.abs(x).max(), np.abs(probe[window - 1:]).max())
+    differences = np.abs(firsts - seconds)
+    tol = tol + 4 * _EPS * (differences + abs(threshold))
+
+    # the halves of close calls, and of windows the rolling sums carried a
+    # NaN or an infinity into, are averaged like np.mean
+    for i in np.flatnonzero(~(np.abs(differences - threshold) > tol)):
+        second = x[i + half:i + window]
+        if probe is not None:
+            second = np.append(second, probe[i + window - 1])
+        differences[i] = np.abs(x[i:i + half].mean() - second.mean())
+    candidates = np.flatnonzero(differences > threshold) + (window - 1)
+
+    changes = []
+    last_cp = -min_distance
+    full = window - 1
+    while True:
+        pos = np.searchsorted(candidates, max(full, last_cp + min_distance + 1))
+        if pos == len(candidates):
+            break
+        last_cp = int(candidates[pos])
+        changes.append(last_cp)
+        full = last_cp + window
+    return changes
+
+
+def _sprt_stretch(llr, trial, begin, threshold, last_cp, min_distance, total):
+    """First change of an SPRT stretch, evaluated chunk by chunk"""
+    pos, size = begin, _CHUNK
+    while pos < len(llr):
+        end = min(pos + size, len(llr))
+        # prepending the running total keeps the sequential summation order
+        sums = np.cumsum(np.concatenate(([total], llr[pos:end])))[1:]
+        hits = np.abs(sums) > threshold
+        if pos == 0:
+            hits[0] = False  # avoid detecting at t=0
+        if trial is not None:
+            far = np.arange(pos, end) - last_cp > min_distance
+            hits |= far & (np.abs(trial[pos:end]) > threshold)
+        found = np.flatnonzero(hits)
+        if len(found):
+            return pos + int(found[0])
+        total = sums[-1]
+        pos = end
+        size *= 2
+    return None
+
+
+def _sprt_stretch_python(llr, trial, begin, end, threshold, last_cp, min_distance):
+    """First change of an SPRT stretch, evaluated point by point
+
+    Returns the change point, or None and the sum reached at `end`.
+    """
+    total = 0.0
+    for t in range(begin, end):
+        if trial is not None and abs(trial[t]) > threshold and t - last_cp > min_distance:
+            return t, total
+        total += llr[t]
+        if abs(total) > threshold and t > 0:
+            return t, total
+    return None, total
+
+
+def sprt(llr, threshold, min_distance, trial=None):
+    """Change points of the sequential probability ratio test
+
+    `llr` holds the log-likelihood ratio of every point. A change is
+    reported when their sum since the previous change exceeds `threshold`,
+    after which the sum is reset and the next `min_distance` points are
+    skipped. With `trial`, a point is also reported when its own trial ratio
+    exceeds the threshold more than `min_distance` points after the previous
+    change.
+    """
+    llr = np.asarray(llr, dtype=float)
+    llr_values = llr.tolist()
+    if trial is not None:
+        trial = np.asarray(trial, dtype=float)
+    trial_values = None if trial is None else trial.tolist()
+    n = len(llr_values)
+
+    changes = []
+    begin = 0
+    while begin < n:
+        last_cp = changes[-1] if changes else -min_distance
+        end = min(begin + _HEAD, n)
+        cp, total = _sprt_stretch_python(
+            llr_values, trial_values, begin, end, threshold, last_cp, min_distance
+        )
+        if cp is None and end < n:
+            cp = _sprt_stretch(llr, trial, end, threshold, last_cp, min_distance, total)
+        if cp is None:
+            break
+        changes.append(cp)
+        begin = cp + 1 + max(min_distance, 0)
+    return changes
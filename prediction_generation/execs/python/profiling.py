@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Profiles of the detect stage of the detector runs.
+
+Setting CPDBENCH_PROFILE to one of the profilers of PROFILE_EXTENSIONS
+profiles the "detect" stage of every run (see begin_stage of cpdbench_utils),
+and the profile is written with the first result of the run. The local
+executor sets it for a whole grid, and utils/profile_summary.py lists the
+hottest functions of a method over the profiles of all its tasks.
+
+"""
+
+import os
+import sys
+
+
+# Environment variables of the profiling of the detect stage: the name of the
+# profiler, the path of the profile without its extension and the directory of
+# the profiles of runs without an output file, see profile_path
+PROFILE_ENV = "CPDBENCH_PROFILE"
+PROFILE_OUTPUT_ENV = "CPDBENCH_PROFILE_OUTPUT"
+PROFILE_DIR_ENV = "CPDBENCH_PROFILE_DIR"
+
+# file extension of the profiles of every profiler
+PROFILE_EXTENSIONS = {
+    "cprofile": ".prof",
+    "tracemalloc": ".tracemalloc",
+    "pyinstrument": ".pyisession",
+}
+
+# profile of the detect stage of the current run, see start_profile
+_profile = None
+
+
+class Profile:
+    """Profile of the detect stage of a run
+
+    The profilers are those of PROFILE_EXTENSIONS: cProfile, whose profiles
+    are read with pstats, tracemalloc, which keeps a snapshot of the memory
+    still allocated at the end of the stage, and pyinstrument, a sampling
+    profiler that has to be installed separately.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.result = None
+        if name == "cprofile":
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif name == "tracemalloc":
+            import tracemalloc
+
+            self.profiler = tracemalloc
+            tracemalloc.start()
+        else:
+            from pyinstrument import Profiler
+
+            self.profiler = Profiler()
+            self.profiler.start()
+
+    def stop(self):
+        if self.result is not None:
+            return
+        if self.name == "cprofile":
+            self.profiler.disable()
+            self.result = self.profiler
+        elif self.name == "tracemalloc":
+            self.result = self.profiler.take_snapshot()
+            self.profiler.stop()
+        else:
+            self.result = self.profiler.stop()
+
+    def write(self, path):
+        if self.name == "cprofile":
+            self.result.dump_stats(path)
+        elif self.name == "tracemalloc":
+            self.result.dump(path)
+        else:
+            self.result.save(path)
+
+
+def start_profile():
+    """Start the profiler named by CPDBENCH_PROFILE, if any"""
+    global _profile
+    name = os.environ.get(PROFILE_ENV)
+    if not name:
+        return
+    import logging
+
+    logger = logging.getLogger(__name__)
+    if name not in PROFILE_EXTENSIONS:
+        logger.warning(
+            "Unknown profiler %s in %s, expected one of: %s"
+            % (name, PROFILE_ENV, ", ".join(PROFILE_EXTENSIONS))
+        )
+        return
+    try:
+        _profile = Profile(name)
+    except ImportError as err:
+        logger.warning("Profiler %s is not available: %s" % (name, err))
+
+
+def stop_profile():
+    """Stop the profiler of the run, its profile is written with the first result"""
+    if _profile is not None:
+        _profile.stop()
+
+
+def discard_profile():
+    """Stop the profiler of a run that wrote no result, without writing its profile"""
+    global _profile
+    if _profile is not None:
+        _profile.stop()
+        _profile = None
+
+
+def profile_path(data, args, script_filename):
+    """Path of the profile of a run, without its extension
+
+    This is the path in CPDBENCH_PROFILE_OUTPUT, set by the local executor to
+    mirror the path of the result, or the output file of the run without its
+    extension. Runs writing to stdout put their profile in
+    <dataset>/<script>/<hash of the arguments> in CPDBENCH_PROFILE_DIR
+    (default: profiles).
+    """
+    if os.environ.get(PROFILE_OUTPUT_ENV):
+        return os.environ[PROFILE_OUTPUT_ENV]
+    if getattr(args, "output", None):
+        return os.path.splitext(args.output)[0]
+    import hashlib
+
+    script = os.path.splitext(os.path.basename(script_filename))[0]
+    key = hashlib.md5(" ".join(sys.argv[1:]).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(
+        os.environ.get(PROFILE_DIR_ENV, "profiles"), data["name"], script, key
+    )
+
+
+def write_profile(data, args, script_filename):
+    """Write the profile of the run, with its first result"""
+    global _profile
+    if _profile is None:
+        return
+    profile, _profile = _profile, None
+    profile.stop()
+    path = profile_path(data, args, script_filename) + PROFILE_EXTENSIONS[profile.name]
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profile.write(path)
+    except OSError as err:
+        import logging
+
+        logging.getLogger(__name__).warning(
+            "Failed to write the profile %s: %s" % (path, err)
+        )
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Attributes of the signatures of the CPDBench datasets.
+
+The Mozilla-style methods read the attributes of the signature of their
+dataset, such as the alert threshold, from a JSON file holding those of all
+signatures. Parsing the whole file for every task takes longer than many
+detections, so a task reads the attributes of its one signature from an
+SQLite index next to the file instead. The index is written by
+extract_signatures_properties.py, or by the first task that finds it missing
+or built from another version of the file.
+
+"""
+
+import json
+import os
+
+from collections import namedtuple
+
+from cpdbench_utils import md5sum
+
+
+# Signatures attributes files parsed by this process, by absolute path, with
+# the (size, mtime_ns) of the file they were read from
+_SIGNATURES_ATTRIBUTES = {}
+
+
+def load_signatures_attributes(filename):
+    """Attributes of all signatures in a signatures attributes JSON file
+
+    The file is parsed once per process and again only once it changed, so a
+    resident worker or a batch run reads it once for all its datasets.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _SIGNATURES_ATTRIBUTES.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, "r") as fp:
+            cached = (key, json.load(fp))
+        _SIGNATURES_ATTRIBUTES[path] = cached
+    return cached[1]
+
+
+# Layout version of the signatures indexes, also written by
+# data_extraction_transformation/extract_signatures_properties.py
+SIGNATURES_INDEX_VERSION = 1
+
+
+def signatures_index_path(filename):
+    """Path of the index of a signatures attributes JSON file, next to it"""
+    return os.path.splitext(filename)[0] + ".sqlite"
+
+
+def read_signatures_index(filename, signature_id):
+    """Attributes of one signature from the index of a signatures attributes file
+
+    The index is an SQLite database with the attributes of every signature as
+    a JSON object in a ``signatures`` table keyed by the signature id, and the
+    md5, size and mtime_ns of the JSON file it was built from in a ``source``
+    table. The file is only hashed if its size or modification time differ,
+    e.g. after it was copied. Returns None if the index is missing or was
+    built from other content, and raises KeyError if the signature is not in
+    it.
+    """
+    import contextlib
+    import pathlib
+    import sqlite3
+
+    path = signatures_index_path(os.path.abspath(filename))
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(filename)
+    try:
+        uri = pathlib.Path(path).as_uri() + "?mode=ro"
+        with contextlib.closing(sqlite3.connect(uri, uri=True)) as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SIGNATURES_INDEX_VERSION:
+                return None
+            source = conn.execute("SELECT md5, size, mtime_ns FROM source").fetchone()
+            if source is None:
+                return None
+            if tuple(source[1:]) != (stat.st_size, stat.st_mtime_ns) and source[0] != md5sum(filename):
+                return None
+            row = conn.execute(
+                "SELECT attributes FROM signatures WHERE id = ?", (signature_id,)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        raise KeyError(signature_id)
+    return json.loads(row[0])
+
+
+def write_signatures_index(filename, attributes):
+    """Save the index of a signatures attributes file, files in read-only places go without"""
+    import contextlib
+    import sqlite3
+    import tempfile
+
+    path = signatures_index_path(os.path.abspath(filename))
+    stat = os.stat(filename)
+    md5 = md5sum(filename)
+    try:
+        # written aside and renamed so that concurrent tasks never read a
+        # partial index
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".sqlite")
+        os.close(fd)
+    except OSError:
+        return
+    try:
+        os.chmod(tmp, 0o644)
+        with contextlib.closing(sqlite3.connect(tmp)) as conn:
+            conn.execute("PRAGMA user_version = %i" % SIGNATURES_INDEX_VERSION)
+            conn.execute("CREATE TABLE source (md5 TEXT NOT NULL, size INTEGER, mtime_ns INTEGER)")
+            conn.execute("INSERT INTO source VALUES (?, ?, ?)", (md5, stat.st_size, stat.st_mtime_ns))
+            conn.execute("CREATE TABLE signatures (id TEXT PRIMARY KEY, attributes TEXT NOT NULL)")
+            conn.executemany(
+                "INSERT INTO signatures VALUES (?, ?)",
+                ((str(k), json.dumps(v)) for k, v in attributes.items()),
+            )
+            conn.commit()
+        os.replace(tmp, path)
+    except (OSError, sqlite3.Error):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def read_signature_attributes(filename, signature_id):
+    """Attributes of one signature of a signatures attributes JSON file
+
+    They are read from the index of the file (see read_signatures_index), so
+    that the file is not parsed for a single signature. If the index is
+    missing or was built from another version of the file, the file is parsed
+    and the index written for the next tasks. A file this process parsed
+    already is not read again.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    cached = _SIGNATURES_ATTRIBUTES.get(path)
+    if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+        return cached[1][signature_id]
+    attributes = read_signatures_index(path, signature_id)
+    if attributes is None:
+        signatures_attributes = load_signatures_attributes(path)
+        write_signatures_index(path, signatures_attributes)
+        attributes = signatures_attributes[signature_id]
+    return attributes
+
+
+def load_signature(filename, dataset_filename):
+    """Attributes of the signature of a dataset as a namedtuple
+
+    The signature id is the name of the dataset file without its extension,
+    and its attributes are read from the signatures attributes file
+    `filename`, see read_signature_attributes.
+    """
+    signature_id = os.path.splitext(os.path.basename(dataset_filename))[0]
+    signature_attributes = read_signature_attributes(filename, signature_id)
+    Signature = namedtuple("Signature", signature_attributes.keys())
+    return Signature(**signature_attributes)
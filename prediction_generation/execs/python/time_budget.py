@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Wall-clock budgets of the detector runs.
+
+A script run with --time-budget writes TIMEOUT results and exits once the
+budget has passed, instead of being killed without any result. The results
+are the ones exit_with_timeout of cpdbench_utils writes, one per combination
+of the values of the arguments the script sweeps. Callers that stop a run
+with their own timer, such as the resident runner, write the same results
+with exit_running_timeout.
+
+"""
+
+import os
+import sys
+import time
+
+from cpdbench_utils import collecting_results, exit_with_timeout, exit_with_timeout_sweep
+
+
+# seconds the watchdog of a time budget waits for the timer to stop the run
+# before it writes the TIMEOUT result itself
+TIME_BUDGET_GRACE = 10
+
+# timer, watchdog and the previous SIGALRM handler and timer of the running
+# time budget, see start_time_budget
+_time_budget = None
+
+# command line and data, args, parameters, script filename and sweeps of the
+# TIMEOUT results of the running run, see start_time_budget and
+# exit_running_timeout
+_running_timeout = None
+
+
+def clear_running_timeout():
+    """Forget the TIMEOUT results of the running run, see exit_running_timeout
+
+    load_dataset calls this when a run starts and dump_output when it writes
+    its first result.
+    """
+    global _running_timeout
+    _running_timeout = None
+
+
+def _exit_with_timeout(data, args, parameters, script_filename, sweeps, runtime):
+    if sweeps is None:
+        exit_with_timeout(data, args, parameters, runtime, script_filename)
+    exit_with_timeout_sweep(data, args, parameters, sweeps, runtime, script_filename)
+
+
+def exit_running_timeout(runtime):
+    """Exit and save the TIMEOUT results of a run stopped by the caller
+
+    For callers that run scripts in their own process and stop them with
+    their own timer, e.g. the resident runner: the results are the ones the
+    time budget of the run writes, one per combination of swept values.
+    Returns False, without writing anything, if the run did not reach
+    start_time_budget yet or already wrote a result.
+    """
+    # a run that failed on an exception leaves its results behind
+    if _running_timeout is None or _running_timeout[0] != sys.argv:
+        return False
+    _exit_with_timeout(*_running_timeout[1], runtime)
+
+
+def start_time_budget(data, args, parameters, script_filename, sweep=None):
+    """Write a TIMEOUT result and exit once ``args.time_budget`` seconds passed
+
+    Scripts call this after loading the dataset, with the arguments of their
+    exit_* calls and, for scripts sweeping an argument, the (name, values) of
+    the sweep, or a list of them for scripts sweeping several arguments, which
+    get a TIMEOUT result for every combination of values. An ITIMER_REAL timer raises the exit in the main thread, out of
+    the detector loops and past their ``except Exception`` handlers. A native
+    library call only sees the exit once it returns to Python, so if the
+    script is the main program a watchdog thread writes the result and ends the
+    process after a further TIME_BUDGET_GRACE seconds.
+
+    The budget ends with the first result that is written (see dump_output of
+    cpdbench_utils).
+    Without --time-budget there is no timer, but the results are still kept
+    for a caller stopping the run, see exit_running_timeout.
+    """
+    global _running_timeout, _time_budget
+    if sweep is not None and isinstance(sweep[0], str):
+        sweep = [sweep]
+    _running_timeout = (list(sys.argv), (data, args, parameters, script_filename, sweep))
+    seconds = getattr(args, "time_budget", None)
+    if not seconds:
+        return
+    import signal
+    import threading
+
+    stop_time_budget()
+    start = time.time()
+
+    def timeout():
+        runtime = time.time() - start
+        _exit_with_timeout(data, args, parameters, script_filename, sweep, runtime)
+
+    def expire(signum, frame):
+        timeout()
+
+    def watchdog():
+        try:
+            timeout()
+        except SystemExit:
+            pass
+        sys.stdout.flush()
+        os._exit(0)
+
+    # a shorter timer of the caller, e.g. the resident runner, stays in place
+    previous_timer = signal.getitimer(signal.ITIMER_REAL)
+    if previous_timer[0] and previous_timer[0] <= seconds:
+        return
+    previous_handler = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+
+    watchdog_timer = None
+    main_module = sys.modules.get("__main__")
+    # a batch worker runs further datasets after this one
+    if not collecting_results() and os.path.abspath(getattr(main_module, "__file__", "")) == os.path.abspath(script_filename):
+        watchdog_timer = threading.Timer(seconds + TIME_BUDGET_GRACE, watchdog)
+        watchdog_timer.daemon = True
+        watchdog_timer.start()
+    _time_budget = (start, watchdog_timer, previous_handler, previous_timer)
+
+
+def stop_time_budget():
+    """End the running time budget, restoring the timer it replaced"""
+    global _time_budget
+    if _time_budget is None:
+        return
+    import signal
+    import threading
+
+    start, watchdog_timer, previous_handler, previous_timer = _time_budget
+    _time_budget = None
+    if watchdog_timer is not None:
+        watchdog_timer.cancel()
+    if threading.current_thread() is not threading.main_thread():
+        # the watchdog, which ends the process
+        return
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, previous_handler)
+    if previous_timer[0]:
+        remaining = previous_timer[0] - (time.time() - start)
+        signal.setitimer(signal.ITIMER_REAL, max(remaining, 1e-3), previous_timer[1])
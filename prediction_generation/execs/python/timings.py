@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Timings of the stages of the detector runs.
+
+Every result records the seconds spent in the stages of its run, from
+loading the dataset to writing the result, and the CPU time and peak memory
+of the run. The stages are measured the same way for all methods, so that
+their "detect" times can be compared, unlike the "runtime" every script
+measures itself. utils.R measures the stages of the R methods alike.
+
+"""
+
+import sys
+import time
+
+from profiling import discard_profile, start_profile, stop_profile
+
+
+# stages of a run, in their order, as recorded in the timings of the results
+TIMING_STAGES = ("load", "preprocess", "detect", "postprocess", "write")
+
+# timings of the current run, see start_timings
+_timings = None
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, None if unknown"""
+    try:
+        with open("/proc/self/status", "r") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def reset_peak_rss():
+    """Restart the peak resident set size of the process (Linux only)
+
+    A process running several tasks, such as a worker of the resident runner,
+    otherwise reports the peak of all tasks so far.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+    except OSError:
+        pass
+
+
+class Timings:
+    """Seconds spent in the stages of a run, its CPU time and peak memory"""
+
+    def __init__(self):
+        self.stages = dict.fromkeys(TIMING_STAGES, 0.0)
+        self.stage = None
+        self.stage_start = None
+        self.cpu_start = time.process_time()
+        reset_peak_rss()
+
+    def begin(self, stage):
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.stages[self.stage] += now - self.stage_start
+        self.stage = stage
+        self.stage_start = now
+
+    def as_dict(self):
+        out = dict(self.stages)
+        if self.stage is not None:
+            out[self.stage] += time.perf_counter() - self.stage_start
+        out["cpu_time"] = time.process_time() - self.cpu_start
+        out["peak_rss"] = peak_rss()
+        return out
+
+
+def start_timings():
+    """Start the timings of a run with its "load" stage"""
+    global _timings
+    discard_profile()
+    _timings = Timings()
+    _timings.begin("load")
+
+
+def begin_stage(stage):
+    """End the running stage of the run and begin `stage`
+
+    A run goes through the TIMING_STAGES in order: load_dataset covers "load"
+    and begins "preprocess", the scripts begin "detect" right before the
+    detection and "postprocess" right after it, and prepare_result begins
+    "write". The time of every stage is measured with time.perf_counter, so
+    the "detect" time of all methods covers the same part of the run, unlike
+    the "runtime" each script measures itself.
+
+    With CPDBENCH_PROFILE set, the "detect" stage is profiled, see Profile of
+    profiling.
+    """
+    if _timings is None:
+        start_timings()
+    stop_profile()
+    _timings.begin(stage)
+    if stage == "detect":
+        start_profile()
+
+
+def get_timings():
+    """Timings of the current run as recorded in a result
+
+    The seconds of every stage so far, including the running one, the CPU
+    seconds of the process since the run started and its peak resident set
+    size in bytes. The "write" stage covers the preparation of the result, the
+    checksums among others, and for runs with several results the writing of
+    the previous ones.
+    """
+    if _timings is None:
+        start_timings()
+    return _timings.as_dict()
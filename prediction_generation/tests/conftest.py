@@ -0,0 +1,59 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the detectors import their helpers as top-level modules, as do the tools in utils
+sys.path.insert(0, os.path.join(ROOT, "execs", "python"))
+sys.path.insert(0, os.path.join(ROOT, "utils"))
+
+# datasets of the tests that take a `dataset` argument
+DATASET_DIR = os.environ.get("CPDBENCH_DATASETS", os.path.join(ROOT, "datasets"))
+
+
+def pytest_generate_tests(metafunc):
+    if "dataset" in metafunc.fixturenames:
+        datasets = sorted(glob.glob(os.path.join(DATASET_DIR, "*.json")))
+        metafunc.parametrize("dataset", datasets, ids=os.path.basename)
+
+
+def _run(cmd):
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=ROOT)
+    if proc.returncode:
+        raise AssertionError("%s failed:\n%s" % (" ".join(cmd), proc.stderr))
+    return json.loads(proc.stdout)
+
+
+@pytest.fixture
+def run_python():
+    """Result of a script of execs/python run with the given arguments"""
+
+    def run(script, *args):
+        return _run([sys.executable, os.path.join(ROOT, "execs", "python", script)] + list(args))
+
+    return run
+
+
+@pytest.fixture
+def run_r():
+    """Result of a script of execs/R run with the given arguments
+
+    Skips the test without Rscript or without the R packages it needs.
+    """
+    if shutil.which("Rscript") is None:
+        pytest.skip("Rscript is not available")
+
+    def run(script, packages, *args):
+        for package in packages:
+            check = "quit(status=!requireNamespace('%s', quietly=TRUE))" % package
+            if subprocess.run(["Rscript", "-e", check]).returncode:
+                pytest.skip("the R package %s is not installed" % package)
+        return _run(["Rscript", os.path.join(ROOT, "execs", "R", script)] + list(args))
+
+    return run
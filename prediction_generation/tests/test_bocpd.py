@@ -0,0 +1,104 @@
+"""
+Check cpdbench_bocpd.py against the most probable segmentation found by brute
+force, and against the R scripts it replaces where R is available.
+
+"""
+
+import math
+
+import numpy as np
+import pytest
+from scipy.special import gammaln
+
+from cpdbench_bocpd import StudentTBOCPD, ahead_means, bocpd
+
+
+def log_marginal(y, m0, k0, a0, b0):
+    """Log marginal likelihood of a run under the normal-gamma prior"""
+    n = len(y)
+    mean = y.mean()
+    kn = k0 + n
+    an = a0 + n / 2
+    bn = b0 + 0.5 * ((y - mean) ** 2).sum() + k0 * n * (mean - m0) ** 2 / (2 * kn)
+    return (
+        gammaln(an) - gammaln(a0) + a0 * math.log(b0) - an * math.log(bn)
+        + 0.5 * (math.log(k0) - math.log(kn)) - n / 2 * math.log(2 * math.pi)
+    )
+
+
+def map_starts(y, hazard, prior):
+    """Starts of the runs of the most probable segmentation of `y`"""
+    n = len(y)
+    log_h, log_1mh = math.log(hazard), math.log1p(-hazard)
+    best = [0.0] + [-np.inf] * n
+    back = [None] * (n + 1)
+    for end in range(1, n + 1):
+        for start in range(end):
+            value = best[start] + log_marginal(y[start:end], *prior) + (end - start - 1) * log_1mh
+            value += log_h if start > 0 else 0.0
+            if value > best[end]:
+                best[end], back[end] = value, start
+    starts = []
+    end = n
+    while end > 0:
+        starts.append(back[end])
+        end = back[end]
+    return starts[::-1]
+
+
+def random_case(rng):
+    n = int(rng.integers(20, 70))
+    y = rng.normal(size=n) + np.repeat(rng.normal(scale=3, size=4), -(-n // 4))[:n]
+    y = (y - y.mean()) / y.std(ddof=1)
+    hazard = 1 / float(rng.choice([5, 50, 100, 200]))
+    prior = (0.0,) + tuple(float(v) for v in rng.choice([0.01, 1.0, 100.0], size=3))
+    return y, hazard, prior
+
+
+def detector(hazard, prior):
+    # without truncation the posterior is exact
+    return StudentTBOCPD(hazard, *prior, trunc_rlim=0, n_dim=1)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_plain_matches_brute_force(seed):
+    y, hazard, prior = random_case(np.random.default_rng(seed))
+    expected = [i for i in map_starts(y, hazard, prior) if i > 0]
+    assert bocpd(y[:, None], detector(hazard, prior)) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lookahead_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    y, hazard, prior = random_case(rng)
+    lookahead = int(rng.choice([3, 9, 12]))
+    probes = ahead_means(y[:, None], lookahead)[:, 0]
+    expected = [
+        i
+        for i in range(1, len(y) - 1)
+        if map_starts(np.append(y[:i], probes[i]), hazard, prior)[-1] == i
+    ]
+    assert bocpd(y[:, None], detector(hazard, prior), lookahead) == expected
+
+
+@pytest.mark.parametrize("lookahead", [None, 5])
+@pytest.mark.parametrize("n", [1, 2])
+def test_short_series(n, lookahead):
+    # the first point starts the first run and is reported by neither variant
+    y = np.arange(n, dtype=float)[:, None]
+    assert bocpd(y, detector(0.01, (0.0, 1.0, 1.0, 1.0)), lookahead) == []
+
+
+@pytest.mark.parametrize(
+    "r_script, args",
+    [
+        ("cpdbench_ocp.R", ["-l", "100"]),
+        ("cpdbench_ocp.R", ["-l", "10", "--prior-a", "0.01", "--prior-b", "100", "--prior-k", "1"]),
+        ("cpdbench_bocpd_lookahead.R", ["-l", "100", "--lookahead", "5"]),
+    ],
+)
+def test_matches_r(dataset, r_script, args, run_python, run_r):
+    expected = run_r(r_script, ["ocp"], "-i", dataset, *args)
+    result = run_python("cpdbench_bocpd.py", "-i", dataset, *args)
+    assert result["status"] == expected["status"]
+    assert result["result"]["cplocations"] == expected["result"]["cplocations"]
@@ -0,0 +1,173 @@
+"""
+Check cpdbench_changepoint.py against the optimal segmentations found by brute
+force, and against the R script it replaces where R is available.
+
+"""
+
+import itertools
+import json
+import math
+
+import numpy as np
+import pytest
+
+from cpdbench_changepoint import (
+    MIN_SEGMENT_LENGTH,
+    MIN_VARIANCE,
+    changepoints,
+    max_changepoints,
+    penalty_value,
+)
+
+
+def segment_cost(x, func, mbic):
+    """Cost of a segment of the centred series, computed from its points"""
+    n = len(x)
+    if func == "var":
+        deviance = (x ** 2).sum()
+    else:
+        deviance = 0.0 if np.ptp(x) == 0 else ((x - x.mean()) ** 2).sum()
+    if func == "mean":
+        cost = deviance
+    else:
+        variance = deviance / n if deviance > 0 else MIN_VARIANCE
+        cost = n * (math.log(2 * math.pi) + math.log(variance) + 1)
+    return cost + (math.log(n) if mbic else 0.0)
+
+
+def objective(y, func, penalty, ends):
+    """Penalized cost of the segmentation of `y` with the segment ends `ends`"""
+    x = y - y.mean()
+    mbic = penalty == "MBIC"
+    starts = [0] + list(ends[:-1])
+    cost = sum(segment_cost(x[s:e], func, mbic) for s, e in zip(starts, ends))
+    return cost + penalty_value(penalty, func, len(y)) * (len(ends) - 1)
+
+
+def segmentations(n, min_length, max_segments=None):
+    """Segment ends of all segmentations with segments of min_length or more"""
+    for k in range(n):
+        if max_segments is not None and k + 1 > max_segments:
+            return
+        for taus in itertools.combinations(range(min_length, n - min_length + 1), k):
+            ends = list(taus) + [n]
+            if all(e - s >= min_length for s, e in zip([0] + ends[:-1], ends)):
+                yield ends
+
+
+def random_series(rng):
+    # the asymptotic penalties of cpt.var and cpt.meanvar need 7 points
+    n = int(rng.integers(7, 13))
+    y = rng.normal(size=n) + np.repeat(rng.normal(scale=3, size=3), -(-n // 3))[:n]
+    if rng.random() < 0.5:
+        # runs of equal values, whose segments have no variance
+        y = np.round(y)
+    sd = y.std(ddof=1)
+    return (y - y.mean()) / (sd if sd > 0 else 1.0)
+
+
+@pytest.mark.parametrize("func", ["mean", "var", "meanvar"])
+@pytest.mark.parametrize("seed", range(20))
+def test_amoc_matches_brute_force(seed, func):
+    y = random_series(np.random.default_rng(seed))
+    n = len(y)
+    m = MIN_SEGMENT_LENGTH[func]
+    penalties = ["None", "SIC", "MBIC", "AIC", "Hannan-Quinn", "Asymptotic"]
+    result = changepoints(y, func, "AMOC", penalties)
+    for penalty in penalties:
+        assert len(result[penalty]) <= 1 and n not in result[penalty]
+        # no change, or the best single one
+        best = min(objective(y, func, penalty, ends) for ends in segmentations(n, m, 2))
+        assert objective(y, func, penalty, result[penalty] + [n]) == pytest.approx(best, rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize("func", ["mean", "var", "meanvar"])
+@pytest.mark.parametrize("seed", range(20))
+def test_segneigh_matches_brute_force(seed, func):
+    y = random_series(np.random.default_rng(seed))
+    n = len(y)
+    Q = max_changepoints("SegNeigh", "max", n)
+    penalties = ["None", "SIC", "AIC", "Hannan-Quinn"]
+    result = changepoints(y, func, "SegNeigh", penalties, Q)
+    for penalty in penalties:
+        assert n not in result[penalty]
+        best = min(objective(y, func, penalty, ends) for ends in segmentations(n, MIN_SEGMENT_LENGTH[func], Q))
+        assert objective(y, func, penalty, result[penalty] + [n]) == pytest.approx(best, rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_pelt_matches_brute_force(seed):
+    # the pruning of PELT keeps the optimal partition for the cost of
+    # cpt.mean, with the penalties that do not add the log segment length
+    y = random_series(np.random.default_rng(seed))
+    penalties = ["None", "SIC", "AIC", "Hannan-Quinn"]
+    result = changepoints(y, "mean", "PELT", penalties)
+    n = len(y)
+    for penalty in penalties:
+        assert n not in result[penalty]
+        best = min(objective(y, "mean", penalty, ends) for ends in segmentations(n, 1))
+        assert objective(y, "mean", penalty, result[penalty] + [n]) == pytest.approx(best, rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize("method", ["AMOC", "PELT", "BinSeg", "SegNeigh"])
+@pytest.mark.parametrize("func", ["mean", "var", "meanvar"])
+def test_noiseless_step(func, method):
+    # every segment between the change points has no variance
+    y = np.repeat([0.0, 5.0], 30)
+    y = (y - y.mean()) / y.std(ddof=1)
+    penalty = "BIC" if method == "SegNeigh" else "MBIC"
+    result = changepoints(y, func, method, [penalty], max_changepoints(method, "max", len(y)))
+    # the variance around the mean of the series does not change
+    assert result[penalty] == ([] if func == "var" else [30])
+
+
+@pytest.mark.parametrize("method", ["AMOC", "PELT", "BinSeg", "SegNeigh"])
+@pytest.mark.parametrize("func", ["mean", "var", "meanvar"])
+def test_no_change(func, method):
+    # the end of the series is no change point
+    y = np.random.default_rng(0).normal(size=60)
+    y = (y - y.mean()) / y.std(ddof=1)
+    penalty = "BIC" if method == "SegNeigh" else "MBIC"
+    result = changepoints(y, func, method, [penalty], max_changepoints(method, "max", len(y)))
+    assert result[penalty] == []
+
+
+@pytest.mark.parametrize("method", ["AMOC", "PELT", "BinSeg", "SegNeigh"])
+def test_results_leave_out_the_end(tmp_path, method, run_python):
+    values = [0.0] * 30 + [5.0] * 30
+    data = {
+        "name": "step",
+        "longname": "Step",
+        "n_obs": len(values),
+        "n_dim": 1,
+        "time": {"index": list(range(len(values)))},
+        "series": [{"label": "V1", "type": "float", "raw": values}],
+    }
+    filename = str(tmp_path / "step.json")
+    with open(filename, "w") as fp:
+        json.dump(data, fp)
+    penalty = "BIC" if method == "SegNeigh" else "MBIC"
+    result = run_python("cpdbench_changepoint.py", "-i", filename, "-f", "meanvar", "-m", method, "-p", penalty)
+    assert result["result"]["cplocations"] == [30]
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["-f", "mean", "-m", "AMOC", "-p", "MBIC"],
+        ["-f", "var", "-m", "AMOC", "-p", "Asymptotic"],
+        ["-f", "mean", "-m", "PELT", "-p", "MBIC"],
+        ["-f", "meanvar", "-m", "PELT", "-p", "SIC"],
+        ["-f", "var", "-m", "PELT", "-p", "Hannan-Quinn"],
+        ["-f", "mean", "-m", "BinSeg", "-p", "MBIC", "-Q", "default"],
+        ["-f", "meanvar", "-m", "BinSeg", "-p", "AIC", "-Q", "max"],
+        ["-f", "mean", "-m", "SegNeigh", "-p", "BIC", "-Q", "default"],
+        ["-f", "meanvar", "-m", "SegNeigh", "-p", "SIC", "-Q", "max"],
+        ["-f", "mean", "-m", "PELT", "-p", "Asymptotic"],
+    ],
+)
+def test_matches_r(dataset, args, run_python, run_r):
+    expected = run_r("cpdbench_changepoint.R", ["changepoint"], "-i", dataset, *args)
+    result = run_python("cpdbench_changepoint.py", "-i", dataset, *args)
+    assert result["status"] == expected["status"]
+    assert result["result"]["cplocations"] == expected["result"]["cplocations"]
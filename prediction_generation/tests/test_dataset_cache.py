@@ -0,0 +1,73 @@
+"""
+Compare the datasets loaded from their binary caches with the parsed ones.
+
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import dataset_cache
+from cpdbench_utils import RevisionSeries, load_dataset
+from dataset_cache import build_dataset_cache, dataset_cache_path
+
+
+def write_dataset(path, values, pushes):
+    data = {
+        "name": "demo",
+        "longname": "Demo",
+        "n_obs": len(values),
+        "n_dim": 1,
+        "time": {"format": "%Y-%m-%d %H:%M:%S", "index": list(range(len(values))), "raw": pushes},
+        "series": [{"label": "V1", "type": "float", "raw": values}],
+    }
+    with open(path, "w") as fp:
+        json.dump(data, fp)
+    return data
+
+
+@pytest.fixture
+def demo_dataset(tmp_path):
+    values = [1.0, 2.0, None, 4.0, 3.0, 5.0]
+    pushes = ["2023-01-01 00:00:00"] * 2 + ["2023-01-02 00:00:00"] * 3 + ["2023-01-03 00:00:00"]
+    filename = str(tmp_path / "demo.json")
+    return filename, write_dataset(filename, values, pushes)
+
+
+def test_load_dataset_does_not_write_the_cache(demo_dataset):
+    filename, data = demo_dataset
+    loaded, _ = load_dataset(filename)
+    assert dict(loaded) == data
+    assert not os.path.exists(dataset_cache_path(filename))
+
+
+def test_cached_dataset_matches_the_parsed_one(demo_dataset, monkeypatch):
+    filename, data = demo_dataset
+    parsed, parsed_mat = load_dataset(filename)
+    assert build_dataset_cache(filename)
+
+    # the JSON file is not parsed for the fields kept in the cache
+    monkeypatch.setattr(dataset_cache.json, "load", None)
+    cached, cached_mat = load_dataset(filename)
+    np.testing.assert_array_equal(cached_mat, parsed_mat)
+    assert (cached["name"], cached["n_obs"], cached["n_dim"]) == ("demo", 6, 1)
+    cached_series = RevisionSeries.from_dataset(cached)
+    parsed_series = RevisionSeries.from_dataset(parsed)
+    np.testing.assert_array_equal(cached_series.values, parsed_series.values)
+    np.testing.assert_array_equal(cached_series.timestamps, parsed_series.timestamps)
+    monkeypatch.undo()
+
+    # the other fields are read from the JSON file on first use
+    assert cached.copy()["series"] == data["series"]
+    assert dict(cached) == data
+
+
+def test_stale_cache_is_not_used(demo_dataset):
+    filename, data = demo_dataset
+    assert build_dataset_cache(filename)
+    write_dataset(filename, [7.0, 8.0, 9.0], ["2023-01-01 00:00:00"] * 3)
+    loaded, mat = load_dataset(filename)
+    assert loaded["n_obs"] == 3
+    assert mat.shape == (3, 1)
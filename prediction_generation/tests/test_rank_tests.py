@@ -0,0 +1,90 @@
+"""
+Compare the rank tests on sorted windows with scipy.stats.
+
+The windows are the ones cpdbench_methods tests on every dataset of
+$CPDBENCH_DATASETS (default: ./datasets), see conftest.py, plus random windows
+with and without ties around the sizes where scipy switches between its exact
+and asymptotic methods.
+
+"""
+
+import json
+
+import numpy as np
+import pytest
+from scipy import stats
+
+import rank_tests
+from cpdbench_utils import RevisionSeries
+
+RTOL = 1e-12
+
+
+def scipy_pvalue(method, x, y):
+    if method == "ks":
+        return stats.ks_2samp(x, y).pvalue
+    if method == "mwu":
+        return stats.mannwhitneyu(x, y, alternative="two-sided").pvalue
+    if method == "cvm":
+        return stats.cramervonmises_2samp(x, y).pvalue
+    return stats.anderson_ksamp([x, y]).significance_level
+
+
+def assert_same_pvalues(method, windows):
+    for x, y in windows:
+        if method == "anderson" and len(np.unique(np.concatenate((x, y)))) < 2:
+            continue
+        expected = scipy_pvalue(method, x, y)
+        _, p = rank_tests.RANK_TESTS[method](np.sort(x), np.sort(y))
+        assert p == pytest.approx(expected, rel=RTOL, abs=0), (method, x.tolist(), y.tolist())
+
+
+def dataset_windows(filename):
+    """The windows of cpdbench_methods with its default sizes"""
+    with open(filename) as fp:
+        series = RevisionSeries.from_dataset(json.load(fp))
+    if np.isnan(series.values).any():
+        return []
+    windows = []
+    for i in range(1, len(series)):
+        start = series.back_window_start(i, 0, 12, 24)
+        end = series.fore_window_end(i, 12)
+        if i - start > 1 and end - i > 1:
+            windows.append((series.window(start, i), series.window(i, end)))
+    return windows
+
+
+def random_windows(seed):
+    rng = np.random.default_rng(seed)
+    windows = []
+    for n1 in (2, 3, 5, 8, 9, 12, 20, 21, 24, 40):
+        for n2 in (2, 7, 8, 9, 12, 20, 21, 30):
+            windows.append((rng.normal(size=n1), rng.normal(0.5, size=n2)))
+            # ties within and between the samples
+            windows.append((rng.integers(0, 4, n1).astype(float), rng.integers(1, 5, n2).astype(float)))
+    return windows
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+@pytest.mark.parametrize("method", sorted(rank_tests.RANK_TESTS))
+def test_dataset_windows(method, dataset):
+    assert_same_pvalues(method, dataset_windows(dataset))
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+@pytest.mark.parametrize("method", sorted(rank_tests.RANK_TESTS))
+@pytest.mark.parametrize("seed", range(3))
+def test_random_windows(method, seed):
+    assert_same_pvalues(method, random_windows(seed))
+
+
+def test_exact_ks_matches_scipy():
+    # same statistic for both, the exact probability comes from a copy of scipy's
+    for n1, n2 in [(12, 12), (12, 24), (7, 30), (100, 99)]:
+        x = np.linspace(0, 1, n1)
+        for shift in (0.0, 0.1, 0.3, 0.7):
+            y = np.linspace(shift, 1 + shift, n2)
+            result = stats.ks_2samp(x, y, method="exact")
+            d, p = rank_tests.ks_2samp(x, y)
+            assert d == pytest.approx(result.statistic, rel=RTOL)
+            assert p == pytest.approx(result.pvalue, rel=RTOL, abs=0)
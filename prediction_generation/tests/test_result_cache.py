@@ -0,0 +1,85 @@
+"""
+Check which changes lead to new keys of the result cache.
+
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def task(tmp_path):
+    scripts = tmp_path / "execs" / "python"
+    scripts.mkdir(parents=True)
+    (scripts / "cpdbench_demo.py").write_text("import cpdbench_utils\n")
+    (scripts / "cpdbench_utils.py").write_text("VALUE = 1\n")
+    (tmp_path / "dataset.json").write_text("{}\n")
+    (tmp_path / "attributes.json").write_text("{}\n")
+    cmd = "python3.9 %s -i %s -a %s --alpha 0.05" % (
+        scripts / "cpdbench_demo.py",
+        tmp_path / "dataset.json",
+        tmp_path / "attributes.json",
+    )
+    return tmp_path, cmd
+
+
+def rewrite(path, content):
+    # a distinct mtime, so that the change is seen whatever the mtime
+    # resolution of the file system
+    path.write_text(content)
+    os.utime(path, ns=(0, 0))
+
+
+@pytest.mark.parametrize(
+    "changed",
+    ["execs/python/cpdbench_demo.py", "execs/python/cpdbench_utils.py", "dataset.json", "attributes.json"],
+)
+def test_changed_file_changes_the_key(task, changed):
+    tmp_path, cmd = task
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = cache.key(cmd)
+    assert key is not None and cache.key(cmd) == key
+    rewrite(tmp_path / changed, "# changed\n")
+    assert cache.key(cmd) != key
+    assert ResultCache(str(tmp_path / "cache")).key(cmd) == cache.key(cmd)
+
+
+@pytest.mark.parametrize("changed", ["cpdbench_changepoint.R", "utils.R"])
+def test_changed_r_script_changes_the_key_of_its_caller(task, changed):
+    tmp_path, cmd = task
+    scripts = tmp_path / "execs" / "python"
+    (scripts / "cpdbench_changepoint.py").write_text("import cpdbench_utils\n")
+    r_scripts = tmp_path / "execs" / "R"
+    r_scripts.mkdir()
+    (r_scripts / "cpdbench_changepoint.R").write_text("source('utils.R')\n")
+    (r_scripts / "utils.R").write_text("VALUE <- 1\n")
+    cmd = cmd.replace("cpdbench_demo.py", "cpdbench_changepoint.py")
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = cache.key(cmd)
+    assert key is not None
+    rewrite(r_scripts / changed, "# changed\n")
+    assert cache.key(cmd) != key
+
+
+def test_arguments_change_the_key(task):
+    tmp_path, cmd = task
+    cache = ResultCache(str(tmp_path / "cache"))
+    assert cache.key(cmd) != cache.key(cmd.replace("0.05", "0.01"))
+
+
+def test_missing_dataset_has_no_key(task):
+    tmp_path, cmd = task
+    os.remove(tmp_path / "dataset.json")
+    assert ResultCache(str(tmp_path / "cache")).key(cmd) is None
+
+
+def test_import_leaves_the_path_alone():
+    code = "import sys; path = list(sys.path); import result_cache; assert sys.path == path"
+    utils = os.path.dirname(os.path.abspath(result_cache.__file__))
+    subprocess.run([sys.executable, "-c", code], cwd=utils, check=True)
@@ -0,0 +1,502 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run the abed task grid on the cores of this machine.
+
+``abed local`` needs MPI to use more than one core, and the PBS and MW
+settings of abed_conf.py are for clusters. This executor expands METHODS x
+PARAMS x DATASETS with abed's own task functions, so the tasks have the same
+hashes as in the TASK_FILE, and runs them on a pool of worker processes. Every
+worker runs the tasks like the resident runner: Python scripts are imported
+once per worker, scripts of a virtual environment run in a resident worker of
+that environment and other commands (the R scripts) in a shell.
+
+Results are written to RESULT_DIR/<dataset>/<method>/<hash>.json as they come
+in, the layout ``abed local`` leaves and summarize.py reads. Tasks that already
+have a result there are skipped, so an interrupted run is resumed by starting
+it again. With ``--timeout`` a Python task running longer is interrupted and
+written as a TIMEOUT result by exit_with_timeout of cpdbench_utils, other
+commands are stopped and reported as errors.
+
+Tasks of a script that evaluates several values of an argument in a single
+run (see SWEPT_ARGUMENTS) and that differ in the values of these arguments
+only are run together, and every result of the run is written to the result
+of its own task. ``--no-group`` runs every task on its own.
+
+The tasks expected to run longest are dispatched first, with the estimates of
+scheduler.py from the results in RESULT_DIR and the --history directories. The
+makespan predicted from these estimates is reported before the run, the actual
+one after it.
+
+With ``--profile`` the detect stage of the Python tasks is profiled (see
+Profile in profiling.py) and the profiles are written to
+PROFILE_DIR/<dataset>/<method>/<hash>.<ext>, next to where the results go in
+RESULT_DIR, which summarize.py expects to hold results only. profile_summary.py
+aggregates them.
+
+Run it from the directory of abed_conf.py, with the interpreter of the
+``python3.9`` tasks::
+
+    python3.9 utils/local_executor.py -j 64 --timeout 3600 [query words]
+
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import shlex
+import sys
+import time
+
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "execs", "python")
+)
+
+from profiling import PROFILE_ENV, PROFILE_EXTENSIONS, PROFILE_OUTPUT_ENV
+from resident_runner import SCRIPT_COMMAND, TaskFailed, TaskRunner, task_command
+from result_cache import parse_results
+from scheduler import CostModel, longest_first, makespan, read_runtimes
+
+# task runner of a pool worker, created by its first task
+_runner = None
+
+# arguments of which the scripts evaluate several values in a single run, by
+# script: the flags of every argument and its name in the recorded args
+SWEPT_ARGUMENTS = {
+    "cpdbench_changepoint.py": [(("-p", "--penalty"), "penalty")],
+    "cpdbench_cusum.py": [(("--min-distance",), "min_distance")],
+    "cpdbench_cvm.py": [(("--min-distance",), "min_distance")],
+    "cpdbench_ewma.py": [(("--min-distance",), "min_distance")],
+    "cpdbench_methods.py": [
+        (("--method",), "method"),
+        (("--alert-threshold",), "alert_threshold"),
+    ],
+    "cpdbench_methods_cliff.py": [(("--alert-threshold",), "alert_threshold")],
+    "cpdbench_mosum.py": [(("--min-distance",), "min_distance")],
+    "cpdbench_mozilla_rep.py": [(("--alert-threshold",), "alert_threshold")],
+    "cpdbench_mozilla_rep_cliff.py": [(("--alert-threshold",), "alert_threshold")],
+    "cpdbench_odummy.py": [(("--min-distance",), "min_distance")],
+    "cpdbench_shewhart.py": [(("--min-distance",), "min_distance")],
+}
+
+
+def run_task(hsh, cmd, timeout, env=None):
+    """Run a task in a pool worker, return (hsh, output, error, seconds)"""
+    global _runner
+    if _runner is None:
+        _runner = TaskRunner()
+    start = time.time()
+    try:
+        output = _runner.run(cmd, timeout, env)
+    except TaskFailed as err:
+        return hsh, None, "%s\n%s" % (err, err.output), time.time() - start
+    return hsh, output, None, time.time() - start
+
+
+def result_path(task, hsh):
+    """Path of the result of a task, where abed's move_results puts it"""
+    from abed.conf import settings
+    from abed.datasets import dataset_name
+
+    return os.path.join(
+        settings.RESULT_DIR,
+        dataset_name(task["dataset"]),
+        task["method"],
+        hsh + settings.RESULT_EXTENSION,
+    )
+
+
+def profile_output(task, hsh, profile_dir):
+    """Path of the profile of a task without its extension, laid out like RESULT_DIR"""
+    from abed.conf import settings
+
+    path = os.path.relpath(result_path(task, hsh), settings.RESULT_DIR)
+    return os.path.join(profile_dir, os.path.splitext(path)[0])
+
+
+def write_result(path, output):
+    """Write a result, renamed into place so that no partial result is left"""
+    from abed.conf import settings
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.makedirs(settings.STAGE_DIR, exist_ok=True)
+    tmp = os.path.join(settings.STAGE_DIR, os.path.basename(path) + ".tmp")
+    with open(tmp, "w") as fp:
+        fp.write(output)
+    os.replace(tmp, path)
+
+
+def swept_command(cmd):
+    """Group key, swept arguments and swept values of a task command
+
+    The key is the command without the values of its swept arguments, so the
+    tasks with the same key differ in these values only. Returns None for a
+    command that is run on its own: not a Python script with swept arguments
+    (see SWEPT_ARGUMENTS), or not giving a single value to each of them.
+    """
+    match = SCRIPT_COMMAND.match(cmd)
+    if match is None:
+        return None
+    swept = SWEPT_ARGUMENTS.get(os.path.basename(match.group("script")))
+    if swept is None:
+        return None
+    argv = shlex.split(match.group("args"))
+    values = []
+    for position, (flags, _) in enumerate(swept):
+        found = [i for i, arg in enumerate(argv) if arg in flags]
+        if len(found) != 1:
+            return None
+        i = found[0]
+        if i + 1 == len(argv) or str(argv[i + 1]).startswith("-"):
+            return None
+        if i + 2 < len(argv) and not str(argv[i + 2]).startswith("-"):
+            return None
+        values.append(argv[i + 1])
+        # placeholder of the values of the group, see group_command
+        argv[i + 1] = (position,)
+    key = (cmd[: match.start("args")], tuple(argv))
+    return key, swept, tuple(values)
+
+
+def group_command(key, values):
+    """Command of a group of tasks, `values` lists the values of every swept argument"""
+    prefix, argv = key
+    words = []
+    for arg in argv:
+        if isinstance(arg, tuple):
+            words.extend(values[arg[0]])
+        else:
+            words.append(arg)
+    return prefix + " " + " ".join(shlex.quote(word) for word in words)
+
+
+def group_tasks(hashes, commands):
+    """Runs of the tasks, as a dict of the command of every run to its tasks
+
+    The tasks with the same key of swept_command form one run, which
+    evaluates every combination of the values of their swept arguments.
+    Other tasks run on their own. The runs keep the order of their first task.
+    """
+    groups = {}
+    for hsh in hashes:
+        swept = swept_command(commands[hsh])
+        key = hsh if swept is None else swept[0]
+        groups.setdefault(key, []).append(hsh)
+    runs = {}
+    for key, group in groups.items():
+        if len(group) == 1:
+            runs[commands[group[0]]] = group
+            continue
+        columns = zip(*(swept_command(commands[hsh])[2] for hsh in group))
+        values = [list(dict.fromkeys(column)) for column in columns]
+        runs[group_command(key, values)] = group
+    return runs
+
+
+def _same_value(recorded, word):
+    """Whether a value recorded in the args of a result is the word of a command"""
+    if isinstance(recorded, list):
+        # a result written for all values, e.g. before the run started its
+        # time budget
+        return any(_same_value(value, word) for value in recorded)
+    if str(recorded) == word:
+        return True
+    try:
+        return float(recorded) == float(word)
+    except (TypeError, ValueError):
+        return False
+
+
+def split_output(output, hashes, commands):
+    """Outputs of the tasks of a run, by hash, from the output of the run
+
+    The result of a task is the one whose recorded values of the swept
+    arguments are those of its command. Its command is recorded as the
+    command of the task, which gives the same result run on its own. Tasks
+    without a result are left out.
+    """
+    results = parse_results(output) or []
+    outputs = {}
+    for hsh in hashes:
+        _, swept, values = swept_command(commands[hsh])
+        for result in results:
+            args = result.get("args", {})
+            if all(
+                name in args and _same_value(args[name], value)
+                for (_, name), value in zip(swept, values)
+            ):
+                match = SCRIPT_COMMAND.match(commands[hsh])
+                argv = [match.group("script")] + shlex.split(match.group("args"))
+                result = dict(result, command=" ".join(argv))
+                outputs[hsh] = json.dumps(result, sort_keys=True, indent="\t") + "\n"
+                break
+    return outputs
+
+
+def dataset_lengths(datasets):
+    """Number of observations of the datasets, by name"""
+    from abed.run_utils import get_scratchdir
+
+    n_obs = {}
+    for name in datasets:
+        filename = os.path.join(get_scratchdir(True), "datasets", name + ".json")
+        try:
+            with open(filename, "r") as fp:
+                n_obs[name] = json.load(fp)["n_obs"]
+        except (OSError, ValueError, KeyError):
+            continue
+    return n_obs
+
+
+def format_seconds(seconds):
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+class Progress:
+    """Throughput and estimated time left of a run
+
+    The time left is extrapolated from the expected runtimes of the finished
+    and the remaining runs rather than their number, as the longest runs come
+    first. `sizes` holds the number of tasks of the runs grouping several.
+    """
+
+    def __init__(self, costs, sizes=None):
+        self.costs = costs
+        self.sizes = sizes or {}
+        self.total = sum(self.sizes.get(hsh, 1) for hsh in costs)
+        self.done = 0
+        self.failed = 0
+        self.cost_done = 0.0
+        self.cost_total = sum(costs.values())
+        self.start = time.time()
+
+    def update(self, hsh, failed=0):
+        self.done += self.sizes.get(hsh, 1)
+        self.failed += failed
+        self.cost_done += self.costs[hsh]
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def __str__(self):
+        elapsed = self.elapsed()
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        if self.cost_done > 0:
+            eta = format_seconds((self.cost_total - self.cost_done) * elapsed / self.cost_done)
+        else:
+            eta = "?"
+        return "%i/%i done, %i failed, %.2f tasks/s, elapsed %s, ETA %s" % (
+            self.done,
+            self.total,
+            self.failed,
+            rate,
+            format_seconds(elapsed),
+            eta,
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the abed task grid on a pool of local worker processes."
+    )
+    parser.add_argument(
+        "query_words",
+        nargs="*",
+        help="Only run the tasks matching all these words, as abed does",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Time limit per task, Python tasks running longer get a TIMEOUT result",
+    )
+    parser.add_argument(
+        "--result-cache",
+        metavar="DIR",
+        help="Reuse the outputs stored in DIR for tasks whose script, dataset "
+        "and arguments are unchanged, and store new ones there",
+    )
+    parser.add_argument(
+        "--history",
+        metavar="DIR",
+        action="append",
+        default=[],
+        help="Result directory of an earlier run to estimate the task runtimes "
+        "from, in addition to RESULT_DIR (can be repeated)",
+    )
+    parser.add_argument(
+        "--order",
+        choices=["longest", "file"],
+        default="longest",
+        help="Dispatch the tasks expected to run longest first, or in the "
+        "order of the grid (default: longest)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILE_EXTENSIONS),
+        help="Profile the detect stage of the Python tasks with this profiler, "
+        "running also the tasks whose output is in the result cache",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        metavar="DIR",
+        default="profiles",
+        help="Directory of the profiles, laid out like RESULT_DIR (default: profiles)",
+    )
+    parser.add_argument(
+        "--no-group",
+        action="store_true",
+        help="Run every task on its own, also the tasks that differ in the "
+        "values of swept arguments only",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    from abed.conf import settings
+    from abed.io import error, info
+    from abed.tasks import filter_tasks, init_tasks
+
+    if settings.TYPE not in ("ASSESS_GRID", "ASSESS_LIST", "ASSESS"):
+        error("The local executor does not support experiments of TYPE %s" % settings.TYPE)
+        raise SystemExit(1)
+
+    cache = None
+    if args.result_cache:
+        from result_cache import ResultCache
+
+        cache = ResultCache(args.result_cache)
+
+    all_tasks = init_tasks()
+    task_dict = filter_tasks(all_tasks, query_words=args.query_words or None)
+    todo = {hsh: task for hsh, task in task_dict.items() if not os.path.exists(result_path(task, hsh))}
+    info(
+        "%i tasks, %i have a result in %s, running %i on %i workers"
+        % (len(task_dict), len(task_dict) - len(todo), settings.RESULT_DIR, len(todo), args.jobs)
+    )
+
+    keys = {}
+    pending = []
+    for hsh, task in todo.items():
+        keys[hsh] = cache.key(task_command(task)) if cache else None
+        output = cache.get(keys[hsh]) if keys[hsh] and not args.profile else None
+        if output is None:
+            pending.append(hsh)
+        else:
+            write_result(result_path(task, hsh), output)
+    if len(pending) < len(todo):
+        info("%i tasks answered from the result cache" % (len(todo) - len(pending)))
+
+    commands = {hsh: task_command(todo[hsh]) for hsh in pending}
+    if args.no_group:
+        runs = {commands[hsh]: [hsh] for hsh in pending}
+    else:
+        runs = group_tasks(pending, commands)
+    # a run is identified by its first task
+    run_tasks = {group[0]: group for group in runs.values()}
+    run_commands = {group[0]: cmd for cmd, group in runs.items()}
+    pending = list(run_tasks)
+    if len(run_tasks) < len(commands):
+        info("%i tasks grouped in %i runs of the swept arguments" % (len(commands), len(run_tasks)))
+
+    runtimes = []
+    for result_dir in [settings.RESULT_DIR] + args.history:
+        runtimes.extend(read_runtimes(result_dir))
+    model = CostModel(runtimes, all_tasks, dataset_lengths({t["dataset"] for t in todo.values()}))
+    # the tasks of a run share the detection, which is most of their runtime
+    costs = {
+        run: max(model.cost(hsh, todo[hsh]) for hsh in group)
+        for run, group in run_tasks.items()
+    }
+    grid_makespan = makespan(pending, costs, args.jobs)
+    if args.order == "longest":
+        pending = longest_first(pending, costs)
+    predicted = makespan(pending, costs, args.jobs)
+    info(
+        "Estimated the task runtimes from %i past results, predicted makespan "
+        "%s (%s in grid order)"
+        % (len(model), format_seconds(predicted), format_seconds(grid_makespan))
+    )
+
+    progress = Progress(costs, {run: len(group) for run, group in run_tasks.items()})
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = []
+        for hsh in pending:
+            env = None
+            if args.profile:
+                env = {
+                    PROFILE_ENV: args.profile,
+                    PROFILE_OUTPUT_ENV: profile_output(todo[hsh], hsh, args.profile_dir),
+                }
+            futures.append(pool.submit(run_task, hsh, run_commands[hsh], args.timeout, env))
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                hsh, output, err, seconds = future.result()
+                task = todo[hsh]
+                group = run_tasks[hsh]
+                outputs = {}
+                if output is not None:
+                    outputs = {hsh: output} if len(group) == 1 else split_output(output, group, commands)
+                progress.update(hsh, failed=len(group) - len(outputs))
+                for member in group:
+                    if member not in outputs:
+                        if output is not None:
+                            err = "the output of '%s' has no result for the task:\n%s" % (
+                                run_commands[hsh],
+                                output,
+                            )
+                        error(
+                            "There was an error executing: '%s'. Here is the error: %s"
+                            % (commands[member], err)
+                        )
+                        continue
+                    write_result(result_path(todo[member], member), outputs[member])
+                    if keys[member]:
+                        cache.put(keys[member], outputs[member])
+                info(
+                    "[%s] %s%s %s on %s in %.1fs | %s"
+                    % (
+                        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        hsh,
+                        " and %i more" % (len(group) - 1) if len(group) > 1 else "",
+                        task["method"],
+                        task["dataset"],
+                        seconds,
+                        progress,
+                    )
+                )
+        except BrokenProcessPool:
+            error(
+                "A worker process died, the remaining tasks were not run. "
+                "Start the executor again to resume."
+            )
+            for future in futures:
+                future.cancel()
+            raise SystemExit(1)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            raise
+    info(
+        "Finished: %s, makespan %s (predicted %s)"
+        % (progress, format_seconds(progress.elapsed()), format_seconds(predicted))
+    )
+
+
+if __name__ == "__main__":
+    main()
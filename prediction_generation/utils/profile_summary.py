@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Report the hottest functions of a method over the profiles of its tasks.
+
+The Python methods profile their detect stage when CPDBENCH_PROFILE is set,
+see Profile in profiling.py. The local executor does so for the whole grid
+with ``--profile``, and writes the profiles to a directory laid out like
+RESULT_DIR. This script merges the profiles of a method over all datasets and
+parameters::
+
+    python3.9 utils/profile_summary.py profiles --method best_cusum
+
+cProfile profiles are merged with pstats, pyinstrument sessions are combined
+and their time is summed by function. tracemalloc snapshots are summed by the
+line that allocated the memory, which is reported per task.
+
+"""
+
+import argparse
+import collections
+import functools
+import os
+import pstats
+import sys
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "execs", "python")
+)
+
+from profiling import PROFILE_EXTENSIONS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Aggregate the profiles of the detector runs by method."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Profile files or directories searched for them, e.g. profiles",
+    )
+    parser.add_argument(
+        "-m",
+        "--method",
+        help="Only the profiles of this method, the name of their directory: "
+        "the abed method for the local executor, the script otherwise",
+    )
+    parser.add_argument(
+        "-n", "--top", type=int, default=25, help="Number of functions to show (default: 25)"
+    )
+    parser.add_argument(
+        "-s",
+        "--sort",
+        choices=["cumulative", "self"],
+        default="cumulative",
+        help="Order of the functions: by their time including or excluding "
+        "the functions they call (default: cumulative)",
+    )
+    return parser.parse_args()
+
+
+def find_profiles(paths, method=None):
+    """Profile files under `paths` by profiler, only those of `method` if given"""
+    profilers = {ext: name for name, ext in PROFILE_EXTENSIONS.items()}
+    found = collections.defaultdict(list)
+
+    def add(path):
+        profiler = profilers.get(os.path.splitext(path)[1])
+        if profiler is None:
+            return
+        if method is not None and os.path.basename(os.path.dirname(os.path.abspath(path))) != method:
+            return
+        found[profiler].append(path)
+
+    for path in paths:
+        if not os.path.isdir(path):
+            add(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                add(os.path.join(root, filename))
+    return found
+
+
+def summarize_cprofile(files, top, sort):
+    stats = pstats.Stats(*files, stream=sys.stdout)
+    stats.sort_stats("cumulative" if sort == "cumulative" else "tottime")
+    stats.print_stats(top)
+
+
+def summarize_pyinstrument(files, top, sort):
+    from pyinstrument.session import Session
+
+    session = functools.reduce(Session.combine, (Session.load(path) for path in files))
+    root = session.root_frame()
+    self_times = collections.Counter()
+    total_times = collections.Counter()
+    # the time of a recursive function counts once in its cumulative time
+    stack = [(root, frozenset())] if root is not None else []
+    while stack:
+        frame, callers = stack.pop()
+        if frame.is_synthetic:
+            continue
+        key = "%s (%s:%s)" % (frame.function, frame.file_path_short, frame.line_no)
+        self_times[key] += frame.time - sum(
+            child.time for child in frame.children if not child.is_synthetic
+        )
+        if key not in callers:
+            total_times[key] += frame.time
+        stack.extend((child, callers | {key}) for child in frame.children)
+
+    times = total_times if sort == "cumulative" else self_times
+    print("%12s %12s  %s" % ("self (s)", "total (s)", "function"))
+    for key, _ in times.most_common(top):
+        print("%12.3f %12.3f  %s" % (self_times[key], total_times[key], key))
+
+
+def summarize_tracemalloc(files, top, sort):
+    # the snapshots only hold the allocations of the detect stage
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    sizes = collections.Counter()
+    blocks = collections.Counter()
+    for path in files:
+        snapshot = tracemalloc.Snapshot.load(path).filter_traces(ignore)
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            key = "%s:%i" % (frame.filename, frame.lineno)
+            sizes[key] += stat.size
+            blocks[key] += stat.count
+    print("Memory still allocated at the end of the detect stage, per task")
+    print("%12s %12s  %s" % ("size (KiB)", "blocks", "line"))
+    for key, size in sizes.most_common(top):
+        print("%12.1f %12.1f  %s" % (size / 1024 / len(files), blocks[key] / len(files), key))
+
+
+SUMMARIES = {
+    "cprofile": summarize_cprofile,
+    "pyinstrument": summarize_pyinstrument,
+    "tracemalloc": summarize_tracemalloc,
+}
+
+
+def main():
+    args = parse_args()
+    found = find_profiles(args.paths, args.method)
+    if not found:
+        print("No profiles found", file=sys.stderr)
+        raise SystemExit(1)
+    for profiler, files in sorted(found.items()):
+        print("%s: %i profiles%s" % (profiler, len(files), " of " + args.method if args.method else ""))
+        SUMMARIES[profiler](files, args.top, args.sort)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run the abed tasks in long-lived interpreters.
+
+``abed local`` starts a new interpreter for every task, which imports numpy,
+scipy and the detector libraries again each time. For the fast detectors this
+takes far longer than the detection itself. This runner reads the tasks of the
+abed TASK_FILE and runs the Python detector scripts in-process instead: every
+script is imported once and its ``main`` is called with the arguments of the
+task while its stdout is captured, which is what abed writes as the result.
+
+Scripts started with ``python3.9`` run in this interpreter, scripts of a
+virtual environment (``source .../venv/bin/activate && python``) run in one
+resident worker per environment. Other commands (the R scripts) are executed
+in a shell exactly like abed does. The results are written to the stage
+directory and moved to RESULT_DIR at the end, like ``abed local``.
+
+Run it from the directory of abed_conf.py, with the interpreter of the
+``python3.9`` tasks::
+
+    python3.9 utils/resident_runner.py [query words]
+
+With ``--result-cache DIR`` the outputs of successful tasks are stored in DIR
+by the checksums of their script and dataset and their arguments, see
+result_cache.py, and tasks that were computed before are not run again.
+
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import re
+import select
+import shlex
+import signal
+import subprocess
+import sys
+import time
+import traceback
+
+# Python detector scripts, optionally run from a virtual environment
+SCRIPT_COMMAND = re.compile(
+    r"^(?:source (?P<venv>\S+)/bin/activate && )?python[0-9.]* "
+    r"(?P<script>\S+\.py)(?P<args>.*)$"
+)
+
+
+class TaskFailed(Exception):
+    """A task ended like a command with a non-zero exit status"""
+
+    def __init__(self, message, output=""):
+        super().__init__(message)
+        self.output = output
+
+
+class TaskTimeout(BaseException):
+    """Raised in a task that ran out of time
+
+    It is no Exception, so that the handlers of the scripts that turn any
+    error into a FAIL result let it pass.
+    """
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Raise TaskTimeout in the main thread once `seconds` have passed"""
+    if not seconds:
+        yield
+        return
+
+    def expire(signum, frame):
+        raise TaskTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class ScriptRunner:
+    """Runs the main function of Python scripts, importing each script once"""
+
+    def __init__(self):
+        self.modules = {}
+
+    def module(self, script):
+        path = os.path.abspath(script)
+        if path not in self.modules:
+            # the directory of the script comes first on the path, as when
+            # the script is run by the interpreter
+            directory = os.path.dirname(path)
+            if directory not in sys.path:
+                sys.path.insert(0, directory)
+            name = os.path.splitext(os.path.basename(path))[0]
+            module = sys.modules.get(name)
+            if getattr(module, "__file__", None) != path:
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[name] = module
+                spec.loader.exec_module(module)
+            self.modules[path] = module
+        return self.modules[path]
+
+    def run(self, script, argv, timeout=None, env=None):
+        """Output of ``python script *argv``, raises TaskFailed on failure
+
+        A script still running after `timeout` seconds is interrupted, and
+        its output is a TIMEOUT result instead. The environment variables in
+        `env` are set while the script runs.
+        """
+        module = self.module(script)
+        stdout = io.StringIO()
+        saved_argv = sys.argv
+        sys.argv = [script] + argv
+        saved_env = {name: os.environ.get(name) for name in env or {}}
+        os.environ.update(env or {})
+        start = time.time()
+        try:
+            with contextlib.redirect_stdout(stdout), deadline(timeout):
+                module.main()
+        except TaskTimeout:
+            return self.timeout_output(module, time.time() - start)
+        except SystemExit as err:
+            # exit_with_error leaves with SystemExit() once the result is out
+            if err.code not in (None, 0):
+                raise TaskFailed("exit status %s" % err.code, stdout.getvalue())
+        except Exception:
+            traceback.print_exc()
+            raise TaskFailed("uncaught exception", stdout.getvalue())
+        finally:
+            sys.argv = saved_argv
+            for name, value in saved_env.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+        return stdout.getvalue()
+
+    def timeout_output(self, module, runtime):
+        """TIMEOUT result of the script `module` for the arguments in sys.argv
+
+        A run that started its time budget gets the TIMEOUT results of its
+        time budget, one for every value of its swept arguments. An earlier
+        timeout, e.g. while loading the dataset, gets a single one.
+        """
+        # imported by the script from its directory
+        from cpdbench_utils import exit_with_timeout, make_param_dict
+        from time_budget import exit_running_timeout
+
+        stdout = io.StringIO()
+        try:
+            # exits once the results are out
+            with contextlib.redirect_stdout(stdout):
+                exit_running_timeout(runtime)
+            args = module.parse_args()
+            # not read with load_dataset, which would start the timings of a
+            # new run
+            with open(args.input, "r") as fp:
+                data = json.load(fp)
+            with contextlib.redirect_stdout(stdout):
+                exit_with_timeout(
+                    data, args, make_param_dict(args, {}), runtime, module.__file__
+                )
+        except SystemExit:
+            pass
+        except Exception:
+            traceback.print_exc()
+            raise TaskFailed("timed out after %.0fs" % runtime, stdout.getvalue())
+        return stdout.getvalue()
+
+
+class Worker:
+    """Resident worker running scripts with the interpreter of a venv"""
+
+    # seconds a worker may take beyond the timeout of a task to reply
+    GRACE = 60
+
+    def __init__(self, venv):
+        self.venv = venv
+        self.process = None
+
+    def run(self, script, argv, timeout=None, env=None):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(
+                [os.path.join(self.venv, "bin", "python"), os.path.abspath(__file__), "--worker"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+            )
+        request = {"script": script, "argv": argv, "timeout": timeout, "env": env}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        if timeout:
+            # a task stuck where the timer can't interrupt it stops the worker
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout + self.GRACE)
+            if not ready:
+                self.process.kill()
+                self.process.wait()
+                raise TaskFailed("worker of %s did not reply in time" % self.venv)
+        reply = self.process.stdout.readline()
+        if not reply:
+            raise TaskFailed("worker of %s exited" % self.venv)
+        reply = json.loads(reply)
+        if reply["error"] is not None:
+            raise TaskFailed(reply["error"], reply["output"])
+        return reply["output"]
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+def serve():
+    """Worker loop, runs the scripts received on stdin"""
+    # the replies use the original stdout, anything the scripts write to the
+    # file descriptor directly ends up on stderr
+    replies = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    runner = ScriptRunner()
+    for line in sys.stdin:
+        task = json.loads(line)
+        try:
+            output = runner.run(task["script"], task["argv"], task.get("timeout"), task.get("env"))
+            reply = {"output": output, "error": None}
+        except TaskFailed as err:
+            reply = {"output": err.output, "error": str(err)}
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+class TaskRunner:
+    """Runs abed commands in this interpreter, a venv worker or a shell"""
+
+    def __init__(self):
+        self.scripts = ScriptRunner()
+        self.workers = {}
+
+    def run(self, cmd, timeout=None, env=None):
+        """Output of an abed command, with the variables in `env` added to its environment"""
+        match = SCRIPT_COMMAND.match(cmd)
+        if match is None:
+            return self.run_shell(cmd, timeout, env)
+        # same word splitting as the shell for these commands
+        argv = shlex.split(match.group("args"))
+        venv = match.group("venv")
+        if venv is None:
+            return self.scripts.run(match.group("script"), argv, timeout, env)
+        if venv not in self.workers:
+            self.workers[venv] = Worker(venv)
+        return self.workers[venv].run(match.group("script"), argv, timeout, env)
+
+    def run_shell(self, cmd, timeout=None, env=None):
+        # in a session of its own, to stop the command with its children
+        process = subprocess.Popen(
+            cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            start_new_session=True,
+            env=dict(os.environ, **env) if env else None,
+        )
+        try:
+            output, _ = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            output, _ = process.communicate()
+            raise TaskFailed("timed out after %ss" % timeout, output.decode("utf-8"))
+        if process.returncode != 0:
+            err = subprocess.CalledProcessError(process.returncode, cmd)
+            raise TaskFailed(str(err), output.decode("utf-8"))
+        return output.decode("utf-8")
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.close()
+
+
+def task_command(task):
+    """Command of an abed task, as formatted by abed's do_work"""
+    from abed.conf import settings
+    from abed.run_utils import get_scratchdir
+
+    datadir = os.path.join(get_scratchdir(True), "datasets")
+    execdir = os.path.join(get_scratchdir(True), "execs")
+    if settings.TYPE == "RAW":
+        return task.format(datadir=datadir, execdir=execdir)
+    task = dict(task, datadir=datadir, execdir=execdir)
+    return settings.COMMANDS[task["method"]].format(**task)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the tasks of the abed task file in long-lived interpreters."
+    )
+    parser.add_argument(
+        "query_words",
+        nargs="*",
+        help="Only run the tasks matching all these words, as abed does",
+    )
+    parser.add_argument(
+        "--result-cache",
+        metavar="DIR",
+        help="Reuse the outputs stored in DIR for tasks whose script, dataset "
+        "and arguments are unchanged, and store new ones there",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Stop Python tasks running longer with a TIMEOUT result, and "
+        "other commands with an error",
+    )
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        serve()
+        return
+
+    # abed is only installed for the interpreter of the master, not in the
+    # virtual environments of the workers
+    from abed.io import error, info
+    from abed.run_utils import write_output
+    from abed.tasks import filter_tasks, read_tasks
+    from abed.zips import move_results
+
+    cache = None
+    if args.result_cache:
+        from result_cache import ResultCache
+
+        cache = ResultCache(args.result_cache)
+
+    all_tasks = read_tasks()
+    task_dict = filter_tasks(all_tasks, query_words=args.query_words or None)
+    runner = TaskRunner()
+    try:
+        for hsh, task in task_dict.items():
+            cmd = task_command(task)
+            key = cache.key(cmd) if cache else None
+            output = cache.get(key) if key else None
+            dstr = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if output is not None:
+                info("[%s] Using cached output for: '%s'" % (dstr, cmd))
+            else:
+                info("[%s] Executing: '%s'" % (dstr, cmd))
+                try:
+                    output = runner.run(cmd, args.timeout)
+                except TaskFailed as err:
+                    error(
+                        "There was an error executing: '%s'. Here is the error: %s"
+                        % (cmd, err.output)
+                    )
+                    continue
+                if key:
+                    cache.put(key, output)
+            fname = write_output(output, hsh, local=True)
+            dstr = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            info("[%s] Written output of %s to file: %s" % (dstr, hsh, fname))
+    finally:
+        runner.close()
+    move_results(all_tasks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed cache of task results.
+
+abed identifies a task by the hash of its parameters only, so after a change
+to one method the whole grid is run again. This cache identifies a result by
+what it was computed from instead: the checksums of the script, of the local
+modules next to it, which it may import or source, and of every file named by
+its arguments (the dataset, the signatures attributes, ...), and the
+arguments of the command. A task whose files are unchanged is answered with
+the stored output, while editing a script, a shared module such as
+cpdbench_utils.py or utils.R, or an input file leads to new keys for all the
+tasks that use it. A script that runs another one (see DELEGATED_SCRIPTS) is
+keyed on that script and the modules next to it as well.
+
+Only outputs in which every result has the SUCCESS status are stored, failed
+and timed out tasks are run again.
+
+"""
+
+import hashlib
+import json
+import os
+import shlex
+import tempfile
+
+SCRIPT_EXTENSIONS = (".py", ".R")
+INPUT_FLAGS = ("-i", "--input")
+OUTPUT_FLAGS = ("-o", "--output")
+
+# scripts that run another script for some of their arguments, by file name,
+# with the path of that script relative to theirs
+DELEGATED_SCRIPTS = {
+    "cpdbench_changepoint.py": os.path.join("..", "R", "cpdbench_changepoint.R"),
+}
+
+
+def parse_results(output):
+    """JSON results in the output of a task, None if it holds anything else
+
+    Scripts sweeping an argument write one result per value.
+    """
+    decoder = json.JSONDecoder()
+    results = []
+    pos = 0
+    output = output.strip()
+    while pos < len(output):
+        try:
+            result, pos = decoder.raw_decode(output, pos)
+        except ValueError:
+            return None
+        if not isinstance(result, dict):
+            return None
+        results.append(result)
+        while pos < len(output) and output[pos].isspace():
+            pos += 1
+    return results
+
+
+class ResultCache:
+    """Outputs of tasks stored in `directory` by the key of their command"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        # checksums by absolute path, with the (size, mtime_ns) they belong to
+        self._checksums = {}
+
+    def checksum(self, filename):
+        """MD5 checksum of a file, computed again only once it changed"""
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._checksums.get(path)
+        if cached is None or cached[0] != signature:
+            hasher = hashlib.md5()
+            with open(path, "rb") as fp:
+                for block in iter(lambda: fp.read(65536), b""):
+                    hasher.update(block)
+            cached = self._checksums[path] = (signature, hasher.hexdigest())
+        return cached[1]
+
+    def module_checksums(self, script):
+        """Checksums of the files next to `script` with its extension
+
+        These are the modules a Python script may import from its directory,
+        e.g. cpdbench_utils.py, and the files an R script may source, e.g.
+        utils.R, by file name.
+        """
+        directory = os.path.dirname(os.path.abspath(script))
+        extension = os.path.splitext(script)[1]
+        return {
+            name: self.checksum(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory))
+            if name.endswith(extension) and os.path.isfile(os.path.join(directory, name))
+        }
+
+    def key(self, cmd):
+        """Key of an abed command, None if it has no script or dataset
+
+        The key hashes the checksums of the script, of the modules next to it
+        and of the files named by the arguments following the script (but
+        not the output file), together with these arguments in their order
+        on the command line, and the checksums of the script it runs and its
+        modules.
+        """
+        try:
+            argv = shlex.split(cmd)
+        except ValueError:
+            return None
+        scripts = [i for i, arg in enumerate(argv) if arg.endswith(SCRIPT_EXTENSIONS)]
+        if not scripts:
+            return None
+        script = argv[scripts[0]]
+        args = argv[scripts[0] + 1 :]
+        inputs = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg in INPUT_FLAGS]
+        if len(inputs) != 1:
+            return None
+        try:
+            files = {
+                arg: self.checksum(arg)
+                for i, arg in enumerate(args)
+                if os.path.isfile(arg) and (i == 0 or args[i - 1] not in OUTPUT_FLAGS)
+            }
+            if inputs[0] not in files:
+                return None
+            content = [self.checksum(script), self.module_checksums(script), files, args]
+            delegate = DELEGATED_SCRIPTS.get(os.path.basename(script))
+            if delegate is not None:
+                delegate = os.path.join(os.path.dirname(script), delegate)
+                content.append([self.checksum(delegate), self.module_checksums(delegate)])
+        except OSError:
+            return None
+        return hashlib.sha256(json.dumps(content).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """Stored output for `key`, None if there is none"""
+        try:
+            with open(self.path(key), "r") as fp:
+                return fp.read()
+        except OSError:
+            return None
+
+    def put(self, key, output):
+        """Store the output of a task, unless one of its results is not a success"""
+        results = parse_results(output)
+        if not results or any(result.get("status") != "SUCCESS" for result in results):
+            return False
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside and renamed so that readers never see a partial output
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".json")
+        with os.fdopen(fd, "w") as fp:
+            fp.write(output)
+        os.replace(tmp, path)
+        return True
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Order tasks by their expected runtime.
+
+The runtimes of the methods differ by orders of magnitude, and a grid run in
+file order ends with a few long tasks on otherwise idle workers. Dispatching
+the longest tasks first keeps the workers busy until the end.
+
+The runtime of a task is estimated from the ``timings`` of past results, the
+sum of the times of their stages, or the ``result.runtime`` of results without
+them, in this order of preference:
+
+1. the result of the task itself, e.g. of an earlier run of the grid,
+2. the results of the same method and parameters on other datasets, scaled to
+   the length of the dataset,
+3. the results of the method with any parameters, scaled the same way,
+4. the median runtime of all results.
+
+The scaling follows a fit of ``runtime = a * n_obs ** b`` to the results of the
+method, by least squares on the logarithms. Every parameter set has a factor
+``a`` of its own and the exponent ``b`` is shared by the method. Without
+results at several dataset lengths, the runtime is taken as linear in the
+length.
+
+"""
+
+import heapq
+import math
+import os
+import statistics
+
+from result_cache import parse_results
+
+# execs/python is put on the path by the local executor
+from timings import TIMING_STAGES
+
+# bounds of the scaling exponent of a method, to extrapolate safely from a
+# few results
+MIN_EXPONENT = 0.0
+MAX_EXPONENT = 3.0
+
+# runtime of a result that recorded none or zero
+MIN_RUNTIME = 1e-3
+
+
+def read_runtimes(result_dir):
+    """Yield (dataset, method, hash, runtime) of the results in an abed result dir"""
+    if not os.path.isdir(result_dir):
+        return
+    for dataset in sorted(os.listdir(result_dir)):
+        dataset_dir = os.path.join(result_dir, dataset)
+        if not os.path.isdir(dataset_dir):
+            continue
+        for method in sorted(os.listdir(dataset_dir)):
+            method_dir = os.path.join(dataset_dir, method)
+            if not os.path.isdir(method_dir):
+                continue
+            for result_file in sorted(os.listdir(method_dir)):
+                hsh = os.path.splitext(result_file)[0]
+                try:
+                    with open(os.path.join(method_dir, result_file), "r") as fp:
+                        results = parse_results(fp.read())
+                except OSError:
+                    continue
+                if not results:
+                    continue
+                # the results of a sweep share the runtime of the run
+                runtime = result_runtime(results[0])
+                if isinstance(runtime, (int, float)):
+                    yield dataset, method, hsh, max(float(runtime), MIN_RUNTIME)
+
+
+def result_runtime(result):
+    """Seconds a result took from loading the dataset to writing the result
+
+    Results written before the timings were recorded give the runtime the
+    script measured itself.
+    """
+    timings = result.get("timings") or {}
+    stages = [timings.get(stage) for stage in TIMING_STAGES]
+    if all(isinstance(seconds, (int, float)) for seconds in stages):
+        return sum(stages)
+    return (result.get("result") or {}).get("runtime")
+
+
+def fit_exponent(groups):
+    """Exponent b of runtime = a * n_obs ** b, shared by groups of (n_obs, runtime) pairs
+
+    Each group has a factor a of its own, so the exponent is fitted to the
+    differences from the group means.
+    """
+    sxx = sxy = 0.0
+    for points in groups:
+        xs = [math.log(n) for n, _ in points]
+        ys = [math.log(runtime) for _, runtime in points]
+        x_mean = statistics.mean(xs)
+        y_mean = statistics.mean(ys)
+        sxx += sum((x - x_mean) ** 2 for x in xs)
+        sxy += sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    if sxx == 0:
+        return 1.0
+    return min(max(sxy / sxx, MIN_EXPONENT), MAX_EXPONENT)
+
+
+def log_factor(points, exponent):
+    """Log of the factor a of runtime = a * n_obs ** exponent for (n_obs, runtime) pairs"""
+    return statistics.mean(math.log(runtime) - exponent * math.log(n) for n, runtime in points)
+
+
+def parameter_key(task):
+    """Method and parameters of a task, without the dataset"""
+    parameters = ((k, repr(v)) for k, v in task.items() if k not in ("dataset", "method"))
+    return task["method"], tuple(sorted(parameters))
+
+
+class CostModel:
+    """Expected runtime of tasks, from the runtimes of past results
+
+    `runtimes` holds (dataset, method, hash, runtime) tuples, `all_tasks` maps
+    the hashes of the grid to their tasks and `n_obs` maps dataset names to
+    their length.
+    """
+
+    def __init__(self, runtimes, all_tasks, n_obs):
+        self.n_obs = n_obs
+        self.by_hash = {}
+        groups = {}
+        for dataset, method, hsh, runtime in runtimes:
+            self.by_hash[hsh] = runtime
+            n = n_obs.get(dataset)
+            if not n:
+                continue
+            # results of tasks no longer in the grid only count for the method
+            key = parameter_key(all_tasks[hsh]) if hsh in all_tasks else (method, None)
+            groups.setdefault(method, {}).setdefault(key, []).append((n, runtime))
+
+        self.by_method = {}
+        self.by_parameters = {}
+        for method, method_groups in groups.items():
+            exponent = fit_exponent(method_groups.values())
+            points = [point for group in method_groups.values() for point in group]
+            self.by_method[method] = (log_factor(points, exponent), exponent)
+            for key, group in method_groups.items():
+                self.by_parameters[key] = (log_factor(group, exponent), exponent)
+        self.default = statistics.median(self.by_hash.values()) if self.by_hash else 1.0
+
+    def __len__(self):
+        return len(self.by_hash)
+
+    def cost(self, hsh, task):
+        """Expected runtime in seconds of a task"""
+        if hsh in self.by_hash:
+            return self.by_hash[hsh]
+        n = self.n_obs.get(task["dataset"])
+        if n:
+            fit = self.by_parameters.get(parameter_key(task)) or self.by_method.get(task["method"])
+            if fit is not None:
+                log_a, exponent = fit
+                return math.exp(log_a + exponent * math.log(n))
+        return self.default
+
+
+def longest_first(tasks, costs):
+    """Hashes of `tasks` by decreasing cost, in task order among equal costs"""
+    return sorted(tasks, key=lambda hsh: -costs[hsh])
+
+
+def makespan(order, costs, workers):
+    """Time to run the tasks in `order` on `workers`, each taking the next one when free"""
+    finish = [0.0] * max(1, min(workers, len(order)))
+    for hsh in order:
+        heapq.heapreplace(finish, finish[0] + costs[hsh])
+    return max(finish)
@@ -13,3 +13,11 @@ STR="${STR::-2}]"
 
 sed -i "s/DATASETPLACEHOLDER/${STR}/g" /TCPDBench/abed_conf.py
 sed -i "s/DATASETPLACEHOLDER/${STR}/g" /TCPDBench/analysis/scripts/make_table.py
+
+# build the binary caches read by load_dataset and load.dataset, which do
+# not write them
+cd /TCPDBench/execs/python && python3.9 -c '
+import glob, dataset_cache
+for filename in glob.glob("/TCPDBench/datasets/*.json"):
+    dataset_cache.build_dataset_cache(filename)
+'
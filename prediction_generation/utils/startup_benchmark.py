@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the import time of the Python detector scripts.
+
+Every script is imported in a fresh interpreter, without running its main
+function, and the median over several runs is reported. Several directories
+of scripts can be compared, and --baseline adds the scripts of a git revision,
+to report the import times before and after a change::
+
+    python3.9 utils/startup_benchmark.py --baseline HEAD~1
+
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_SCRIPT = """
+import importlib.util, os, sys, time
+path = sys.argv[1]
+sys.path.insert(0, os.path.dirname(path))
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("benchmarked", path)
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(time.perf_counter() - start)
+"""
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "execs", "python")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Report the import time of the detector scripts.")
+    parser.add_argument(
+        "script_dirs",
+        nargs="*",
+        help="Directories of cpdbench_*.py scripts to compare (default: execs/python)",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        help="Git revision whose scripts are benchmarked first, e.g. HEAD~1",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Runs per script (default: 5)")
+    parser.add_argument("-p", "--python", default=sys.executable, help="Interpreter to benchmark")
+    return parser.parse_args()
+
+
+def import_time(python, path, repeat):
+    """Median time in seconds to import the script at `path`, None if it fails"""
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [python, "-c", IMPORT_SCRIPT, path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+        if proc.returncode != 0:
+            return None
+        times.append(float(proc.stdout))
+    return statistics.median(times)
+
+
+def export_revision(revision, directory):
+    """Write the scripts of a git revision to `directory`, return their path"""
+    script_dir = os.path.relpath(os.path.realpath(SCRIPT_DIR), start=git_root())
+    archive = subprocess.run(
+        ["git", "archive", revision, script_dir],
+        cwd=git_root(),
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+    return os.path.join(directory, script_dir)
+
+
+def git_root():
+    return subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"],
+        cwd=SCRIPT_DIR,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout.strip()
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        columns = []
+        if args.baseline:
+            columns.append((args.baseline, export_revision(args.baseline, tmpdir)))
+        for script_dir in args.script_dirs or [SCRIPT_DIR]:
+            columns.append((os.path.relpath(script_dir), script_dir))
+
+        scripts = sorted(
+            {os.path.basename(p) for _, d in columns for p in glob.glob(os.path.join(d, "cpdbench_*.py"))}
+        )
+        width = max(len(s) for s in scripts)
+        print(" ".join([" " * width] + ["%12s" % label[-12:] for label, _ in columns]))
+        for script in scripts:
+            cells = []
+            for _, script_dir in columns:
+                path = os.path.join(script_dir, script)
+                seconds = import_time(args.python, path, args.repeat) if os.path.exists(path) else None
+                cells.append("%10.0fms" % (1000 * seconds) if seconds is not None else "%12s" % "-")
+            print(" ".join([script.ljust(width)] + cells))
+
+
+if __name__ == "__main__":
+    main()